@@ -0,0 +1,119 @@
+"""Task creation throughput benchmark
+
+Creates tasks for a function with a few parameters, first with a request to the task
+create endpoint for each of them, then with requests to the bulk endpoint. The tasks
+are created in a throwaway sqlite database using the test settings, and published to
+celery's in-memory broker.
+
+Usage (from the functionary directory):
+
+    python -m benchmarks.bulk_create --tasks 1000
+"""
+import argparse
+import os
+from time import perf_counter
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "functionary.settings.test")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from rest_framework.test import APIRequestFactory, force_authenticate  # noqa: E402
+
+from core.api.v1.views.task import TaskViewSet  # noqa: E402
+from core.celery import app  # noqa: E402
+from core.models import Function, Package, Task, Team, User  # noqa: E402
+from core.models.package import PACKAGE_STATUS  # noqa: E402
+from core.utils.parameter import PARAMETER_TYPE  # noqa: E402
+
+
+def create_function() -> Function:
+    environment = Team.objects.create(name="benchmark").environments.get()
+    package = Package.objects.create(
+        name="benchmark", environment=environment, status=PACKAGE_STATUS.ACTIVE
+    )
+    function = Function.objects.create(
+        name="sweep", package=package, environment=environment
+    )
+
+    function.parameters.create(name="step", parameter_type=PARAMETER_TYPE.INTEGER)
+    function.parameters.create(name="rate", parameter_type=PARAMETER_TYPE.FLOAT)
+    function.parameters.create(name="label", parameter_type=PARAMETER_TYPE.STRING)
+    function.parameters.create(name="options", parameter_type=PARAMETER_TYPE.JSON)
+
+    return function
+
+
+def task_data(function: Function, step: int) -> dict:
+    return {
+        "function": str(function.id),
+        "parameters": {
+            "step": step,
+            "rate": step / 10,
+            "label": f"step {step}",
+            "options": {"seed": step},
+        },
+    }
+
+
+def post(view, user: User, function: Function, data: dict):
+    request = APIRequestFactory().post(
+        "/", data, format="json", HTTP_X_ENVIRONMENT_ID=str(function.environment_id)
+    )
+    force_authenticate(request, user=user)
+
+    return view(request)
+
+
+def run_create(user: User, function: Function, count: int) -> float:
+    """Create the tasks one request at a time, returning the tasks created per
+    second"""
+    view = TaskViewSet.as_view({"post": "create"})
+    start = perf_counter()
+
+    for step in range(count):
+        response = post(view, user, function, task_data(function, step))
+        assert response.status_code == 201, response.data
+
+    return count / (perf_counter() - start)
+
+
+def run_bulk(user: User, function: Function, count: int, batch: int) -> float:
+    """Create the tasks with bulk requests of batch tasks, returning the tasks
+    created per second"""
+    view = TaskViewSet.as_view({"post": "bulk"})
+    start = perf_counter()
+
+    for first in range(0, count, batch):
+        last = min(first + batch, count)
+        data = {"tasks": [task_data(function, step) for step in range(first, last)]}
+        response = post(view, user, function, data)
+        assert response.status_code == 201, response.data
+
+    return count / (perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    connection.creation.create_test_db(verbosity=0, keepdb=False)
+    app.conf.CELERY_BROKER_URL = "memory://"
+    function = create_function()
+    user = User.objects.create(username="benchmark", is_superuser=True)
+
+    before = run_create(user, function, args.tasks)
+    after = run_bulk(user, function, args.tasks, args.batch)
+
+    assert Task.objects.count() == args.tasks * 2
+
+    print(f"create: {before:8.1f} tasks/s")
+    print(f"bulk:   {after:8.1f} tasks/s ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""publish_task throughput benchmark
+
+Publishes tasks with publish_task, first opening a new broker connection and
+reading the RabbitMQ settings for every message as send_message used to, then with
+the per-process PublisherPool. The tasks are created in a throwaway sqlite database
+using the test settings. The broker is a stand-in that sleeps for the configured
+connection setup and publisher confirm times, so no RabbitMQ is required.
+
+Usage (from the functionary directory):
+
+    python -m benchmarks.publish_task --tasks 200
+"""
+import argparse
+import os
+from time import perf_counter, sleep
+from unittest import mock
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "functionary.settings.test")
+
+import django  # noqa: E402
+
+django.setup()
+
+from constance import config  # noqa: E402
+from django.db import connection  # noqa: E402
+
+from core.models import Function, Package, Task, Team, User  # noqa: E402
+from core.utils import messaging  # noqa: E402
+from core.utils.tasking import publish_task  # noqa: E402
+
+
+class StandInConnection:
+    """Just enough of a pika BlockingConnection and channel for the Publisher"""
+
+    connect_seconds = 0.0
+    confirm_seconds = 0.0
+
+    def __init__(self, parameters):
+        # TCP, TLS and AMQP handshakes
+        sleep(self.connect_seconds)
+        self.is_open = True
+
+    def channel(self):
+        return self
+
+    def confirm_delivery(self):
+        pass
+
+    def basic_publish(self, **kwargs):
+        sleep(self.confirm_seconds)
+
+    def close(self):
+        self.is_open = False
+
+
+def create_tasks(count: int) -> list:
+    environment = Team.objects.create(name="benchmark").environments.get()
+    package = Package.objects.create(name="benchmark", environment=environment)
+    function = Function.objects.create(
+        name="echo", package=package, environment=environment
+    )
+    user = User.objects.create(username="benchmark")
+
+    return [
+        Task.objects.create(
+            tasked_object=function,
+            environment=environment,
+            parameters={"message": "benchmark"},
+            creator=user,
+        ).id
+        for _ in range(count)
+    ]
+
+
+def run(task_ids: list) -> float:
+    """Publish every task in turn, as a celery worker process does, returning the
+    tasks published per second"""
+    start = perf_counter()
+
+    for task_id in task_ids:
+        publish_task.run(task_id=task_id)
+
+    return len(task_ids) / (perf_counter() - start)
+
+
+def new_pool_per_message() -> messaging.PublisherPool:
+    """Connects and reads the settings for every message, as before pooling"""
+    messaging.clear_connection_parameters()
+
+    return messaging.PublisherPool(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--connect-ms", type=float, default=20)
+    parser.add_argument("--confirm-ms", type=float, default=1)
+    args = parser.parse_args()
+
+    StandInConnection.connect_seconds = args.connect_ms / 1000
+    StandInConnection.confirm_seconds = args.confirm_ms / 1000
+
+    connection.creation.create_test_db(verbosity=0, keepdb=False)
+    task_ids = create_tasks(args.tasks * 2)
+    count = args.tasks
+    config.RABBITMQ_USER = "benchmark"
+    config.RABBITMQ_PASSWORD = "benchmark"
+
+    with mock.patch("pika.BlockingConnection", StandInConnection):
+        with mock.patch.object(messaging, "get_publisher_pool", new_pool_per_message):
+            before = run(task_ids[:count])
+
+        after = run(task_ids[count:])
+
+    print(f"per message: {before:8.1f} tasks/s")
+    print(f"pooled:      {after:8.1f} tasks/s ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Task result ingestion benchmark
+
+Records TASK_RESULT messages, first with a record_task_result for each of them, as
+the listener used to hand them off, then with record_task_results for batches of
+them. The tasks are created in a throwaway sqlite database using the test settings.
+Storage is in memory, sleeping for the configured time for each upload, to stand in
+for the round trips to S3.
+
+Usage (from the functionary directory):
+
+    python -m benchmarks.record_results --results 500
+"""
+import argparse
+import os
+from time import perf_counter, sleep
+from unittest import mock
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "functionary.settings.test")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.files.storage import InMemoryStorage  # noqa: E402
+from django.db import connection  # noqa: E402
+
+from core.models import Function, Package, Task, Team, User  # noqa: E402
+from core.utils.tasking import record_task_result, record_task_results  # noqa: E402
+
+
+def create_tasks(count: int) -> list:
+    environment = Team.objects.create(name="benchmark").environments.get()
+    package = Package.objects.create(name="benchmark", environment=environment)
+    function = Function.objects.create(
+        name="echo", package=package, environment=environment
+    )
+    user = User.objects.create(username="benchmark")
+
+    return Task.objects.bulk_create(
+        Task(
+            tasked_object=function,
+            environment=environment,
+            parameters={"message": "benchmark"},
+            status=Task.IN_PROGRESS,
+            creator=user,
+        )
+        for _ in range(count)
+    )
+
+
+def result_message(task: Task) -> dict:
+    return {
+        "task_id": str(task.id),
+        "status": 0,
+        "output": "benchmark\n" * 10,
+        "result": '"benchmark"',
+        "timings": {"phases": {"run": 0.1}},
+    }
+
+
+def run_each(tasks: list) -> float:
+    """Record each result in turn, returning the results recorded per second"""
+    start = perf_counter()
+
+    for task in tasks:
+        record_task_result(result_message(task))
+
+    return len(tasks) / (perf_counter() - start)
+
+
+def run_batches(tasks: list, batch: int) -> float:
+    """Record the results in batches, returning the results recorded per second"""
+    start = perf_counter()
+
+    for first in range(0, len(tasks), batch):
+        last = first + batch
+        record_task_results([result_message(task) for task in tasks[first:last]])
+
+    return len(tasks) / (perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--upload-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    connection.creation.create_test_db(verbosity=0, keepdb=False)
+    tasks = create_tasks(args.results * 2)
+    count = args.results
+    save = InMemoryStorage._save
+
+    def slow_save(storage, name, content):
+        sleep(args.upload_ms / 1000)
+        return save(storage, name, content)
+
+    with mock.patch.object(InMemoryStorage, "_save", slow_save):
+        before = run_each(tasks[:count])
+        after = run_batches(tasks[count:], args.batch)
+
+    assert Task.objects.filter(status=Task.COMPLETE).count() == len(tasks)
+
+    print(f"each:    {before:8.1f} results/s")
+    print(f"batched: {after:8.1f} results/s ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 """ Serializers for defining a package """
+import re
+
 from drf_jsonschema_serializer import JSONSchemaField
 from rest_framework import serializers
 
@@ -8,6 +10,10 @@ LANGUAGES = [("python", "Python"), ("javascript", "JavaScript")]
 RETURN_TYPE_CHOICES = PARAMETER_TYPE_CHOICES[:]
 
 
+# Multipliers for the unit suffixes accepted on memory sizes, e.g. "512m"
+MEMORY_UNITS = {"": 1, "b": 1, "k": 1024, "m": 1024**2, "g": 1024**3}
+MEMORY_PATTERN = re.compile(r"^(\d+)\s*([bkmg]?)$", re.IGNORECASE)
+
 options_schema = {
     "type": "array",
     "items": {"type": ["string", "number"]},
@@ -32,6 +38,31 @@ class ParameterSerializer(serializers.Serializer):
     default = serializers.CharField(required=False)
 
 
+class MemoryField(serializers.CharField):
+    """A memory size in bytes, optionally suffixed with b, k, m or g"""
+
+    default_error_messages = {
+        "invalid": "Must be a number of bytes, optionally suffixed with b, k, m or g.",
+    }
+
+    def to_internal_value(self, data) -> int:
+        value = super().to_internal_value(data)
+
+        if (match := MEMORY_PATTERN.match(value)) is None:
+            self.fail("invalid")
+
+        size, unit = match.groups()
+
+        return int(size) * MEMORY_UNITS[unit.lower()]
+
+
+class ResourcesSerializer(serializers.Serializer):
+    """Serializer for the resources a package's functions need to run"""
+
+    cpu = serializers.FloatField(min_value=0.01, required=False)
+    memory = MemoryField(required=False)
+
+
 class FunctionSerializer(serializers.Serializer):
     """Serializer for function description"""
 
@@ -44,6 +75,7 @@ class FunctionSerializer(serializers.Serializer):
     )
     parameters = ParameterSerializer(many=True)
     return_type = serializers.ChoiceField(choices=RETURN_TYPE_CHOICES, required=False)
+    timeout = serializers.IntegerField(min_value=1, required=False)
 
 
 class PackageDefinitionSerializer(serializers.Serializer):
@@ -58,6 +90,7 @@ class PackageDefinitionSerializer(serializers.Serializer):
     environment = serializers.DictField(
         child=serializers.CharField(), required=False, read_only=True
     )
+    resources = ResourcesSerializer(required=False)
     functions = FunctionSerializer(many=True, allow_empty=False)
 
 
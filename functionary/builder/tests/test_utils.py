@@ -294,3 +294,22 @@ def test_package_manager_handles_function_parameter_with_options(
     )
     parameter = function.parameters.get(name=parameter_with_options["name"])
     assert parameter.options == parameter_with_options["options"]
+
+
+@pytest.mark.django_db
+def test_package_manager_updates_package_resources(
+    package1, package1_updated_definition
+):
+    """Declared resources are set on the Package, and cleared once removed"""
+    package_manager = PackageManager(package1)
+    package_manager.update_package(
+        {**package1_updated_definition, "resources": {"cpu": 0.5, "memory": 1024}}
+    )
+    package1.refresh_from_db()
+
+    assert package1.resources == {"cpu": 0.5, "memory": 1024}
+
+    package_manager.update_package(package1_updated_definition)
+    package1.refresh_from_db()
+
+    assert package1.resources == {"cpu": None, "memory": None}
@@ -66,6 +66,10 @@ class PackageManager:
             new_value = package_definition.get(field)
             setattr(self.package, field, new_value)
 
+        resources = package_definition.get("resources") or {}
+        self.package.cpu = resources.get("cpu")
+        self.package.memory = resources.get("memory")
+
         self.package.save()
 
     def update_functions(self, function_definitions: list[dict]) -> None:
@@ -109,6 +113,7 @@ class PackageManager:
             function_obj.return_type = function_def.get("return_type")
             function_obj.description = function_def.get("description")
             function_obj.variables = function_def.get("variables", [])
+            function_obj.timeout = function_def.get("timeout")
             function_obj.active = True
 
             functions.append(function_obj)
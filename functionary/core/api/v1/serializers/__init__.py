@@ -1,6 +1,8 @@
 from .function import FunctionSerializer  # noqa
 from .package import PackageSerializer  # noqa
 from .task import (  # noqa
+    TaskBulkCreateResponseSerializer,
+    TaskBulkCreateSchemaSerializer,
     TaskCreateByFunctionIdSchemaSerializer,
     TaskCreateByFunctionNameSchemaSerializer,
     TaskCreateByWorkflowIdSchemaSerializer,
@@ -10,6 +12,7 @@ from .task import (  # noqa
     TaskSerializer,
 )
 from .task_log import TaskLogSerializer  # noqa
+from .task_timings import TaskTimingsSerializer  # noqa
 from .team import TeamEnvironmentSerializer, TeamSerializer  # noqa
 from .user import UserSerializer  # noqa
 from .user_file import UserFileCreateSerializer, UserFileSerializer  # noqa
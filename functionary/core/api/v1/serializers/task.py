@@ -65,6 +65,7 @@ class TaskSerializer(serializers.ModelSerializer):
             "parameters",
             "return_type",
             "status",
+            "timeout",
             "created_at",
             "updated_at",
             "environment",
@@ -139,6 +140,7 @@ class TaskCreateByFunctionIdSchemaSerializer(serializers.Serializer):
     function = serializers.UUIDField()
     parameters = serializers.JSONField()
     comment = serializers.CharField()
+    timeout = serializers.IntegerField(min_value=1, required=False)
 
 
 class TaskCreateByFunctionNameSchemaSerializer(serializers.Serializer):
@@ -149,6 +151,7 @@ class TaskCreateByFunctionNameSchemaSerializer(serializers.Serializer):
     package_name = serializers.CharField()
     parameters = serializers.JSONField()
     comment = serializers.CharField()
+    timeout = serializers.IntegerField(min_value=1, required=False)
 
 
 class TaskCreateByWorkflowIdSchemaSerializer(serializers.Serializer):
@@ -158,6 +161,30 @@ class TaskCreateByWorkflowIdSchemaSerializer(serializers.Serializer):
     workflow = serializers.UUIDField()
     parameters = serializers.JSONField()
     comment = serializers.CharField()
+    timeout = serializers.IntegerField(min_value=1, required=False)
+
+
+class TaskBulkCreateSchemaSerializer(serializers.Serializer):
+    """Serializer defining the schema for creating many tasks at once. Each of the
+    tasks takes the same form as when creating a single task.
+    Not intended for actual serialization."""
+
+    tasks = serializers.ListField(child=serializers.JSONField())
+
+
+class TaskBulkCreateItemSchemaSerializer(serializers.Serializer):
+    """Serializer defining the schema for the outcome of creating one of many tasks.
+    Not intended for actual serialization."""
+
+    id = serializers.UUIDField(required=False)
+    errors = serializers.JSONField(required=False)
+
+
+class TaskBulkCreateResponseSerializer(serializers.Serializer):
+    """Serializer defining the schema for the response to creating many tasks at once.
+    Not intended for actual serialization."""
+
+    tasks = TaskBulkCreateItemSchemaSerializer(many=True)
 
 
 class TaskResultSerializer(serializers.ModelSerializer):
@@ -0,0 +1,25 @@
+""" TaskTimings serializers """
+from rest_framework import serializers
+
+from core.models import TaskTimings
+
+
+class TaskTimingsSerializer(serializers.ModelSerializer):
+    """Basic serializer for the TaskTimings model"""
+
+    created_at = serializers.DateTimeField(source="task.created_at")
+    phases = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TaskTimings
+        fields = [
+            "created_at",
+            "published_at",
+            "started_at",
+            "completed_at",
+            "recorded_at",
+            "phases",
+        ]
+
+    def get_phases(self, instance) -> dict[str, float]:
+        return dict(instance.breakdown)
@@ -1,5 +1,8 @@
+from uuid import UUID
+
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from django_filters import rest_framework as filters
 from drf_spectacular.utils import (
     PolymorphicProxySerializer,
@@ -16,6 +19,8 @@ from rest_framework.response import Response
 from core.api import HEADER_PARAMETERS
 from core.api.permissions import HasEnvironmentPermissionForAction
 from core.api.v1.serializers import (
+    TaskBulkCreateResponseSerializer,
+    TaskBulkCreateSchemaSerializer,
     TaskCreateByFunctionIdSchemaSerializer,
     TaskCreateByFunctionNameSchemaSerializer,
     TaskCreateByWorkflowIdSchemaSerializer,
@@ -24,16 +29,22 @@ from core.api.v1.serializers import (
     TaskParameterSerializer,
     TaskResultSerializer,
     TaskSerializer,
+    TaskTimingsSerializer,
 )
 from core.api.viewsets import EnvironmentGenericViewSet
-from core.models import Function, Task, TaskResult, Workflow
-from core.utils.tasking import start_task
+from core.auth import Permission
+from core.models import Environment, Function, Task, TaskResult, Workflow
+from core.utils.parameter import ParameterValidator
+from core.utils.tasking import InvalidStatus, cancel_task, start_task, start_tasks
 
 FUNCTION = "function"
 WORKFLOW = "workflow"
 FUNCTION_NAME = "function_name"
 PACKAGE_NAME = "package_name"
 
+# The most tasks that can be created by a single bulk request
+BULK_CREATE_MAX_TASKS = 1000
+
 TASK_CREATE_REQUEST_SCHEMA = PolymorphicProxySerializer(
     component_name="TaskCreate",
     serializers={
@@ -47,9 +58,37 @@ TASK_CREATE_REQUEST_SCHEMA = PolymorphicProxySerializer(
 TASK_CREATE_REQUEST_DESCRIPTION = f"""
 Execute a function or workflow. The id of the entity being tasked must be supplied via
 either the `{FUNCTION}` or `{WORKFLOW}` parameter. Functions can alternatively be
-tasked by name using `{FUNCTION_NAME}` and `{PACKAGE_NAME}`.
+tasked by name using `{FUNCTION_NAME}` and `{PACKAGE_NAME}`. An optional `timeout`
+limits the seconds a function may run for, overriding the function's own timeout.
 """
 
+TASK_BULK_CREATE_REQUEST_DESCRIPTION = f"""
+Execute many functions or workflows at once. Each of the `tasks`, up to
+{BULK_CREATE_MAX_TASKS}, takes the same form as when creating a single task. The
+response holds, for each of the tasks in turn, either the `id` of the created task or
+the `errors` that prevented it being created. Tasks without errors are created even
+when others have them.
+"""
+
+
+def _get_tasked_object_key(data: dict) -> tuple:
+    """Returns a key identifying the object being tasked by the request data, see
+    TaskViewSet._get_tasked_objects"""
+    try:
+        if FUNCTION in data:
+            return (FUNCTION, UUID(str(data[FUNCTION])))
+        elif WORKFLOW in data:
+            return (WORKFLOW, UUID(str(data[WORKFLOW])))
+    except ValueError:
+        return (None,)
+
+    package_name, function_name = data.get(PACKAGE_NAME), data.get(FUNCTION_NAME)
+
+    if not (isinstance(package_name, str) and isinstance(function_name, str)):
+        return (None,)
+
+    return (FUNCTION_NAME, package_name, function_name)
+
 
 @extend_schema_view(
     retrieve=extend_schema(parameters=HEADER_PARAMETERS),
@@ -95,6 +134,77 @@ class TaskViewSet(
         except (ObjectDoesNotExist, DjangoValidationError):
             raise ValidationError("Invalid function or workflow provided")
 
+    def _get_tasked_objects(self, keys: set[tuple], environment: Environment) -> dict:
+        """Looks up the objects being tasked for the keys, as returned by
+        _get_tasked_object_key, with their parameters. Keys that don't identify an
+        object in the environment are left out."""
+        ids = {FUNCTION: [], WORKFLOW: []}
+        names = set()
+
+        for key in keys:
+            if key[0] in ids:
+                ids[key[0]].append(key[1])
+            elif key[0] == FUNCTION_NAME:
+                names.add(key[1:])
+
+        functions = Function.objects.select_related(
+            "environment", "package"
+        ).prefetch_related("parameters")
+        tasked_objects = {
+            (FUNCTION, function.id): function
+            for function in functions.filter(
+                id__in=ids[FUNCTION], environment=environment
+            )
+        }
+        tasked_objects.update(
+            {
+                (WORKFLOW, workflow.id): workflow
+                for workflow in Workflow.objects.select_related("environment")
+                .prefetch_related("parameters")
+                .filter(id__in=ids[WORKFLOW], environment=environment)
+            }
+        )
+
+        if names:
+            named_functions = functions.filter(
+                package__name__in={package_name for package_name, _ in names},
+                name__in={function_name for _, function_name in names},
+                environment=environment,
+            )
+
+            for function in named_functions:
+                if (key := (function.package.name, function.name)) in names:
+                    tasked_objects[(FUNCTION_NAME, *key)] = function
+
+        return tasked_objects
+
+    def _build_task(
+        self,
+        data: dict,
+        tasked_object: Function | Workflow,
+        environment: Environment,
+        parameter_validator: ParameterValidator,
+    ) -> Task:
+        """Builds and validates a task for one of the tasks in a bulk request"""
+        parameter_serializer = TaskParameterSerializer(
+            tasked_object=tasked_object,
+            data=data.get("parameters"),
+            context={"request": self.request, "view": self},
+        )
+        _ = parameter_serializer.is_valid(raise_exception=True)
+
+        task = Task(
+            creator=self.request.user,
+            environment=environment,
+            tasked_object=tasked_object,
+            parameters=parameter_serializer.validated_data,
+            comment=data.get("comment"),
+            timeout=data.get("timeout"),
+        )
+        task.clean(parameter_validator=parameter_validator)
+
+        return task
+
     @extend_schema(
         description=TASK_CREATE_REQUEST_DESCRIPTION,
         request=TASK_CREATE_REQUEST_SCHEMA,
@@ -107,6 +217,7 @@ class TaskViewSet(
         data = request.data
         tasked_object = self._get_tasked_object()
         comment = data.get("comment")
+        timeout = data.get("timeout")
 
         parameter_serializer = TaskParameterSerializer(
             tasked_object=tasked_object,
@@ -121,6 +232,7 @@ class TaskViewSet(
             tasked_object=tasked_object,
             parameters=parameter_serializer.validated_data,
             comment=comment,
+            timeout=timeout,
         )
         try:
             task.clean()
@@ -137,6 +249,68 @@ class TaskViewSet(
             response_serializer.data, status=status.HTTP_201_CREATED, headers=headers
         )
 
+    @extend_schema(
+        description=TASK_BULK_CREATE_REQUEST_DESCRIPTION,
+        request=TaskBulkCreateSchemaSerializer,
+        responses={
+            status.HTTP_201_CREATED: TaskBulkCreateResponseSerializer,
+            status.HTTP_400_BAD_REQUEST: TaskBulkCreateResponseSerializer,
+        },
+        parameters=HEADER_PARAMETERS,
+    )
+    @action(methods=["post"], detail=False)
+    def bulk(self, request: Request):
+        items = request.data.get("tasks")
+
+        if not isinstance(items, list) or not items:
+            raise ValidationError({"tasks": "Expected a list of tasks"})
+
+        if len(items) > BULK_CREATE_MAX_TASKS:
+            raise ValidationError(
+                {"tasks": f"No more than {BULK_CREATE_MAX_TASKS} tasks can be created"}
+            )
+
+        environment = self.get_environment()
+        keys = [
+            _get_tasked_object_key(item) if isinstance(item, dict) else None
+            for item in items
+        ]
+        tasked_objects = self._get_tasked_objects(set(keys) - {None}, environment)
+        parameter_validators = {}
+        results = []
+        tasks = []
+
+        for item, key in zip(items, keys):
+            try:
+                if key is None:
+                    raise ValidationError("Expected an object describing the task")
+
+                if (tasked_object := tasked_objects.get(key)) is None:
+                    raise ValidationError("Invalid function or workflow provided")
+
+                if key not in parameter_validators:
+                    parameter_validators[key] = ParameterValidator(tasked_object)
+
+                task = self._build_task(
+                    item, tasked_object, environment, parameter_validators[key]
+                )
+            except (ValidationError, DjangoValidationError) as err:
+                results.append({"errors": serializers.as_serializer_error(err)})
+                continue
+
+            results.append({"id": task.id})
+            tasks.append(task)
+
+        # The tasks are published once they are committed, none are if any fail
+        with transaction.atomic():
+            Task.objects.bulk_create(tasks)
+            start_tasks(tasks)
+
+        return Response(
+            {"tasks": results},
+            status=status.HTTP_201_CREATED if tasks else status.HTTP_400_BAD_REQUEST,
+        )
+
     @extend_schema(
         description="Retrieve the task results",
         parameters=HEADER_PARAMETERS,
@@ -154,7 +328,10 @@ class TaskViewSet(
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @extend_schema(
-        description="Retrieve the task log output",
+        description=(
+            "Retrieve the task log output. While the task is running this is the "
+            "output received from the runner so far."
+        ),
         parameters=HEADER_PARAMETERS,
         responses={status.HTTP_200_OK: TaskLogSerializer},
     )
@@ -162,9 +339,54 @@ class TaskViewSet(
     def log(self, request, pk=None):
         task = self.get_object()
 
+        if (log := task.log) is None:
+            raise NotFound(f"No log found for task {pk}.")
+
+        serializer = TaskLogSerializer({"log": log})
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        description=(
+            "Retrieve when the task was created, published, started and finished, "
+            "along with the seconds spent in each phase of executing it."
+        ),
+        parameters=HEADER_PARAMETERS,
+        responses={status.HTTP_200_OK: TaskTimingsSerializer},
+    )
+    @action(methods=["get"], detail=True)
+    def timings(self, request, pk=None):
+        task = self.get_object()
+
         try:
-            serializer = TaskLogSerializer(task.tasklog)
+            serializer = TaskTimingsSerializer(task.tasktimings)
         except ObjectDoesNotExist:
-            raise NotFound(f"No log found for task {pk}.")
+            raise NotFound(f"No timings found for task {pk}.")
 
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        description=(
+            "Cancel a task that has not finished. The task's container is stopped "
+            "and the task ends with a status of CANCELED. Requires permission to "
+            "update tasks."
+        ),
+        request=None,
+        parameters=HEADER_PARAMETERS,
+        responses={status.HTTP_200_OK: TaskSerializer},
+    )
+    @action(methods=["post"], detail=True)
+    def cancel(self, request, pk=None):
+        # As a POST, the permission class only requires TASK_CREATE. Canceling changes
+        # a task that may belong to another user, so it needs TASK_UPDATE.
+        self.verify_user_permission(Permission.TASK_UPDATE)
+        task = self.get_object()
+
+        try:
+            cancel_task(task)
+        except InvalidStatus as err:
+            raise ValidationError(str(err))
+
+        task.refresh_from_db()
+
+        return Response(TaskSerializer(task).data, status=status.HTTP_200_OK)
@@ -7,7 +7,11 @@ class CoreConfig(AppConfig):
     verbose_name = "Functionary"
 
     def ready(self) -> None:
+        from constance.signals import config_updated
+
         from core import celery
         from core.utils import celery as celery_utils
+        from core.utils.constance import invalidate_config
 
+        config_updated.connect(invalidate_config)
         celery_utils.configure_celery_app(celery.app, "core")
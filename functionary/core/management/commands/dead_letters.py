@@ -0,0 +1,64 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.utils.listener import get_dead_letters, replay_dead_letters
+from core.utils.messaging import TASK_RESULTS_DEAD_LETTER_QUEUE, TASK_RESULTS_QUEUE
+
+
+class Command(BaseCommand):
+    help = (
+        f"Inspect the messages the listener was unable to handle, and the results "
+        f"workers were unable to record, which are kept in "
+        f"{TASK_RESULTS_DEAD_LETTER_QUEUE}, or replay them to {TASK_RESULTS_QUEUE}"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "action",
+            choices=["list", "replay"],
+            nargs="?",
+            default="list",
+            help="list the messages, or replay them to be handled again",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=100,
+            help="the most messages to list or replay",
+        )
+
+    def handle(self, *args, **options):
+        if options["action"] == "replay":
+            replayed = replay_dead_letters(options["limit"])
+            self.stdout.write(f"Replayed {replayed} messages to {TASK_RESULTS_QUEUE}")
+            return
+
+        for dead_letter in get_dead_letters(options["limit"]):
+            deaths = ", ".join(
+                f"{death.get('reason')} from {death.get('queue')} "
+                f"x{death.get('count')}"
+                for death in dead_letter["deaths"]
+            )
+            self.stdout.write(f"{dead_letter['msg_type']} ({deaths or 'unknown'})")
+            self.stdout.write(f"    {_summarize(dead_letter['body'])}")
+
+
+def _summarize(body: str, length: int = 200) -> str:
+    """Shortens a message body to a line, leaving out task output"""
+    try:
+        message = json.loads(body)
+    except ValueError:
+        return body[:length]
+
+    if isinstance(message, dict):
+        message = {
+            key: value
+            for key, value in message.items()
+            if key not in ("output", "result")
+        }
+
+        if isinstance(message.get("results"), list):
+            message["results"] = f"{len(message['results'])} results"
+
+    return json.dumps(message, default=str)[:length]
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
 
 from core.utils.listener import start_listening
@@ -7,6 +8,14 @@ from core.utils.messaging import wait_for_connection
 class Command(BaseCommand):
     help = "Ingest messages and hand them off to workers to be processed"
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--consumers",
+            type=int,
+            default=settings.LISTENER_CONSUMERS,
+            help="The number of connections to consume messages over",
+        )
+
+    def handle(self, *args, **options):
         wait_for_connection()
-        start_listening()
+        start_listening(options["consumers"])
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0003_functionparameter_options_workflowparameter_options"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="package",
+            name="cpu",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="package",
+            name="memory",
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.1 on 2026-10-18 21:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0004_package_cpu_package_memory"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="function",
+            name="timeout",
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="timeout",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="task",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("PENDING", "Pending"),
+                    ("IN_PROGRESS", "In Progress"),
+                    ("COMPLETE", "Complete"),
+                    ("ERROR", "Error"),
+                    ("CANCELED", "Canceled"),
+                    ("TIMEOUT", "Timeout"),
+                ],
+                default="PENDING",
+                max_length=16,
+            ),
+        ),
+    ]
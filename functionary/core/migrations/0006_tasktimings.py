@@ -0,0 +1,35 @@
+# Generated by Django 4.2.1 on 2026-10-18 22:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0005_function_timeout_task_timeout_alter_task_status"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskTimings",
+            fields=[
+                (
+                    "task",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        serialize=False,
+                        to="core.task",
+                    ),
+                ),
+                ("published_at", models.DateTimeField(null=True)),
+                ("started_at", models.DateTimeField(null=True)),
+                ("completed_at", models.DateTimeField(null=True)),
+                ("recorded_at", models.DateTimeField(null=True)),
+                ("phases", models.JSONField(default=dict)),
+            ],
+            options={
+                "verbose_name_plural": "task timings",
+            },
+        ),
+    ]
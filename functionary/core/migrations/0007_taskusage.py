@@ -0,0 +1,34 @@
+# Generated by Django 4.2.1 on 2026-10-18 22:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0006_tasktimings"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskUsage",
+            fields=[
+                (
+                    "task",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        serialize=False,
+                        to="core.task",
+                    ),
+                ),
+                ("samples", models.PositiveIntegerField(default=0)),
+                ("peak_memory", models.PositiveBigIntegerField(default=0)),
+                ("cpu_seconds", models.FloatField(default=0.0)),
+                ("block_read", models.PositiveBigIntegerField(default=0)),
+                ("block_write", models.PositiveBigIntegerField(default=0)),
+                ("network_rx", models.PositiveBigIntegerField(default=0)),
+                ("network_tx", models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
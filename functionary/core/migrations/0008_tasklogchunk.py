@@ -0,0 +1,46 @@
+# Generated by Django 4.2.1 on 2026-10-18 23:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0007_taskusage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskLogChunk",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sequence", models.PositiveIntegerField()),
+                ("output", models.TextField()),
+                (
+                    "task",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="log_chunks",
+                        to="core.task",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["sequence"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("task", "sequence"),
+                        name="task_log_chunk_task_sequence",
+                    )
+                ],
+            },
+        ),
+    ]
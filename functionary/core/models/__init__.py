@@ -5,7 +5,9 @@ from .package import PACKAGE_STATUS, Package  # noqa
 from .parameter import FunctionParameter, WorkflowParameter  # noqa
 from .scheduled_task import ScheduledTask  # noqa
 from .task import Task  # noqa
-from .task_output import TaskLog, TaskResult  # noqa
+from .task_output import TaskLog, TaskLogChunk, TaskResult  # noqa
+from .task_timings import TaskTimings  # noqa
+from .task_usage import TaskUsage  # noqa
 from .team import Team  # noqa
 from .user import User  # noqa
 from .user_file import UserFile  # noqa
@@ -38,6 +38,7 @@ class Function(ModelSaveHookMixin, models.Model):
         description: more details about the function
         variables: list of variable names to set before execution
         return_type: the type of the object being returned
+        timeout: seconds a task of the function may run for, if limited
         active: whether the function is currently activated
     """
 
@@ -53,6 +54,7 @@ class Function(ModelSaveHookMixin, models.Model):
     description = models.TextField(null=True)
     variables = models.JSONField(default=list, validators=[list_of_strings])
     return_type = models.CharField(max_length=64, null=True)
+    timeout = models.PositiveIntegerField(null=True)
     tasks = GenericRelation(
         to="Task", content_type_field="tasked_type", object_id_field="tasked_id"
     )
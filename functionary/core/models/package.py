@@ -40,6 +40,8 @@ class Package(ModelSaveHookMixin, models.Model):
         language: the language the functions in the package are written in
         status: represents the status of the package
         image_name: the docker image name for the package
+        cpu: the number of CPUs a function in the package needs to run, if declared
+        memory: the memory in bytes a function in the package needs, if declared
     """
 
     STATUS_CHOICES = [
@@ -67,6 +69,9 @@ class Package(ModelSaveHookMixin, models.Model):
 
     image_name = models.CharField(max_length=256)
 
+    cpu = models.FloatField(null=True)
+    memory = models.PositiveBigIntegerField(null=True)
+
     objects = models.Manager()
     active_objects = ActivePackageManager()
 
@@ -124,6 +129,11 @@ class Package(ModelSaveHookMixin, models.Model):
         """Returns the package's image name prepended with the registry info"""
         return f"{registry.get_registry()}/{self.image_name}"
 
+    @property
+    def resources(self) -> dict:
+        """Returns the declared resource requirements of the package's functions"""
+        return {"cpu": self.cpu, "memory": self.memory}
+
     @property
     def active_functions(self) -> QuerySet:
         """Returns a QuerySet of all active functions in the package"""
@@ -13,7 +13,7 @@ from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.db.models.functions import Upper
 
-from core.utils.parameter import validate_parameters
+from core.utils.parameter import ParameterValidator, validate_parameters
 
 if TYPE_CHECKING:
     from core.models import Function, Workflow
@@ -37,6 +37,7 @@ class Task(models.Model):
         parameters: JSON representing the parameters that will be passed to the function
                     or workflow
         status: tasking status
+        timeout: seconds the task may run for, overriding the function's timeout
         creator: the user that initiated the task
         created_at: task creation timestamp
         updated_at: task updated timestamp
@@ -46,13 +47,18 @@ class Task(models.Model):
     IN_PROGRESS = "IN_PROGRESS"
     COMPLETE = "COMPLETE"
     ERROR = "ERROR"
+    CANCELED = "CANCELED"
+    TIMEOUT = "TIMEOUT"
 
     STATUS_CHOICES = [
         (PENDING, "Pending"),
         (IN_PROGRESS, "In Progress"),
         (COMPLETE, "Complete"),
         (ERROR, "Error"),
+        (CANCELED, "Canceled"),
+        (TIMEOUT, "Timeout"),
     ]
+    FINISHED_STATUSES = [COMPLETE, ERROR, CANCELED, TIMEOUT]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     tasked_type = models.ForeignKey(to=ContentType, on_delete=models.PROTECT)
@@ -62,6 +68,7 @@ class Task(models.Model):
     parameters = models.JSONField(encoder=DjangoJSONEncoder)
     return_type = models.CharField(max_length=64, null=True)
     status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    timeout = models.PositiveIntegerField(null=True, blank=True)
     creator = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -110,22 +117,41 @@ class Task(models.Model):
                 "environment"
             )
 
-    def _clean_parameters(self):
+    def _clean_parameters(self, parameter_validator: Optional[ParameterValidator]):
         """Validate that the parameters conform to the schema of the function or
         workflow
         """
-        validate_parameters(self.parameters, self.tasked_object)
+        if parameter_validator is None:
+            validate_parameters(self.parameters, self.tasked_object)
+        else:
+            parameter_validator.validate(self.parameters)
 
     def _clean_tasked_object(self):
         """Validate tasked_object is active for newly created tasks"""
         if self._state.adding and not self.tasked_object.is_active:
             raise ValidationError("This function or workflow is not active")
 
-    def clean(self):
-        """Model instance validation and attribute cleanup"""
+    def _clean_timeout(self):
+        """Validate that the timeout, if set, is a positive number of seconds"""
+        if self.timeout is None:
+            return
+
+        if type(self.timeout) is not int or self.timeout < 1:
+            raise ValidationError(
+                {"timeout": "Timeout must be a positive number of seconds"}
+            )
+
+    def clean(self, parameter_validator: Optional[ParameterValidator] = None):
+        """Model instance validation and attribute cleanup
+
+        Args:
+            parameter_validator: ParameterValidator for the tasked_object, for when
+                                 many tasks for it are being validated
+        """
         self._clean_environment()
-        self._clean_parameters()
+        self._clean_parameters(parameter_validator)
         self._clean_tasked_object()
+        self._clean_timeout()
 
     # TODO: Sort out what to do with this since it does not apply to workflows.
     @property
@@ -150,11 +176,14 @@ class Task(models.Model):
     # TODO: Sort out what to do with this since it does not apply to workflows.
     @property
     def log(self) -> Optional[str]:
-        """Convenience property for accessing the log output"""
+        """Convenience property for accessing the log output. Until the task's
+        result is recorded this is the output streamed from it so far, if any."""
         try:
             return self.tasklog.log
         except ObjectDoesNotExist:
-            return None
+            chunks = self.log_chunks.values_list("output", flat=True)
+
+            return "".join(chunks) if chunks else None
 
     @property
     def variables(self):
@@ -192,4 +221,12 @@ class Task(models.Model):
     @property
     def finished(self) -> bool:
         """Helper method indicating if the task is in a final state."""
-        return self.status in [Task.COMPLETE, Task.ERROR]
+        return self.status in Task.FINISHED_STATUSES
+
+    @property
+    def effective_timeout(self) -> Optional[int]:
+        """The seconds the task may run for, from the task or else its function"""
+        if self.timeout:
+            return self.timeout
+
+        return getattr(self.tasked_object, "timeout", None)
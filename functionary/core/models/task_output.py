@@ -28,9 +28,22 @@ class TaskOutput(models.Model):
         """Returns the file contents"""
         return self.file.read().decode() if self.file else None
 
-    def save_content(self, content: str) -> None:
-        """Helper for setting the file contents from a string. Automatically
-        saves the instance."""
+    @property
+    def storage_name(self) -> str:
+        """The name the file contents are stored under"""
+        return _get_upload_to(self, None)
+
+    def attach_uploaded(self, save: bool = True) -> None:
+        """Point the instance at contents that were uploaded directly to storage
+        under storage_name. Saves the instance unless save is False."""
+        self.file.name = self.storage_name
+
+        if save:
+            self.save()
+
+    def save_content(self, content: str, save: bool = True) -> None:
+        """Helper for setting the file contents from a string. Saves the instance
+        unless save is False."""
 
         # NOTE: Ensuring that we do not store empty files would normally not be worth
         # the effort, but a bug in boto3 causes issues after uploading an empty file.
@@ -39,8 +52,8 @@ class TaskOutput(models.Model):
         #    and
         # https://github.com/boto/boto3/issues/1341
         if len(content) > 0:
-            self.file.save(str(self.task.id), ContentFile(content.encode()))
-        else:
+            self.file.save(str(self.task.id), ContentFile(content.encode()), save=save)
+        elif save:
             # Save the instance to ensure consistent behavior
             self.save()
 
@@ -55,10 +68,39 @@ class TaskLog(TaskOutput):
         """Returns the TaskLog file contents"""
         return self.get_content()
 
-    def save_log(self, log: str) -> None:
-        """Helper for setting the log file contents from a string. Automatically saves
-        the instance."""
-        self.save_content(log)
+    def save_log(self, log: str, save: bool = True) -> None:
+        """Helper for setting the log file contents from a string. Saves the instance
+        unless save is False."""
+        self.save_content(log, save)
+
+
+class TaskLogChunk(models.Model):
+    """Log output streamed from a running Task, before its TaskLog is recorded
+
+    The chunks are stored as they arrive rather than appended to the TaskLog, so that
+    each costs only its own output. They are deleted once the task's result, which
+    carries the complete log, has been recorded.
+
+    Attributes:
+        task: the task the output is from
+        sequence: the position of the chunk in the task's output, as numbered by the
+                  runner
+        output: the output, with protected variable values masked
+    """
+
+    task = models.ForeignKey(
+        to="Task", on_delete=models.CASCADE, related_name="log_chunks"
+    )
+    sequence = models.PositiveIntegerField()
+    output = models.TextField()
+
+    class Meta:
+        ordering = ["sequence"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["task", "sequence"], name="task_log_chunk_task_sequence"
+            )
+        ]
 
 
 class TaskResult(TaskOutput):
@@ -76,7 +118,7 @@ class TaskResult(TaskOutput):
         """Return the result as loaded JSON rather than the raw string"""
         return json.loads(self.result) if self.result else None
 
-    def save_result(self, result: str) -> None:
-        """Helper for setting the result file contents from a string. Automatically
-        saves the instance."""
-        self.save_content(result)
+    def save_result(self, result: str, save: bool = True) -> None:
+        """Helper for setting the result file contents from a string. Saves the
+        instance unless save is False."""
+        self.save_content(result, save)
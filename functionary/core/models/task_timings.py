@@ -0,0 +1,35 @@
+from django.db import models
+
+
+class TaskTimings(models.Model):
+    """When a Task passed through each stage of its execution, along with the time
+    the runner spent in each phase of executing it
+
+    Attributes:
+        task: the task the timings are for
+        published_at: when the task was published for a runner
+        started_at: when the runner started executing the task
+        completed_at: when the runner finished executing the task
+        recorded_at: when the task's result was recorded
+        phases: seconds spent in each of PHASES. publish is the time between the
+                runner finishing the task and its result being recorded.
+    """
+
+    PHASES = ["queue", "pull", "create", "start", "run", "remove", "collect", "publish"]
+
+    task = models.OneToOneField(primary_key=True, to="Task", on_delete=models.CASCADE)
+    published_at = models.DateTimeField(null=True)
+    started_at = models.DateTimeField(null=True)
+    completed_at = models.DateTimeField(null=True)
+    recorded_at = models.DateTimeField(null=True)
+    phases = models.JSONField(default=dict)
+
+    class Meta:
+        verbose_name_plural = "task timings"
+
+    @property
+    def breakdown(self) -> list[tuple[str, float]]:
+        """The phases in the order they happen, with the seconds spent in each"""
+        return [
+            (phase, self.phases[phase]) for phase in self.PHASES if phase in self.phases
+        ]
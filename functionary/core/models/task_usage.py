@@ -0,0 +1,25 @@
+from django.db import models
+
+
+class TaskUsage(models.Model):
+    """The resources the container of a Task used, as sampled by the runner
+
+    Attributes:
+        task: the task the usage is for
+        samples: the number of samples the usage was taken from
+        peak_memory: the most memory in use at once, in bytes
+        cpu_seconds: CPU time used
+        block_read: bytes read from block devices
+        block_write: bytes written to block devices
+        network_rx: bytes received over the network
+        network_tx: bytes sent over the network
+    """
+
+    task = models.OneToOneField(primary_key=True, to="Task", on_delete=models.CASCADE)
+    samples = models.PositiveIntegerField(default=0)
+    peak_memory = models.PositiveBigIntegerField(default=0)
+    cpu_seconds = models.FloatField(default=0.0)
+    block_read = models.PositiveBigIntegerField(default=0)
+    block_write = models.PositiveBigIntegerField(default=0)
+    network_rx = models.PositiveBigIntegerField(default=0)
+    network_tx = models.PositiveBigIntegerField(default=0)
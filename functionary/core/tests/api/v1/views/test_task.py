@@ -14,6 +14,7 @@ from core.models import (
     Package,
     Task,
     TaskResult,
+    TaskTimings,
     Team,
     User,
     UserFile,
@@ -507,6 +508,106 @@ def test_create_task_with_comment(
     assert Task.objects.get(id=task_id).comment == comment
 
 
+def test_create_task_with_timeout(
+    admin_client, request_headers: dict, function: Function
+):
+    """A timeout can be set on the Task"""
+    url = reverse("task-list")
+    task_input = {
+        "function": str(function.id),
+        "parameters": {"int_param": 5},
+        "timeout": 30,
+    }
+
+    response = admin_client.post(url, data=task_input, headers=request_headers)
+
+    assert response.status_code == 201
+    assert Task.objects.get(id=response.data["id"]).timeout == 30
+
+
+def test_create_returns_400_for_invalid_timeout(
+    admin_client, request_headers: dict, function: Function
+):
+    url = reverse("task-list")
+    task_input = {
+        "function": str(function.id),
+        "parameters": {"int_param": 5},
+        "timeout": -1,
+    }
+
+    response = admin_client.post(url, data=task_input, headers=request_headers)
+
+    assert response.status_code == 400
+    assert not Task.objects.exists()
+
+
+def test_cancel_task(mocker, admin_client, task: Task, request_headers: dict):
+    """Canceling marks the task CANCELED and tells the runners to stop it"""
+    send_message = mocker.patch("core.utils.tasking.send_message")
+    url = reverse("task-cancel", kwargs={"pk": task.id})
+
+    response = admin_client.post(url, headers=request_headers)
+    task.refresh_from_db()
+
+    assert response.status_code == 200
+    assert response.data["status"] == Task.CANCELED
+    assert task.status == Task.CANCELED
+    _, _, msg_type, message = send_message.call_args.args
+    assert msg_type == "CANCEL_TASK"
+    assert message == {"task_id": str(task.id)}
+
+
+def test_cancel_finished_task_returns_400(
+    mocker, admin_client, task2: Task, request_headers: dict
+):
+    send_message = mocker.patch("core.utils.tasking.send_message")
+    url = reverse("task-cancel", kwargs={"pk": task2.id})
+
+    response = admin_client.post(url, headers=request_headers)
+    task2.refresh_from_db()
+
+    assert response.status_code == 400
+    assert task2.status == Task.COMPLETE
+    send_message.assert_not_called()
+
+
+def test_cancel_task_requires_update_permission(
+    mocker, user, task: Task, request_headers: dict
+):
+    """A user that can create tasks but not update them can't cancel them"""
+    send_message = mocker.patch("core.utils.tasking.send_message")
+    client = APIClient()
+    client.force_authenticate(user=user)
+    url = reverse("task-cancel", kwargs={"pk": task.id})
+
+    response = client.post(url, headers=request_headers)
+    task.refresh_from_db()
+
+    assert response.status_code == 403
+    assert task.status != Task.CANCELED
+    send_message.assert_not_called()
+
+
+def test_task_timings(admin_client, task: Task, request_headers: dict):
+    """Timings list the phases in the order they happen"""
+    TaskTimings.objects.create(task=task, phases={"run": 2.0, "queue": 0.1})
+    url = reverse("task-timings", kwargs={"pk": task.id})
+
+    response = admin_client.get(url, headers=request_headers)
+
+    assert response.status_code == 200
+    assert list(response.data["phases"]) == ["queue", "run"]
+    assert response.data["published_at"] is None
+
+
+def test_task_timings_not_found(admin_client, task: Task, request_headers: dict):
+    url = reverse("task-timings", kwargs={"pk": task.id})
+
+    response = admin_client.get(url, headers=request_headers)
+
+    assert response.status_code == 404
+
+
 def test_filterset_id(admin_client, all_tasks, request_headers: dict):
     """Filter by task_id"""
     url = reverse("task-list")
@@ -588,3 +689,139 @@ def test_create_returns_400_options_task_with_invalid_choice(
     assert response.status_code == 400
     assert "options_param" in response.content.decode()
     assert not Task.objects.filter(tasked_id=function.id).exists()
+
+
+def test_bulk_create_tasks(
+    mocker,
+    admin_client: Client,
+    function: Function,
+    package: Package,
+    workflow: Workflow,
+    request_headers: dict,
+    django_capture_on_commit_callbacks,
+):
+    """Create tasks for functions by id and name, and for workflows, in one request"""
+    url = reverse("task-bulk")
+    delay = mocker.patch("core.utils.tasking.publish_task_batch.delay")
+    mocker.patch("core.utils.tasking._start_workflow_task")
+
+    task_input = {
+        "tasks": [
+            {"function": str(function.id), "parameters": {"int_param": 1}},
+            {"function": str(function.id), "parameters": {"int_param": 2}},
+            {
+                "function_name": function.name,
+                "package_name": package.name,
+                "parameters": {"int_param": 3},
+                "comment": "by name",
+            },
+            {"workflow": str(workflow.id), "parameters": {"int_param": 4}},
+        ]
+    }
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = admin_client.post(url, data=task_input, headers=request_headers)
+    task_ids = [result["id"] for result in response.data["tasks"]]
+
+    assert response.status_code == 201
+    assert Task.objects.filter(id__in=task_ids).count() == 4
+    assert Task.objects.get(id=task_ids[2]).comment == "by name"
+    assert delay.call_args.kwargs["task_ids"] == task_ids[:3]
+
+
+def test_bulk_create_rolls_back_tasks_that_fail_to_start(
+    mocker,
+    admin_client: Client,
+    function: Function,
+    request_headers: dict,
+):
+    """No tasks are left behind, or published, when starting them fails"""
+    url = reverse("task-bulk")
+    delay = mocker.patch("core.utils.tasking.publish_task_batch.delay")
+    mocker.patch(
+        "core.api.v1.views.task.start_tasks", side_effect=Exception("unavailable")
+    )
+
+    task_input = {
+        "tasks": [{"function": str(function.id), "parameters": {"int_param": 1}}]
+    }
+
+    with pytest.raises(Exception, match="unavailable"):
+        admin_client.post(url, data=task_input, headers=request_headers)
+
+    assert not Task.objects.filter(tasked_id=function.id).exists()
+    delay.assert_not_called()
+
+
+def test_bulk_create_returns_errors_per_task(
+    mocker,
+    admin_client: Client,
+    function: Function,
+    request_headers: dict,
+):
+    """Tasks with errors are reported, and the rest are still created"""
+    url = reverse("task-bulk")
+    mocker.patch("core.utils.tasking.publish_task_batch.delay")
+
+    task_input = {
+        "tasks": [
+            {"function": str(function.id), "parameters": {"int_param": "one"}},
+            {"function": str(function.id), "parameters": {"int_param": 1}},
+            {"function": "not a uuid", "parameters": {}},
+            {"function": str(function.id), "parameters": {"extra_param": 1}},
+            "not a task",
+        ]
+    }
+
+    response = admin_client.post(url, data=task_input, headers=request_headers)
+    results = response.data["tasks"]
+
+    assert response.status_code == 201
+    assert "int_param" in results[0]["errors"]
+    assert Task.objects.filter(id=results[1]["id"]).exists()
+    assert "errors" in results[2]
+    assert "errors" in results[3]
+    assert "errors" in results[4]
+    assert Task.objects.filter(tasked_id=function.id).count() == 1
+
+
+def test_bulk_create_returns_400_when_no_tasks_created(
+    admin_client: Client,
+    function: Function,
+    request_headers: dict,
+):
+    """A bulk request with only invalid tasks returns 400"""
+    url = reverse("task-bulk")
+
+    task_input = {
+        "tasks": [{"function": str(function.id), "parameters": {"int_param": "one"}}]
+    }
+
+    response = admin_client.post(url, data=task_input, headers=request_headers)
+
+    assert response.status_code == 400
+    assert "errors" in response.data["tasks"][0]
+    assert not Task.objects.filter(tasked_id=function.id).exists()
+
+
+def test_bulk_create_returns_400_for_too_many_tasks(
+    mocker,
+    admin_client: Client,
+    function: Function,
+    request_headers: dict,
+):
+    """A bulk request over the task limit returns 400"""
+    url = reverse("task-bulk")
+    mocker.patch("core.api.v1.views.task.BULK_CREATE_MAX_TASKS", 1)
+
+    task_input = {
+        "tasks": [
+            {"function": str(function.id), "parameters": {"int_param": 1}},
+            {"function": str(function.id), "parameters": {"int_param": 2}},
+        ]
+    }
+
+    response = admin_client.post(url, data=task_input, headers=request_headers)
+
+    assert response.status_code == 400
+    assert not Task.objects.filter(tasked_id=function.id).exists()
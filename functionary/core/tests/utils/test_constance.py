@@ -0,0 +1,39 @@
+import pytest
+from constance.test import override_config
+
+from core.utils import constance
+from core.utils.constance import get_config
+
+
+@pytest.fixture
+def get_values(mocker):
+    mocker.patch.object(constance, "_values", None)
+
+    return mocker.patch("core.utils.constance.get_values", wraps=constance.get_values)
+
+
+def test_values_cached(get_values):
+    get_config(["RABBITMQ_HOST"])
+    get_config(["RABBITMQ_PORT"])
+
+    get_values.assert_called_once_with()
+
+
+def test_values_read_again_after_ttl(mocker, settings, get_values):
+    settings.CONSTANCE_VALUES_TTL = 5
+    monotonic = mocker.patch("core.utils.constance.monotonic", return_value=100)
+    get_config(["RABBITMQ_HOST"])
+
+    monotonic.return_value = 106
+    get_config(["RABBITMQ_HOST"])
+
+    assert get_values.call_count == 2
+
+
+def test_change_seen_immediately(get_values):
+    get_config(["RABBITMQ_HOST"])
+
+    with override_config(RABBITMQ_HOST="rabbitmq.example.com"):
+        assert get_config(["RABBITMQ_HOST"]).RABBITMQ_HOST == "rabbitmq.example.com"
+
+    assert get_config(["RABBITMQ_HOST"]).RABBITMQ_HOST != "rabbitmq.example.com"
@@ -0,0 +1,179 @@
+from unittest.mock import Mock
+
+import pytest
+
+from core.utils import listener
+from core.utils.listener import ResultConsumer, get_dead_letters, replay_dead_letters
+from core.utils.messaging import TASK_RESULTS_DEAD_LETTER_QUEUE, TASK_RESULTS_QUEUE
+
+
+@pytest.fixture
+def channel():
+    return Mock()
+
+
+@pytest.fixture
+def consumer(settings, channel):
+    settings.LISTENER_RESULT_BATCH_SIZE = 3
+    settings.LISTENER_RESULT_BATCH_WINDOW = 0.5
+    settings.LISTENER_PREFETCH_COUNT = 6
+
+    consumer = ResultConsumer("test")
+    consumer._connection = Mock()
+    consumer._on_channel_open(channel)
+
+    return consumer
+
+
+@pytest.fixture
+def record_task_results(mocker):
+    return mocker.patch("core.utils.listener.record_task_results")
+
+
+def _deliver(consumer, channel, delivery_tag, msg_type, body):
+    consumer._handle_delivery(
+        channel,
+        Mock(delivery_tag=delivery_tag),
+        Mock(headers={"x-msg-type": msg_type}),
+        body.encode(),
+    )
+
+
+def test_consumer_sets_prefetch(consumer, channel):
+    channel.basic_qos.assert_called_once_with(prefetch_count=6)
+    assert channel.basic_consume.call_args.args[0] == TASK_RESULTS_QUEUE
+
+
+def test_results_handed_off_in_batches(consumer, channel, record_task_results):
+    for delivery_tag in range(1, 5):
+        body = f'{{"task_id": {delivery_tag}}}'
+        _deliver(consumer, channel, delivery_tag, "TASK_RESULT", body)
+
+    record_task_results.delay.assert_called_once_with(
+        [{"task_id": 1}, {"task_id": 2}, {"task_id": 3}]
+    )
+    assert [call.args for call in channel.basic_ack.call_args_list] == [
+        (1,),
+        (2,),
+        (3,),
+    ]
+    assert consumer._pending_results == [(4, {"task_id": 4})]
+
+
+def test_results_handed_off_after_window(consumer, channel, record_task_results):
+    _deliver(consumer, channel, 1, "TASK_RESULT", '{"task_id": 1}')
+
+    call_later = consumer._connection.ioloop.call_later
+    assert call_later.call_args.args[0] == 0.5
+    channel.basic_ack.assert_not_called()
+
+    # The window has passed
+    call_later.call_args.args[1]()
+
+    record_task_results.delay.assert_called_once_with([{"task_id": 1}])
+    channel.basic_ack.assert_called_once_with(1)
+
+
+def test_results_dead_lettered_when_hand_off_fails(
+    consumer, channel, record_task_results
+):
+    record_task_results.delay.side_effect = Exception("broker unavailable")
+
+    for delivery_tag in range(1, 4):
+        _deliver(consumer, channel, delivery_tag, "TASK_RESULT", "{}")
+
+    channel.basic_ack.assert_not_called()
+    assert [call.args for call in channel.basic_nack.call_args_list] == [
+        (1,),
+        (2,),
+        (3,),
+    ]
+    assert all(
+        call.kwargs == {"requeue": False} for call in channel.basic_nack.call_args_list
+    )
+
+
+def test_bad_messages_dead_lettered(consumer, channel):
+    _deliver(consumer, channel, 1, "TASK_RESULT", "not json")
+    _deliver(consumer, channel, 2, "UNKNOWN", "{}")
+
+    channel.basic_ack.assert_not_called()
+    assert [call.args for call in channel.basic_nack.call_args_list] == [(1,), (2,)]
+
+
+def test_log_chunks_acked(mocker, consumer, channel):
+    record_task_log_chunk = mocker.patch("core.utils.listener.record_task_log_chunk")
+
+    _deliver(consumer, channel, 1, "TASK_LOG_CHUNK", '{"task_id": 1}')
+
+    record_task_log_chunk.delay.assert_called_once_with({"task_id": 1})
+    channel.basic_ack.assert_called_once_with(1)
+
+
+def test_stop_hands_off_pending_results(consumer, channel, record_task_results):
+    _deliver(consumer, channel, 1, "TASK_RESULT", '{"task_id": 1}')
+
+    consumer.stop()
+    consumer._connection.ioloop.add_callback_threadsafe.call_args.args[0]()
+
+    record_task_results.delay.assert_called_once_with([{"task_id": 1}])
+    consumer._connection.close.assert_called_once_with()
+
+
+@pytest.fixture
+def dead_letter_channel(mocker):
+    build_connection = mocker.patch.object(listener, "build_connection")
+    channel = build_connection.return_value.channel.return_value
+    channel.queue_declare.return_value.method.message_count = 2
+    messages = [
+        (
+            Mock(delivery_tag=delivery_tag),
+            Mock(
+                headers={
+                    "x-msg-type": "TASK_RESULT",
+                    "x-death": [{"reason": "rejected", "count": 1}],
+                }
+            ),
+            f'{{"task_id": {delivery_tag}}}'.encode(),
+        )
+        for delivery_tag in (1, 2)
+    ]
+    channel.basic_get.side_effect = [*messages, (None, None, None)]
+
+    return channel
+
+
+def test_get_dead_letters(dead_letter_channel):
+    dead_letters = get_dead_letters(10)
+
+    assert dead_letters == [
+        {
+            "msg_type": "TASK_RESULT",
+            "body": '{"task_id": 1}',
+            "deaths": [{"reason": "rejected", "count": 1}],
+        },
+        {
+            "msg_type": "TASK_RESULT",
+            "body": '{"task_id": 2}',
+            "deaths": [{"reason": "rejected", "count": 1}],
+        },
+    ]
+    dead_letter_channel.basic_get.assert_called_with(TASK_RESULTS_DEAD_LETTER_QUEUE)
+    dead_letter_channel.basic_ack.assert_not_called()
+
+
+def test_replay_dead_letters(dead_letter_channel):
+    assert replay_dead_letters(1) == 1
+
+    kwargs = dead_letter_channel.basic_publish.call_args.kwargs
+    assert kwargs["routing_key"] == TASK_RESULTS_QUEUE
+    assert kwargs["body"] == b'{"task_id": 1}'
+    assert kwargs["properties"].headers["x-msg-type"] == "TASK_RESULT"
+    dead_letter_channel.basic_ack.assert_called_once_with(1)
+
+
+def test_replay_dead_letters_stops_at_queued_messages(dead_letter_channel):
+    dead_letter_channel.queue_declare.return_value.method.message_count = 1
+
+    assert replay_dead_letters(10) == 1
+    dead_letter_channel.basic_get.assert_called_once()
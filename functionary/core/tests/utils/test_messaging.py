@@ -0,0 +1,101 @@
+from threading import Thread
+
+import pytest
+from pika.exceptions import StreamLostError, UnroutableError
+
+from core.utils import messaging
+from core.utils.messaging import PublisherPool, send_message
+
+
+@pytest.fixture
+def connection_class(mocker):
+    """Patches pika.BlockingConnection, and the settings the parameters come from"""
+    mocker.patch.object(messaging, "_parameters", None)
+    mocker.patch.object(messaging, "_publisher_pool", None)
+    mocker.patch("core.utils.messaging._build_parameters")
+
+    return mocker.patch("core.utils.messaging.pika.BlockingConnection")
+
+
+def _channel(connection_class):
+    return connection_class.return_value.channel.return_value
+
+
+def test_send_message_reuses_connection(connection_class):
+    send_message("exchange", "key", "TASK_PACKAGE", {"id": 1})
+    send_message("exchange", "key", "TASK_PACKAGE", {"id": 2})
+
+    connection_class.assert_called_once()
+    _channel(connection_class).confirm_delivery.assert_called_once_with()
+
+    kwargs = _channel(connection_class).basic_publish.call_args.kwargs
+    assert kwargs["exchange"] == "exchange"
+    assert kwargs["routing_key"] == "key"
+    assert kwargs["body"] == '{"id": 2}'
+    assert kwargs["properties"].headers == {"x-msg-type": "TASK_PACKAGE"}
+
+
+def test_send_message_reconnects_once(connection_class):
+    _channel(connection_class).basic_publish.side_effect = [
+        StreamLostError("lost"),
+        None,
+    ]
+
+    send_message("exchange", "key", None, {})
+
+    assert connection_class.call_count == 2
+
+
+def test_send_message_raises_when_reconnect_fails(connection_class):
+    _channel(connection_class).basic_publish.side_effect = StreamLostError("lost")
+
+    with pytest.raises(StreamLostError):
+        send_message("exchange", "key", None, {})
+
+    assert connection_class.call_count == 2
+
+
+def test_unroutable_message_raises(connection_class):
+    _channel(connection_class).basic_publish.side_effect = UnroutableError([])
+
+    with pytest.raises(UnroutableError):
+        send_message("exchange", "key", None, {})
+
+    connection_class.assert_called_once()
+
+
+def test_parameters_rebuilt_after_failed_connection(connection_class):
+    build_parameters = messaging._build_parameters
+    connection_class.side_effect = [
+        StreamLostError("lost"),
+        connection_class.return_value,
+    ]
+
+    send_message("exchange", "key", None, {})
+
+    assert build_parameters.call_count == 2
+    _channel(connection_class).basic_publish.assert_called_once()
+
+
+def test_parameters_cached(connection_class):
+    messaging.get_connection_parameters()
+    messaging.get_connection_parameters()
+
+    messaging._build_parameters.assert_called_once_with()
+
+
+def test_pool_limits_connections(connection_class):
+    pool = PublisherPool(2)
+    threads = [
+        Thread(target=pool.publish, args=("exchange", "key", "{}", None))
+        for _ in range(8)
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert 1 <= connection_class.call_count <= 2
+    assert _channel(connection_class).basic_publish.call_count == 8
@@ -4,7 +4,7 @@ import pytest
 from django.core.exceptions import ValidationError
 
 from core.models import Function, FunctionParameter, Package, Team
-from core.utils.parameter import PARAMETER_TYPE, validate_parameters
+from core.utils.parameter import PARAMETER_TYPE, ParameterValidator, validate_parameters
 
 
 @pytest.fixture
@@ -127,3 +127,20 @@ def test_datetime_str_parameter(function, datetime_param):
     """Properly formatted strings for datetime parameters successfully validate"""
     datetime_value = "2023-02-27T12:30:00Z"
     validate_parameters({datetime_param.name: datetime_value}, function)
+
+
+@pytest.mark.django_db
+def test_parameter_validator_reused(
+    function, json_param, date_param, django_assert_num_queries
+):
+    """A ParameterValidator validates many parameter sets without querying again"""
+    validator = ParameterValidator(function)
+
+    with django_assert_num_queries(0):
+        validator.validate(
+            {json_param.name: {"hello": 1}, date_param.name: "2023-02-27"}
+        )
+        validator.validate({json_param.name: [1, 2], date_param.name: "2023-02-28"})
+
+        with pytest.raises(ValidationError, match=rf".*{date_param.name}.*"):
+            validator.validate({json_param.name: {"hello": 1}})
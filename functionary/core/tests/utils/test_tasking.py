@@ -1,16 +1,41 @@
+import time
+from datetime import datetime, timezone
+
 import pytest
+from django.core.files.storage import default_storage
 
 from core.models import (
     Function,
     Package,
     Task,
     TaskLog,
+    TaskLogChunk,
+    TaskResult,
+    TaskTimings,
+    TaskUsage,
     Team,
     Variable,
     Workflow,
+    WorkflowRunStep,
     WorkflowStep,
 )
-from core.utils.tasking import mark_error, publish_task, record_task_result, start_task
+from core.utils import tasking
+from core.utils.messaging import TASK_RESULTS_DEAD_LETTER_QUEUE
+from core.utils.tasking import (
+    InvalidStatus,
+    _generate_task_message,
+    _generate_upload_urls,
+    cancel_task,
+    mark_error,
+    publish_task,
+    publish_task_batch,
+    record_task_log_chunk,
+    record_task_result,
+    record_task_result_batch,
+    record_task_results,
+    start_task,
+    start_tasks,
+)
 from core.utils.workflow import generate_run_steps
 
 
@@ -127,6 +152,695 @@ def test_output_masking(task):
     assert task_log.count("Hide me") == 1
 
 
+@pytest.mark.django_db
+def test_task_message_includes_package_resources(task, package):
+    package.cpu = 2.0
+    package.memory = 512 * 1024**2
+    package.save()
+
+    message = _generate_task_message(task, {})
+
+    assert message["resources"] == {"cpu": 2.0, "memory": 512 * 1024**2}
+
+
+@pytest.fixture
+def upload_storage(mocker):
+    storage = mocker.patch.object(TaskResult.file.field, "storage")
+    storage.upload_url.side_effect = lambda name, expire: f"https://s3/{name}"
+
+    return storage
+
+
+@pytest.mark.django_db
+def test_upload_urls_not_generated_without_support(task):
+    """Storage without presigned uploads keeps output in the result message"""
+    assert _generate_upload_urls(task) == {}
+
+
+@pytest.mark.django_db
+def test_upload_urls_generated(upload_storage, task):
+    """Upload URLs point at where the TaskLog and TaskResult store their content"""
+    upload_urls = _generate_upload_urls(task)
+    result_key = f"{task.environment.id}/task_results/{task.id}"
+    log_key = f"{task.environment.id}/task_logs/{task.id}"
+
+    assert upload_urls == {
+        "result": {"url": f"https://s3/{result_key}", "key": result_key},
+        "output": {"url": f"https://s3/{log_key}", "key": log_key},
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("var3")
+def test_log_upload_url_withheld_when_masking_needed(upload_storage, task):
+    """The log must pass through the control plane to mask protected variables"""
+    assert list(_generate_upload_urls(task)) == ["result"]
+
+
+@pytest.mark.django_db
+def test_record_uploaded_output(upload_storage, task):
+    """Output uploaded by the runner is attached rather than saved again"""
+    upload_urls = _generate_upload_urls(task)
+    record_task_result(
+        {
+            "task_id": task.id,
+            "status": 0,
+            "output_ref": {"key": upload_urls["output"]["key"], "size": 10},
+            "result_ref": {"key": upload_urls["result"]["key"], "size": 2},
+        }
+    )
+    task.refresh_from_db()
+
+    assert task.status == Task.COMPLETE
+    assert task.tasklog.file.name == upload_urls["output"]["key"]
+    assert task.taskresult.file.name == upload_urls["result"]["key"]
+
+
+@pytest.mark.django_db
+def test_record_uploaded_output_rejects_other_keys(task):
+    """A reference to anything other than the task's own output is refused"""
+    with pytest.raises(ValueError):
+        record_task_result(
+            {
+                "task_id": task.id,
+                "status": 0,
+                "output": "",
+                "result_ref": {"key": "other/task_results/key"},
+            }
+        )
+
+
+@pytest.mark.django_db
+def test_result_batch_records_each_result(task, function, environment, admin_user):
+    """Each result in a batch is recorded, even if another in the batch fails"""
+    other_task = Task.objects.create(
+        tasked_object=function,
+        environment=environment,
+        parameters={},
+        creator=admin_user,
+    )
+
+    record_task_result_batch(
+        {
+            "results": [
+                {"task_id": task.id, "status": 0, "output": "", "result": "1"},
+                {"task_id": "not-a-task"},
+                {"task_id": other_task.id, "status": 1, "output": "", "result": ""},
+            ]
+        }
+    )
+    task.refresh_from_db()
+    other_task.refresh_from_db()
+
+    assert task.status == Task.COMPLETE
+    assert task.result == 1
+    assert other_task.status == Task.ERROR
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("var3")
+def test_log_chunks_appended_and_masked(task):
+    """Log chunks are appended to the task log, masking values split across chunks"""
+    task.status = Task.IN_PROGRESS
+    task.save()
+
+    record_task_log_chunk(
+        {"task_id": task.id, "sequence": 0, "output": "first hi", "skipped": 0}
+    )
+    record_task_log_chunk(
+        {"task_id": task.id, "sequence": 1, "output": "de me\n", "skipped": 0}
+    )
+    record_task_log_chunk(
+        {"task_id": task.id, "sequence": 2, "output": "last\n", "skipped": 10}
+    )
+
+    assert not TaskLog.objects.filter(task=task).exists()
+    assert task.log == "first ********\n[... 10 bytes of output skipped ...]\nlast\n"
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("var3")
+def test_log_chunks_out_of_order(task):
+    """Chunks are ordered by their sequence, and masked where they meet whichever
+    order they arrive in"""
+    task.status = Task.IN_PROGRESS
+    task.save()
+
+    for sequence, output in [(2, "e me!"), (0, "hi"), (1, "de hid"), (1, "dup")]:
+        record_task_log_chunk(
+            {"task_id": task.id, "sequence": sequence, "output": output}
+        )
+
+    assert task.log == "hide ********!"
+
+
+@pytest.mark.django_db
+def test_log_chunks_without_sequence_appended(task):
+    """Chunks from runners that don't number them are recorded in arrival order"""
+    task.status = Task.IN_PROGRESS
+    task.save()
+
+    record_task_log_chunk({"task_id": task.id, "output": "one\n"})
+    record_task_log_chunk({"task_id": task.id, "output": "two\n"})
+
+    assert task.log == "one\ntwo\n"
+
+
+@pytest.mark.django_db
+def test_log_chunks_ignored_once_finished(task):
+    """The final log from the result replaces the chunks and is not overwritten by
+    late ones"""
+    task.status = Task.IN_PROGRESS
+    task.save()
+
+    record_task_log_chunk({"task_id": task.id, "output": "partial", "skipped": 0})
+    record_task_result(
+        {"task_id": task.id, "status": 0, "output": "complete", "result": "42"}
+    )
+    record_task_log_chunk({"task_id": task.id, "output": "late", "skipped": 0})
+
+    assert TaskLog.objects.get(task=task).log == "complete"
+    assert not TaskLogChunk.objects.filter(task=task).exists()
+
+
+@pytest.mark.django_db
+def test_task_message_timeout(task, function):
+    """The task's own timeout takes precedence over the function's"""
+    function.timeout = 60
+    function.save()
+
+    assert _generate_task_message(task, {})["timeout"] == 60
+
+    task.timeout = 5
+
+    assert _generate_task_message(task, {})["timeout"] == 5
+
+
+@pytest.mark.django_db
+def test_timeout_termination_sets_status(task):
+    task.status = Task.IN_PROGRESS
+    task.save()
+
+    record_task_result(
+        {
+            "task_id": task.id,
+            "status": 137,
+            "output": "started",
+            "result": "",
+            "termination": "TIMEOUT",
+        }
+    )
+    task.refresh_from_db()
+
+    assert task.status == Task.TIMEOUT
+    assert task.log == "started"
+
+
+@pytest.mark.django_db
+def test_publish_task_records_published_at(mocker, task):
+    mocker.patch("core.utils.tasking.send_message")
+
+    publish_task.apply(kwargs={"task_id": task.id})
+
+    assert TaskTimings.objects.get(task=task).published_at is not None
+
+
+@pytest.mark.django_db
+def test_publish_task_batch_retries_failed_tasks(mocker, task, function, admin_user):
+    failing_task = Task.objects.create(
+        tasked_object=function,
+        environment=function.environment,
+        parameters={},
+        creator=admin_user,
+    )
+    send_message = mocker.patch("core.utils.tasking.send_message")
+    send_message.side_effect = [Exception("unroutable"), None]
+    apply_async = mocker.patch.object(publish_task, "apply_async")
+
+    publish_task_batch.apply(kwargs={"task_ids": [failing_task.id, task.id]})
+
+    assert send_message.call_count == 2
+    assert apply_async.call_args.kwargs["kwargs"] == {"task_id": failing_task.id}
+    assert TaskTimings.objects.filter(task=task).exists()
+    assert not TaskTimings.objects.filter(task=failing_task).exists()
+
+
+@pytest.mark.django_db
+def test_start_tasks_publishes_in_batches(
+    mocker,
+    function,
+    workflow_task,
+    environment,
+    admin_user,
+    django_capture_on_commit_callbacks,
+):
+    mocker.patch("core.utils.tasking.PUBLISH_BATCH_SIZE", 2)
+    delay = mocker.patch.object(publish_task_batch, "delay")
+    start_workflow_task = mocker.patch("core.utils.tasking._start_workflow_task")
+    tasks = Task.objects.bulk_create(
+        Task(
+            tasked_object=function,
+            environment=environment,
+            parameters={},
+            creator=admin_user,
+        )
+        for _ in range(3)
+    )
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        start_tasks([*tasks, workflow_task])
+
+    delay.assert_not_called()
+    start_workflow_task.assert_not_called()
+    assert not Task.objects.filter(status=Task.PENDING, tasked_id=function.id).exists()
+
+    callbacks[0]()
+
+    assert [call.kwargs["task_ids"] for call in delay.call_args_list] == [
+        [tasks[0].id, tasks[1].id],
+        [tasks[2].id],
+    ]
+    start_workflow_task.assert_called_once_with(workflow_task)
+    assert not Task.objects.filter(status=Task.PENDING).exists()
+
+
+@pytest.mark.django_db
+def test_start_tasks_rejects_started_tasks(mocker, task):
+    delay = mocker.patch.object(publish_task_batch, "delay")
+    task.status = Task.IN_PROGRESS
+
+    with pytest.raises(InvalidStatus):
+        start_tasks([task])
+
+    delay.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_record_task_result_records_timings(task):
+    completed_at = time.time()
+
+    record_task_result(
+        {
+            "task_id": task.id,
+            "status": 0,
+            "output": "",
+            "result": "",
+            "timings": {
+                "started_at": completed_at - 3,
+                "completed_at": completed_at,
+                "phases": {"run": 2.5, "pull": 0.5},
+            },
+        }
+    )
+    timings = TaskTimings.objects.get(task=task)
+
+    assert timings.started_at < timings.completed_at <= timings.recorded_at
+    assert [phase for phase, _ in timings.breakdown] == ["pull", "run", "publish"]
+    assert timings.phases["publish"] >= 0
+
+
+@pytest.mark.django_db
+def test_record_task_result_records_usage(task):
+    usage = {
+        "samples": 3,
+        "peak_memory": 2048,
+        "cpu_seconds": 1.5,
+        "block_read": 10,
+        "block_write": 20,
+        "network_rx": 30,
+        "network_tx": 40,
+    }
+
+    record_task_result(
+        {"task_id": task.id, "status": 0, "output": "", "result": "", "usage": usage}
+    )
+    task_usage = TaskUsage.objects.get(task=task)
+
+    assert task_usage.peak_memory == 2048
+    assert task_usage.cpu_seconds == 1.5
+    assert task_usage.network_tx == 40
+
+
+@pytest.mark.django_db
+def test_record_task_result_without_timings(task):
+    record_task_result({"task_id": task.id, "status": 0, "output": "", "result": ""})
+    timings = TaskTimings.objects.get(task=task)
+
+    assert timings.recorded_at is not None
+    assert timings.breakdown == []
+
+
+@pytest.mark.django_db
+def test_record_task_result_ignores_duplicate(task):
+    record_task_result(
+        {"task_id": task.id, "status": 0, "output": "first", "result": "1"}
+    )
+    record_task_result(
+        {"task_id": task.id, "status": 1, "output": "late", "result": "2"}
+    )
+    task.refresh_from_db()
+
+    assert task.status == Task.COMPLETE
+    assert task.result == 1
+    assert task.log == "first"
+
+
+@pytest.fixture
+def tasks(function, environment, admin_user):
+    return Task.objects.bulk_create(
+        Task(
+            tasked_object=function,
+            environment=environment,
+            parameters={},
+            status=Task.IN_PROGRESS,
+            creator=admin_user,
+        )
+        for _ in range(10)
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("var3")
+def test_record_task_results(mocker, tasks, django_assert_max_num_queries):
+    """Results are recorded together, with queries per step rather than per result"""
+    record_task_result = mocker.spy(tasking, "record_task_result")
+    TaskLog.objects.create(task=tasks[0]).save_log("streamed")
+    TaskTimings.objects.create(task=tasks[0], published_at=datetime.now(timezone.utc))
+    Task.objects.filter(id=tasks[1].id).update(status=Task.CANCELED)
+    messages = [
+        {
+            "task_id": str(task.id),
+            "status": index % 2,
+            "output": f"output {index} hide me",
+            "result": str(index),
+            "timings": {"phases": {"run": 1.0}},
+            "usage": {"peak_memory": index},
+        }
+        for index, task in enumerate(tasks)
+    ]
+
+    with django_assert_max_num_queries(20):
+        record_task_results(messages)
+
+    record_task_result.assert_not_called()
+
+    for index, task in enumerate(tasks[1:], start=1):
+        task.refresh_from_db()
+
+        assert task.result == index
+        assert task.log == f"output {index} ********"
+        assert task.tasktimings.phases["run"] == 1.0
+        assert task.taskusage.peak_memory == index
+
+    assert tasks[1].status == Task.CANCELED
+    assert tasks[2].status == Task.COMPLETE
+    assert tasks[3].status == Task.ERROR
+    assert TaskLog.objects.get(task=tasks[0]).log == "output 0 ********"
+    assert TaskTimings.objects.get(task=tasks[0]).published_at is not None
+
+
+@pytest.mark.django_db
+def test_record_task_results_skips_bad_results(mocker, tasks):
+    """A result that can't be recorded, or was already, doesn't stop the rest"""
+    send_message = mocker.patch("core.utils.tasking.send_message")
+    record_task_result(
+        {"task_id": tasks[0].id, "status": 0, "output": "first", "result": "1"}
+    )
+
+    record_task_results(
+        [
+            {"task_id": tasks[0].id, "status": 1, "output": "late", "result": "2"},
+            {"task_id": tasks[1].id, "status": 0, "output": ""},
+            {"task_id": tasks[2].id, "status": 0, "output": "", "result": "3"},
+            {"task_id": tasks[2].id, "status": 1, "output": "", "result": "4"},
+            {
+                "task_id": tasks[3].id,
+                "status": 0,
+                "output": "",
+                "result_ref": {"key": "other/task_results/key"},
+            },
+            {"task_id": "not-a-task"},
+        ]
+    )
+
+    for task in tasks:
+        task.refresh_from_db()
+
+    assert tasks[0].result == 1
+    assert tasks[1].status == Task.IN_PROGRESS
+    assert tasks[2].result == 3
+    assert tasks[2].status == Task.COMPLETE
+    assert tasks[3].status == Task.IN_PROGRESS
+    assert not TaskResult.objects.filter(task__in=[tasks[1], tasks[3]]).exists()
+
+    # Only the results that failed are dead lettered, not duplicates or unknown tasks
+    dead_letters = {
+        call.args[3]["task_id"]: call.args[:3] for call in send_message.call_args_list
+    }
+    assert dead_letters == {
+        tasks[1].id: ("", TASK_RESULTS_DEAD_LETTER_QUEUE, "TASK_RESULT"),
+        tasks[3].id: ("", TASK_RESULTS_DEAD_LETTER_QUEUE, "TASK_RESULT"),
+    }
+
+
+@pytest.mark.django_db
+def test_record_task_results_rechecks_tasks_after_storing_output(mocker, tasks):
+    """Tasks are locked only after their output is stored, so a result recorded or a
+    cancellation made in the meantime is kept, and the extra output is deleted"""
+    store_task_outputs = tasking._store_task_outputs
+    stored = {}
+
+    def _store_task_outputs(task_outputs):
+        outputs = store_task_outputs(task_outputs)
+        stored.update((log.task_id, files[0].name) for log, _, files in outputs)
+        record_task_result(
+            {"task_id": tasks[0].id, "status": 0, "output": "first", "result": "1"}
+        )
+        Task.objects.filter(id=tasks[1].id).update(status=Task.CANCELED)
+
+        return outputs
+
+    mocker.patch.object(tasking, "_store_task_outputs", _store_task_outputs)
+
+    record_task_results(
+        [
+            {"task_id": task.id, "status": 0, "output": "batch", "result": "2"}
+            for task in tasks[:2]
+        ]
+    )
+
+    for task in tasks[:2]:
+        task.refresh_from_db()
+
+    assert tasks[0].result == 1
+    assert tasks[0].log == "first"
+    assert not default_storage.exists(stored[tasks[0].id])
+    assert tasks[1].status == Task.CANCELED
+    assert tasks[1].result == 2
+    assert default_storage.exists(stored[tasks[1].id])
+
+
+@pytest.mark.django_db
+def test_record_task_results_deletes_stored_output_on_failure(mocker, tasks):
+    """Output stored for results that fail to be saved together isn't left behind"""
+    mocker.patch.object(tasking, "record_task_result")
+    mocker.patch.object(
+        tasking, "_save_task_outputs", side_effect=Exception("deadlock")
+    )
+    delete_stored_files = mocker.spy(tasking, "_delete_stored_files")
+
+    record_task_results(
+        [{"task_id": tasks[0].id, "status": 0, "output": "log", "result": "1"}]
+    )
+
+    (files,) = delete_stored_files.call_args.args
+    assert len(files) == 2
+    assert not any(default_storage.exists(file.name) for file in files)
+
+
+@pytest.mark.django_db
+def test_record_task_results_falls_back_to_each(mocker, tasks):
+    """Each result is recorded in turn if they can't be recorded together"""
+    mocker.patch.object(
+        tasking, "_record_task_results", side_effect=Exception("deadlock")
+    )
+
+    record_task_results(
+        [
+            {"task_id": task.id, "status": 0, "output": "", "result": "1"}
+            for task in tasks[:2]
+        ]
+    )
+
+    assert TaskResult.objects.filter(task__in=tasks[:2]).count() == 2
+
+
+@pytest.mark.django_db
+def test_record_task_results_dead_letters_failures_when_recording_each(mocker, tasks):
+    """Results that can't be recorded on their own are dead lettered too"""
+    send_message = mocker.patch("core.utils.tasking.send_message")
+    mocker.patch.object(
+        tasking, "_record_task_results", side_effect=Exception("deadlock")
+    )
+    messages = [
+        {"task_id": tasks[0].id, "status": 0, "output": "", "result": "1"},
+        {"task_id": tasks[1].id, "status": 0, "output": ""},
+    ]
+
+    record_task_results(messages)
+
+    send_message.assert_called_once_with(
+        "", TASK_RESULTS_DEAD_LETTER_QUEUE, "TASK_RESULT", messages[1], persistent=True
+    )
+    assert TaskResult.objects.filter(task=tasks[0]).exists()
+
+
+@pytest.mark.django_db
+def test_record_task_results_continues_other_workflow_runs(
+    mocker, tasks, workflow, step1, environment, admin_user
+):
+    """A workflow run that fails to continue doesn't stop the rest of the batch's
+    runs from continuing, or get its results recorded again"""
+    for index, task in enumerate(tasks[:3]):
+        workflow_task = Task.objects.create(
+            tasked_object=workflow,
+            environment=environment,
+            parameters={},
+            status=Task.IN_PROGRESS,
+            creator=admin_user,
+        )
+        WorkflowRunStep.objects.create(
+            workflow_task=workflow_task,
+            workflow_step=step1,
+            step_name=step1.name,
+            step_order=index,
+            step_task=task,
+        )
+
+    def handle_workflow_run(workflow_run_step, task):
+        if task.id == tasks[0].id:
+            raise Exception("Unable to start the next step")
+
+    handle = mocker.patch.object(
+        tasking, "_handle_workflow_run", side_effect=handle_workflow_run
+    )
+    record_task_result = mocker.spy(tasking, "record_task_result")
+
+    record_task_results(
+        [
+            {"task_id": task.id, "status": 0, "output": "", "result": "1"}
+            for task in tasks[:3]
+        ]
+    )
+
+    assert {call.args[1].id for call in handle.call_args_list} == {
+        task.id for task in tasks[:3]
+    }
+    record_task_result.assert_not_called()
+    assert TaskResult.objects.filter(task__in=tasks[:3]).count() == 3
+
+
+@pytest.mark.django_db
+def test_cancel_task(mocker, task):
+    send_message = mocker.patch("core.utils.tasking.send_message")
+    task.status = Task.IN_PROGRESS
+    task.save()
+
+    cancel_task(task)
+    task.refresh_from_db()
+
+    assert task.status == Task.CANCELED
+    _, _, msg_type, message = send_message.call_args.args
+    assert msg_type == "CANCEL_TASK"
+    assert message == {"task_id": str(task.id)}
+
+    with pytest.raises(InvalidStatus):
+        cancel_task(task)
+
+
+@pytest.mark.django_db
+def test_result_after_cancel_keeps_status(mocker, task):
+    """The output of a canceled task is recorded but its status doesn't change"""
+    mocker.patch("core.utils.tasking.send_message")
+    task.status = Task.IN_PROGRESS
+    task.save()
+    cancel_task(task)
+
+    record_task_result(
+        {"task_id": task.id, "status": 0, "output": "partial", "result": "1"}
+    )
+    task.refresh_from_db()
+
+    assert task.status == Task.CANCELED
+    assert task.log == "partial"
+
+
+@pytest.mark.django_db
+def test_publish_after_cancel_keeps_status(mocker, task):
+    """A task canceled before it was published isn't published"""
+    send_message = mocker.patch("core.utils.tasking.send_message")
+    cancel_task(task)
+    send_message.reset_mock()
+
+    publish_task.apply(kwargs={"task_id": task.id})
+    task.refresh_from_db()
+
+    assert task.status == Task.CANCELED
+    send_message.assert_not_called()
+    assert not TaskTimings.objects.filter(task=task).exists()
+
+
+@pytest.mark.django_db
+def test_cancel_while_publishing_resends_cancel(mocker, task):
+    """A task canceled while it's being published is canceled on the runners again"""
+    messages = []
+
+    def send_message(exchange, routing_key, msg_type, message):
+        messages.append(msg_type)
+        if msg_type == "TASK_PACKAGE":
+            cancel_task(Task.objects.get(id=task.id))
+
+    mocker.patch("core.utils.tasking.send_message", send_message)
+
+    publish_task.apply(kwargs={"task_id": task.id})
+    task.refresh_from_db()
+
+    assert task.status == Task.CANCELED
+    assert messages == ["TASK_PACKAGE", "CANCEL_TASK", "CANCEL_TASK"]
+    assert not TaskTimings.objects.filter(task=task).exists()
+
+
+@pytest.mark.django_db
+def test_mark_error_keeps_canceled_status(mocker, task):
+    mocker.patch("core.utils.tasking.send_message")
+    cancel_task(task)
+
+    mark_error(task, "Unable to send task to runner.")
+    task.refresh_from_db()
+
+    assert task.status == Task.CANCELED
+    assert not TaskLog.objects.filter(task=task).exists()
+
+
+@pytest.mark.django_db
+def test_cancel_workflow_cancels_running_step(mocker, workflow_task, step1):
+    send_message = mocker.patch("core.utils.tasking.send_message")
+    mocker.patch("core.models.workflow_step.start_task")
+    workflow_task.status = Task.IN_PROGRESS
+    workflow_task.save()
+    generate_run_steps(workflow_task)
+    step1.execute(workflow_task)
+    step_task = workflow_task.steps.get(step_name=step1.name).step_task
+
+    cancel_task(workflow_task)
+    workflow_task.refresh_from_db()
+    step_task.refresh_from_db()
+
+    assert workflow_task.status == Task.CANCELED
+    assert step_task.status == Task.CANCELED
+    assert send_message.call_args.args[3] == {"task_id": str(step_task.id)}
+
+
 @pytest.mark.django_db
 def test_publish_task_errors(mocker, task):
     """Verify that exceptions during publish_task result in a Task ERROR."""
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core.models import Function, Package, Task, TaskTimings, TaskUsage, Team
+from core.utils.usage import get_function_usage
+
+
+@pytest.fixture
+def function():
+    environment = Team.objects.create(name="team").environments.get()
+    package = Package.objects.create(name="testpackage", environment=environment)
+
+    return Function.objects.create(
+        name="testfunction", package=package, environment=environment
+    )
+
+
+def _task(function: Function, user, runtime: float, peak_memory: int) -> Task:
+    task = Task.objects.create(
+        tasked_object=function,
+        environment=function.environment,
+        parameters={},
+        creator=user,
+    )
+    started_at = datetime.now(timezone.utc)
+    TaskTimings.objects.create(
+        task=task,
+        started_at=started_at,
+        completed_at=started_at + timedelta(seconds=runtime),
+    )
+    TaskUsage.objects.create(task=task, samples=1, peak_memory=peak_memory)
+
+    return task
+
+
+@pytest.mark.django_db
+def test_function_usage_percentiles(function, admin_user):
+    for seconds in range(1, 21):
+        _task(function, admin_user, seconds, seconds * 1024)
+
+    usage = get_function_usage(function)
+
+    assert usage.tasks == 20
+    assert usage.runtime_p50 == 10
+    assert usage.runtime_p95 == 19
+    assert usage.peak_memory_p95 == 19 * 1024
+    assert usage.peak_memory_max == 20 * 1024
+
+
+@pytest.mark.django_db
+def test_function_usage_limited_to_recent_tasks(function, admin_user):
+    for seconds in range(1, 6):
+        _task(function, admin_user, seconds, 1024)
+
+    assert get_function_usage(function, limit=2).tasks == 2
+
+
+@pytest.mark.django_db
+def test_function_usage_without_tasks(function):
+    usage = get_function_usage(function)
+
+    assert usage.tasks == 0
+    assert usage.runtime_p50 is None
+    assert usage.peak_memory_max is None
@@ -1,4 +1,10 @@
+from time import monotonic
+
 from constance.admin import get_values
+from django.conf import settings
+
+# The values read from constance, along with when they were read, see _get_values
+_values: tuple[float, dict] | None = None
 
 
 class SettingsBox:
@@ -12,6 +18,10 @@ class SettingsBox:
 def get_config(keys: list[str]) -> SettingsBox:
     """This function will query constance and return the values matching the given keys.
 
+    The values are cached by each process for CONSTANCE_VALUES_TTL seconds. A setting
+    changed by this process is seen straight away, see invalidate_config, but other
+    processes only see it once the TTL has passed.
+
     Args:
         keys: List of names of keys to return
 
@@ -19,8 +29,35 @@ def get_config(keys: list[str]) -> SettingsBox:
         A wrapped dict allowing for settings access via property. A missing key will
         raise a KeyError.
     """
-    # The import for get_values may need to change to constance.utils in v3.0
-    all_values = get_values()
+    all_values = _get_values()
     config = SettingsBox({key: all_values[key] for key in keys})
 
     return config
+
+
+def invalidate_config(**kwargs) -> None:
+    """Receiver for constance's config_updated signal, so get_config reads the values
+    again
+
+    Only the values cached by this process are dropped. Other processes, such as the
+    listener and celery workers, see the change once CONSTANCE_VALUES_TTL seconds have
+    passed.
+    """
+    global _values
+    _values = None
+
+
+def _get_values() -> dict:
+    """Returns every constance value, reading them only if the cached ones are stale"""
+    global _values
+
+    cached = _values
+
+    if cached is not None and monotonic() - cached[0] < settings.CONSTANCE_VALUES_TTL:
+        return cached[1]
+
+    # The import for get_values may need to change to constance.utils in v3.0
+    values = get_values()
+    _values = (monotonic(), values)
+
+    return values
@@ -1,55 +1,300 @@
 import json
 import logging
+from threading import Event, Thread
+from time import sleep
 
-from core.utils.messaging import build_connection
-from core.utils.tasking import record_task_result
+import pika
+from django.conf import settings
+
+from core.utils.messaging import (
+    TASK_RESULTS_DEAD_LETTER_QUEUE,
+    TASK_RESULTS_QUEUE,
+    build_connection,
+)
+from core.utils.tasking import (
+    record_task_log_chunk,
+    record_task_result_batch,
+    record_task_results,
+)
 
 logger = logging.getLogger(__name__)
 
+# Seconds a consumer waits before reconnecting after losing its connection
+RECONNECT_DELAY = 5
+
+
+class ResultConsumer:
+    """Consumes the messages runners send to the TASK_RESULTS_QUEUE, handing them off
+    to workers
+
+    Each consumer has its own connection, so any number of them can share the
+    messages, whether in one listener or many. A message that can't be handed off is
+    rejected to the TASK_RESULTS_DEAD_LETTER_QUEUE. A message is acknowledged once it
+    is handed off, so a result the worker then fails to record is sent there by the
+    worker, see record_task_results. Should the connection be lost the consumer
+    reconnects, until it is stopped.
+
+    Args:
+        name: Identifies the consumer in the logs
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._connection = None
+        self._channel = None
+        self._stopping = Event()
+
+        # The delivery tags and bodies of the TASK_RESULT messages received since
+        # they were last handed off, along with the timeout that will hand them off,
+        # see _collect_task_result
+        self._pending_results: list[tuple[int, dict]] = []
+        self._pending_timeout = None
+
+    def run(self) -> None:
+        """Consumes messages until stop is called"""
+        while not self._stopping.is_set():
+            try:
+                self._connection = build_connection(
+                    open_callback=self._on_connection_open,
+                    close_callback=self._on_connection_closed,
+                )
+                self._connection.ioloop.start()
+            except Exception as exc:
+                logger.error("Consumer %s failed: %r", self.name, exc)
+
+            self._channel = None
+            self._pending_results.clear()
+            self._pending_timeout = None
+
+            if not self._stopping.wait(RECONNECT_DELAY):
+                logger.info("Consumer %s reconnecting", self.name)
+
+    def stop(self) -> None:
+        """Hands off the pending results and closes the connection. Can be called
+        from any thread."""
+        self._stopping.set()
+
+        if (connection := self._connection) is not None:
+            connection.ioloop.add_callback_threadsafe(self._close)
+
+    def _close(self) -> None:
+        if self._channel is not None and self._channel.is_open:
+            self._hand_off_results()
 
-def start_listening():
-    logger.info("Starting listener")
-    connection = build_connection(open_callback=_on_connection_open)
+        if self._connection.is_open:
+            self._connection.close()
+        elif self._connection.is_closed:
+            self._connection.ioloop.stop()
+
+    def _on_connection_open(self, connection):
+        """Called when we are fully connected to RabbitMQ"""
+        logger.info("Consumer %s connected", self.name)
+
+        # Stopped while connecting
+        if self._stopping.is_set():
+            connection.close()
+        else:
+            connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_closed(self, connection, reason):
+        """Called when the connection closes, whether or not it was asked to"""
+        if not self._stopping.is_set():
+            logger.warning("Consumer %s connection closed: %s", self.name, reason)
+
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, new_channel):
+        """Called when our channel has opened"""
+        logger.debug("Channel opened")
+        self._channel = new_channel
+        new_channel.add_on_close_callback(self._on_channel_closed)
+
+        # Bound the results held unacknowledged while they're collected
+        new_channel.basic_qos(prefetch_count=settings.LISTENER_PREFETCH_COUNT)
+
+        # TODO: Generalize this to support consuming of more than just tasking results
+        new_channel.basic_consume(TASK_RESULTS_QUEUE, self._handle_delivery)
+
+    def _on_channel_closed(self, channel, reason):
+        """Called when the channel closes, such as when the queue is missing. The
+        connection is closed too, so that the consumer reconnects."""
+        logger.warning("Consumer %s channel closed: %s", self.name, reason)
+        self._channel = None
+
+        if self._connection.is_open:
+            self._connection.close()
+
+    def _handle_delivery(self, channel, deliver, properties, body):
+        """Called when we receive a message from RabbitMQ"""
+        try:
+            msg_type = (properties.headers or {}).get("x-msg-type", "__NONE__")
+            msg_body = json.loads(body.decode())
+
+            logger.info("Received message %s", msg_type)
+
+            match msg_type:
+                case "TASK_RESULT":
+                    # Acknowledged once handed off with the rest of its batch
+                    self._collect_task_result(deliver.delivery_tag, msg_body)
+                    return
+                case "TASK_RESULT_BATCH":
+                    record_task_result_batch.delay(msg_body)
+                case "TASK_LOG_CHUNK":
+                    record_task_log_chunk.delay(msg_body)
+                case _:
+                    raise ValueError(f"Unrecognized message type: {msg_type}")
+        except Exception as exc:
+            logger.error("Error handling received message: %s", exc)
+            channel.basic_nack(deliver.delivery_tag, requeue=False)
+            return
+
+        channel.basic_ack(deliver.delivery_tag)
+
+    def _collect_task_result(self, delivery_tag: int, msg_body: dict) -> None:
+        """Holds a TASK_RESULT until LISTENER_RESULT_BATCH_SIZE have been received, or
+        LISTENER_RESULT_BATCH_WINDOW seconds have passed, so that they can be recorded
+        together by record_task_results"""
+        self._pending_results.append((delivery_tag, msg_body))
+
+        if len(self._pending_results) >= settings.LISTENER_RESULT_BATCH_SIZE:
+            self._hand_off_results()
+        elif self._pending_timeout is None:
+            self._pending_timeout = self._connection.ioloop.call_later(
+                settings.LISTENER_RESULT_BATCH_WINDOW, self._hand_off_results
+            )
+
+    def _hand_off_results(self) -> None:
+        """Hands the pending TASK_RESULTs to a worker, acknowledging them once it has
+        them, or rejecting them if it can't be given them. The worker dead letters any
+        it can't record."""
+        if self._pending_timeout is not None:
+            self._connection.ioloop.remove_timeout(self._pending_timeout)
+            self._pending_timeout = None
+
+        if not self._pending_results:
+            return
+
+        delivery_tags = [delivery_tag for delivery_tag, _ in self._pending_results]
+        msg_bodies = [msg_body for _, msg_body in self._pending_results]
+        self._pending_results.clear()
+
+        try:
+            record_task_results.delay(msg_bodies)
+        except Exception as exc:
+            logger.error("Error handing off %d results: %s", len(msg_bodies), exc)
+
+            for delivery_tag in delivery_tags:
+                self._channel.basic_nack(delivery_tag, requeue=False)
+
+            return
+
+        logger.debug("Handed off %d results", len(msg_bodies))
+
+        for delivery_tag in delivery_tags:
+            self._channel.basic_ack(delivery_tag)
+
+
+def start_listening(consumers: int = 1):
+    """Runs the given number of ResultConsumers, each in its own thread, until
+    interrupted"""
+    logger.info("Starting listener with %d consumers", consumers)
+    result_consumers = [ResultConsumer(str(number)) for number in range(consumers)]
+    threads = [
+        Thread(target=consumer.run, name=f"consumer-{consumer.name}")
+        for consumer in result_consumers
+    ]
+
+    for thread in threads:
+        thread.start()
 
     try:
-        connection.ioloop.start()
+        while any(thread.is_alive() for thread in threads):
+            sleep(1)
     except KeyboardInterrupt:
-        connection.close()
+        for consumer in result_consumers:
+            consumer.stop()
+
+        # Wait until they're fully closed, they'll stop on their own
+        for thread in threads:
+            thread.join()
+
+
+def get_dead_letters(limit: int) -> list[dict]:
+    """Describes up to limit of the messages in the TASK_RESULTS_DEAD_LETTER_QUEUE,
+    leaving them there
+
+    Returns:
+        A dict for each message, with the "msg_type" and "body" of the message, along
+        with the "deaths" that RabbitMQ recorded for it
+    """
+    connection = build_connection()
+    dead_letters = []
 
-        # Loop until we're fully closed, will stop on its own
-        connection.ioloop.start()
+    try:
+        channel = connection.channel()
+
+        # The messages are left unacknowledged until the channel closes, which
+        # returns them to the queue
+        while len(dead_letters) < limit:
+            method, properties, body = channel.basic_get(TASK_RESULTS_DEAD_LETTER_QUEUE)
 
+            if method is None:
+                break
 
-def _on_connection_open(connection):
-    """Called when we are fully connected to RabbitMQ"""
-    logger.info("Connected")
-    connection.channel(on_open_callback=_on_channel_open)
+            headers = properties.headers or {}
+            dead_letters.append(
+                {
+                    "msg_type": headers.get("x-msg-type"),
+                    "body": body.decode(),
+                    "deaths": headers.get("x-death", []),
+                }
+            )
+    finally:
+        connection.close()
 
+    return dead_letters
 
-def _on_channel_open(new_channel):
-    """Called when our channel has opened"""
-    logger.debug("Channel opened")
 
-    # TODO: Generalize this to support consuming of more than just tasking results
-    new_channel.basic_consume("tasking.results", _handle_delivery)
+def replay_dead_letters(limit: int) -> int:
+    """Moves up to limit of the messages in the TASK_RESULTS_DEAD_LETTER_QUEUE back
+    to the TASK_RESULTS_QUEUE, for the listener to handle again
 
+    Only the messages in the queue when this starts are replayed, so that ones that
+    are rejected again aren't replayed over and over.
 
-def _handle_delivery(channel, deliver, properties, body):
-    """Called when we receive a message from RabbitMQ"""
+    Returns:
+        The number of messages that were replayed
+    """
+    connection = build_connection()
+    replayed = 0
 
-    # TODO: Implement handling of specific exceptions
     try:
-        msg_type = properties.headers.get("x-msg-type", "__NONE__")
-        msg_body = json.loads(body.decode())
+        channel = connection.channel()
+        channel.confirm_delivery()
+        queue = channel.queue_declare(TASK_RESULTS_DEAD_LETTER_QUEUE, passive=True)
+        limit = min(limit, queue.method.message_count)
 
-        logger.info("Received message %s", msg_type)
+        while replayed < limit:
+            method, properties, body = channel.basic_get(TASK_RESULTS_DEAD_LETTER_QUEUE)
 
-        match msg_type:
-            case "TASK_RESULT":
-                record_task_result.delay(msg_body)
-            case _:
-                logger.error("Unrecognized message type: %s", msg_type)
+            if method is None:
+                break
 
-        channel.basic_ack(deliver.delivery_tag)
-    except Exception as exc:
-        logger.error("Error handling received message: %s", exc)
+            channel.basic_publish(
+                exchange="",
+                routing_key=TASK_RESULTS_QUEUE,
+                body=body,
+                properties=pika.BasicProperties(
+                    content_type=properties.content_type,
+                    content_encoding=properties.content_encoding,
+                    headers=properties.headers,
+                    delivery_mode=properties.delivery_mode,
+                ),
+                mandatory=True,
+            )
+            channel.basic_ack(method.delivery_tag)
+            replayed += 1
+    finally:
+        connection.close()
+
+    return replayed
@@ -1,11 +1,20 @@
 import json
 import logging
+import os
 import ssl
-from time import sleep
+from threading import Lock, Semaphore
+from time import monotonic, sleep
 from typing import Tuple
 
 import pika
-from pika.exceptions import AMQPConnectionError, UnroutableError
+from django.conf import settings
+from pika.exceptions import (
+    AMQPConnectionError,
+    ChannelClosed,
+    ChannelClosedByBroker,
+    ChannelWrongStateError,
+    UnroutableError,
+)
 from pika.exchange_type import ExchangeType
 
 from .rabbitmq import get_rabbitmq_config
@@ -14,7 +23,20 @@ logger = logging.getLogger(__name__)
 
 PUBLIC_EXCHANGE = "runners.public"
 PUBLIC_QUEUE = "public"
+# Messages sent here are received by every runner, each binds its own queue
+BROADCAST_EXCHANGE = "runners.broadcast"
 TASK_RESULTS_QUEUE = "tasking.results"
+# Messages the listener is unable to handle are rejected to here, and results a worker
+# is unable to record are sent here, see dead_letters
+TASK_RESULTS_DEAD_LETTER_QUEUE = "tasking.results.dead"
+TASK_RESULTS_QUEUE_ARGUMENTS = {
+    "x-dead-letter-exchange": "",
+    "x-dead-letter-routing-key": TASK_RESULTS_DEAD_LETTER_QUEUE,
+}
+
+# Seconds the broker connection parameters are reused for before the RabbitMQ
+# settings are read again, see get_connection_parameters
+PARAMETERS_TTL = 60
 
 
 def _get_ssl_options(config) -> pika.SSLOptions | None:
@@ -46,6 +68,7 @@ def _get_credentials(config) -> pika.PlainCredentials | None:
 
 def build_connection(
     open_callback=None,
+    close_callback=None,
 ) -> pika.SelectConnection | pika.BlockingConnection:
     """Creates a connection to RabbitMQ.
 
@@ -55,26 +78,191 @@ def build_connection(
     Args:
       open_callback: If populated, will return a select connection
         with this as the open callback.
+      close_callback: The close callback of a select connection.
 
     Returns:
       A pika.SelectConnection if open_callback is populated, otherwise
       a pika.BlockingConnection.
     """
+    parameters = _build_parameters()
+
+    if open_callback:
+        return pika.SelectConnection(
+            parameters,
+            on_open_callback=open_callback,
+            on_close_callback=close_callback,
+        )
+    else:
+        return pika.BlockingConnection(parameters)
+
+
+def _build_parameters() -> pika.ConnectionParameters:
+    """Builds the connection parameters from the RabbitMQ settings"""
     config = get_rabbitmq_config()
-    ssl_options = _get_ssl_options(config)
-    credentials = _get_credentials(config)
 
-    parameters = pika.ConnectionParameters(
+    return pika.ConnectionParameters(
         host=config.RABBITMQ_HOST,
         port=config.RABBITMQ_PORT,
-        credentials=credentials,
-        ssl_options=ssl_options,
+        credentials=_get_credentials(config),
+        ssl_options=_get_ssl_options(config),
     )
 
-    if open_callback:
-        return pika.SelectConnection(parameters, on_open_callback=open_callback)
-    else:
-        return pika.BlockingConnection(parameters)
+
+# The connection parameters along with when they were built, see
+# get_connection_parameters
+_parameters: tuple[float, pika.ConnectionParameters] | None = None
+
+
+def get_connection_parameters() -> pika.ConnectionParameters:
+    """Returns the connection parameters for publishing
+
+    Reading the RabbitMQ settings queries the database and setting up TLS loads the
+    certificates, so the parameters are reused for PARAMETERS_TTL seconds. They are
+    built again sooner if connecting with them fails, see clear_connection_parameters.
+    """
+    global _parameters
+
+    if _parameters is None or monotonic() - _parameters[0] > PARAMETERS_TTL:
+        _parameters = (monotonic(), _build_parameters())
+
+    return _parameters[1]
+
+
+def clear_connection_parameters() -> None:
+    """Forget the connection parameters, so the settings are read again"""
+    global _parameters
+    _parameters = None
+
+
+class Publisher:
+    """Publishes JSON messages over a long lived connection
+
+    The connection and its confirm mode channel are opened on first use and reused
+    for every message after that. If the connection or channel turn out to have been
+    closed, for example by a broker restart or missed heartbeats, they are reopened
+    and the publish is attempted once more.
+
+    A Publisher is used by one thread at a time, see PublisherPool.
+    """
+
+    def __init__(self):
+        self._connection: pika.BlockingConnection | None = None
+        self._channel = None
+
+    def _get_channel(self):
+        """Returns the open publishing channel, opening it if necessary"""
+        if self._channel is None or not self._channel.is_open:
+            if self._connection is None or not self._connection.is_open:
+                try:
+                    self._connection = pika.BlockingConnection(
+                        get_connection_parameters()
+                    )
+                except AMQPConnectionError:
+                    # The settings may have changed
+                    clear_connection_parameters()
+                    raise
+
+            self._channel = self._connection.channel()
+            self._channel.confirm_delivery()
+
+        return self._channel
+
+    def close(self):
+        """Close the connection, the next publish reconnects"""
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except Exception as exc:
+            logger.debug("Error closing publisher connection: %s", exc)
+
+        self._connection = None
+        self._channel = None
+
+    def publish(self, exchange: str, routing_key: str, body: str, properties) -> None:
+        """Publish a message, reconnecting once if the connection was lost
+
+        Raises:
+            pika.exceptions.UnroutableError: if unable to publish the message
+            pika.exceptions.AMQPConnectionError: if unable to reconnect
+        """
+        try:
+            self._publish(exchange, routing_key, body, properties)
+        except (AMQPConnectionError, ChannelClosed, ChannelWrongStateError):
+            self.close()
+            logger.info("Publisher connection lost, reconnecting")
+
+            try:
+                self._publish(exchange, routing_key, body, properties)
+            except (AMQPConnectionError, ChannelClosed, ChannelWrongStateError):
+                self.close()
+                raise
+
+    def _publish(self, exchange: str, routing_key: str, body: str, properties):
+        self._get_channel().basic_publish(
+            exchange=exchange,
+            routing_key=routing_key,
+            body=body,
+            properties=properties,
+            mandatory=True,
+        )
+
+
+class PublisherPool:
+    """Publishers shared by the threads of a process
+
+    Each publish borrows an idle Publisher, opening a new one while there are fewer
+    than size, and otherwise waits for one to be returned. The most recently used
+    Publisher is borrowed first, so that connections beyond those needed for the
+    usual load sit idle rather than being used in turn.
+
+    Attributes:
+        size: The most publishers, and so broker connections, in the pool
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+
+        self._lock = Lock()
+        self._available = Semaphore(size)
+        self._idle: list[Publisher] = []
+
+    def publish(self, exchange: str, routing_key: str, body: str, properties) -> None:
+        """Publish a message with a borrowed Publisher, see Publisher.publish"""
+        with self._available:
+            with self._lock:
+                publisher = self._idle.pop() if self._idle else Publisher()
+
+            try:
+                publisher.publish(exchange, routing_key, body, properties)
+            finally:
+                with self._lock:
+                    self._idle.append(publisher)
+
+    def close(self) -> None:
+        """Close the connections of the idle publishers"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+
+        for publisher in idle:
+            publisher.close()
+
+
+# Pool for this process along with the pid it was created in. Connections can't be
+# shared across a fork, so celery pool processes each get their own.
+_publisher_pool: tuple[int, PublisherPool] | None = None
+
+
+def get_publisher_pool() -> PublisherPool:
+    """Returns the PublisherPool for the current process"""
+    global _publisher_pool
+
+    if _publisher_pool is None or _publisher_pool[0] != os.getpid():
+        _publisher_pool = (
+            os.getpid(),
+            PublisherPool(settings.MESSAGING_PUBLISHER_POOL_SIZE),
+        )
+
+    return _publisher_pool[1]
 
 
 def get_route(task) -> Tuple[str, str]:
@@ -91,50 +279,40 @@ def get_route(task) -> Tuple[str, str]:
     return (PUBLIC_EXCHANGE, PUBLIC_QUEUE)
 
 
-def send_message(exchange, routing_key, msg_type, message):
+def send_message(exchange, routing_key, msg_type, message, persistent=False):
     """Sends a JSON message to the specified queue.
 
     Sends the given message to the queue. If msg_type is populated, it
-    sets the x-msg-type header to that value.
+    sets the x-msg-type header to that value. The message is published over a
+    persistent connection from this process' PublisherPool.
 
     Args:
         exchange: The message broker exchange to send the message to
         routing_key: The routing key to use when delivering the message
         msg_type: The value of x-msg-type to set in the header, or None
         message: The message to send, must be valid JSON.
+        persistent: Whether the broker should keep the message if it restarts
 
     Raises:
         pika.exceptions.UnroutableError: if unable to publish the message
     """
 
     headers = {"x-msg-type": msg_type} if msg_type else {}
-
-    # TODO Update this to use a persistent connection to the queue
     publish_props = pika.BasicProperties(
         content_type="application/json",
         content_encoding="utf-8",
         headers=headers,
-        delivery_mode=1,
+        delivery_mode=2 if persistent else 1,
     )
 
-    connection = build_connection()
-    channel = connection.channel()
-    channel.confirm_delivery()
-
     try:
-        channel.basic_publish(
-            exchange=exchange,
-            routing_key=routing_key,
-            body=json.dumps(message),
-            properties=publish_props,
-            mandatory=True,
+        get_publisher_pool().publish(
+            exchange, routing_key, json.dumps(message), publish_props
         )
     except UnroutableError as ue:
         # TODO revisit this and handle exceptions better. Currently used for retry logic
         logger.error("Failed to send message to %s using %s", exchange, routing_key)
         raise ue
-    finally:
-        connection.close()
 
 
 def initialize_messaging():
@@ -153,8 +331,39 @@ def initialize_messaging():
     channel.queue_declare(PUBLIC_QUEUE, durable=True, auto_delete=False)
     channel.queue_bind(PUBLIC_QUEUE, PUBLIC_EXCHANGE)
 
+    logger.debug("Configuring rabbitmq exchange: %s", BROADCAST_EXCHANGE)
+    channel.exchange_declare(
+        BROADCAST_EXCHANGE,
+        exchange_type=ExchangeType.fanout,
+        durable=True,
+        auto_delete=False,
+    )
+
+    logger.debug("Configuring rabbitmq queue: %s", TASK_RESULTS_DEAD_LETTER_QUEUE)
+    channel.queue_declare(
+        TASK_RESULTS_DEAD_LETTER_QUEUE, durable=True, auto_delete=False
+    )
+
     logger.debug("Configuring rabbitmq queue: %s", TASK_RESULTS_QUEUE)
-    channel.queue_declare(TASK_RESULTS_QUEUE, durable=True, auto_delete=False)
+    try:
+        channel.queue_declare(
+            TASK_RESULTS_QUEUE,
+            durable=True,
+            auto_delete=False,
+            arguments=TASK_RESULTS_QUEUE_ARGUMENTS,
+        )
+    except ChannelClosedByBroker as exc:
+        # The queue was declared without dead lettering, and its arguments can't be
+        # changed. A policy can add dead lettering without recreating it.
+        logger.warning(
+            "Unable to configure dead lettering for %s, messages the listener can't "
+            "handle will be dropped until it is recreated or given a policy with "
+            'dead-letter-exchange "" and dead-letter-routing-key %s: %s',
+            TASK_RESULTS_QUEUE,
+            TASK_RESULTS_DEAD_LETTER_QUEUE,
+            exc,
+        )
+        channel = connection.channel()
 
     channel.close()
     connection.close()
@@ -1,7 +1,7 @@
 import datetime
 import json
 from copy import deepcopy
-from typing import TYPE_CHECKING, List, Type, TypeVar, Union
+from typing import TYPE_CHECKING, List, Optional, Type, TypeVar, Union
 
 import jsonschema
 from django.core.exceptions import ValidationError as DjangoValidationError
@@ -41,11 +41,18 @@ DATE_FORMAT = r"%Y-%m-%d"
 DATETIME_FORMAT = r"%Y-%m-%dT%H:%M:%SZ"
 
 
-def _get_pydantic_model(instance: Union["Function", "Workflow"]) -> Type[BaseModel]:
-    """Get a pydantic model describing the parameters of the provided instance"""
+def _get_pydantic_model(
+    instance: Union["Function", "Workflow"],
+    parameters: Optional[List["FunctionParameter"]] = None,
+) -> Type[BaseModel]:
+    """Get a pydantic model describing the parameters of the provided instance. The
+    instance's parameters can be supplied to avoid retrieving them again."""
     params_dict = {}
 
-    for parameter in instance.parameters.all():
+    if parameters is None:
+        parameters = instance.parameters.all()
+
+    for parameter in parameters:
         field = Field()
         field.alias = parameter.name
         field.title = parameter.name
@@ -107,15 +114,11 @@ def _serialize_json_parameters(
 
 
 def _serialize_parameters(
-    parameters: dict, instance: Union["Function", "Workflow"]
+    parameters: dict, instance_parameters: List["FunctionParameter"]
 ) -> dict:
     """Serializes json type parameters for use in validation"""
     parameters_copy = deepcopy(parameters)
-
-    # Retrieve all parameters, then filter later, to avoid multiple database lookups
-    present_parameters = list(
-        instance.parameters.filter(name__in=parameters.keys()).all()
-    )
+    present_parameters = [p for p in instance_parameters if p.name in parameters]
 
     _serialize_date_parameters(parameters_copy, present_parameters)
     _serialize_datetime_parameters(parameters_copy, present_parameters)
@@ -137,10 +140,59 @@ def get_schema(instance: Union["Function", "Workflow"]) -> dict:
     return _get_pydantic_model(instance).schema()
 
 
+class ParameterValidator:
+    """Validates parameters against the parameter definitions of a Function or
+    Workflow
+
+    The pydantic model and JSON schema are built once, so that any number of parameter
+    sets can be validated against them without querying or compiling them again.
+
+    Args:
+        instance: Function or Workflow instance to validate parameters against
+    """
+
+    def __init__(self, instance: Union["Function", "Workflow"]):
+        self.parameters = list(instance.parameters.all())
+        self.model = _get_pydantic_model(instance, self.parameters)
+
+        schema = self.model.schema()
+        validator_class = jsonschema.validators.validator_for(schema)
+        validator_class.check_schema(schema)
+        self.validator = validator_class(schema)
+
+    def validate(self, parameters: dict) -> None:
+        """Validate the provided input parameters
+
+        Args:
+            parameters: dict containing the parameters as key / value pairs
+
+        Raises:
+            ValidationError: The parameters are invalid for the instance
+        """
+        try:
+            serialized_parameters = _serialize_parameters(parameters, self.parameters)
+            self.model(**serialized_parameters)
+
+            error = jsonschema.exceptions.best_match(
+                self.validator.iter_errors(serialized_parameters)
+            )
+            if error is not None:
+                raise error
+        except (
+            ValidationError,
+            jsonschema.ValidationError,
+            json.JSONDecodeError,
+        ) as exc:
+            raise DjangoValidationError(exc)
+
+
 def validate_parameters(parameters: dict, instance: Union["Function", "Workflow"]):
     """Validate the provided input parameters against the instance's parameter
     definitions
 
+    Use a ParameterValidator instead to validate many sets of parameters for the same
+    instance.
+
     Args:
         parameters: dict containing the parameters as key / value pairs
         instance: Function or Workflow instance to validate the parameters against
@@ -148,15 +200,4 @@ def validate_parameters(parameters: dict, instance: Union["Function", "Workflow"
     Raises:
         ValidationError: The parameters are invalid for the provided instance
     """
-    try:
-        pydantic_model = _get_pydantic_model(instance)
-        serialized_parameters = _serialize_parameters(parameters, instance)
-        jsonschema.validate(
-            serialized_parameters, pydantic_model(**serialized_parameters).schema()
-        )
-    except (
-        ValidationError,
-        jsonschema.ValidationError,
-        json.JSONDecodeError,
-    ) as exc:
-        raise DjangoValidationError(exc)
+    ParameterValidator(instance).validate(parameters)
@@ -1,6 +1,7 @@
 import os
 
 from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
 
 from core.utils.constance import get_config
 
@@ -36,3 +37,22 @@ class S3Storage(S3Boto3Storage):
         self.endpoint_url = _get_endpoint_url(config)
         self.use_ssl = config.S3_SECURE
         super().__init__(*args, **kwargs)
+
+    def upload_url(self, name: str, expire: int) -> str:
+        """Returns a presigned URL that the named file can be uploaded to with a PUT
+
+        Args:
+            name: The name the file will be stored under
+            expire: Seconds until the URL expires
+
+        Returns:
+            The presigned URL
+        """
+        params = {
+            "Bucket": self.bucket.name,
+            "Key": self._normalize_name(clean_name(name)),
+        }
+
+        return self.bucket.meta.client.generate_presigned_url(
+            "put_object", Params=params, ExpiresIn=expire, HttpMethod="PUT"
+        )
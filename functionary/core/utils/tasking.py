@@ -1,10 +1,16 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from time import perf_counter, time
 from uuid import UUID
 
 from celery import Task as CeleryTask
 from celery.exceptions import Reject
 from celery.utils.log import get_task_logger
 from django.conf import settings
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
 
 from core.celery import app
 from core.models import (
@@ -12,17 +18,35 @@ from core.models import (
     ScheduledTask,
     Task,
     TaskLog,
+    TaskLogChunk,
     TaskResult,
+    TaskTimings,
+    TaskUsage,
     UserFile,
     Workflow,
     WorkflowRunStep,
 )
-from core.utils.messaging import get_route, send_message
+from core.utils.constance import get_config
+from core.utils.messaging import (
+    BROADCAST_EXCHANGE,
+    TASK_RESULTS_DEAD_LETTER_QUEUE,
+    get_route,
+    send_message,
+)
 from core.utils.parameter import PARAMETER_TYPE
 
 logger = get_task_logger(__name__)
 logger.setLevel(getattr(logging, settings.LOG_LEVEL))
 
+# The most tasks start_tasks hands to a single publish_task_batch
+PUBLISH_BATCH_SIZE = 100
+
+# Threads record_task_results uploads task output to storage with
+OUTPUT_UPLOAD_THREADS = 8
+
+# The TaskUsage fields that can be in the "usage" of a TASK_RESULT message
+USAGE_FIELDS = [field.name for field in TaskUsage._meta.fields if field.name != "task"]
+
 
 class FailedTaskHandler(CeleryTask):
     """Simple wrapper to make sure failed tasks don't stay in progress"""
@@ -66,25 +90,101 @@ def _generate_task_message(task: Task, parameters: dict) -> dict:
         "function": task.function.name,
         "function_parameters": parameters,
         "variables": variables,
+        "timeout": task.effective_timeout,
+        "resources": task.function.package.resources,
+        "upload_urls": _generate_upload_urls(task),
+        # Lets the runner measure how long the task was queued
+        "published_at": time(),
+    }
+
+
+def _generate_upload_urls(task: Task) -> dict:
+    """Generates presigned URLs that the runner can upload large task output to
+
+    Rather than sending the output in the TASK_RESULT message, the runner uploads it
+    straight to where the TaskLog and TaskResult store it and sends a reference. The
+    log is only offered when no masking of protected variables is needed, since that
+    has to happen here.
+
+    Returns:
+        A dict of the output ("output" and/or "result") to its url and storage key.
+        Empty if the storage does not support presigned uploads.
+    """
+    storage = TaskResult.file.field.storage
+
+    if not hasattr(storage, "upload_url"):
+        return {}
+
+    outputs = {"result": TaskResult(task=task)}
+
+    if not _get_protected_values(task):
+        outputs["output"] = TaskLog(task=task)
+
+    config = get_config(["S3_UPLOAD_URL_TIMEOUT_MINUTES"])
+    expire = config.S3_UPLOAD_URL_TIMEOUT_MINUTES * 60
+
+    return {
+        output: {
+            "url": storage.upload_url(task_output.storage_name, expire),
+            "key": task_output.storage_name,
+        }
+        for output, task_output in outputs.items()
     }
 
 
-def _protect_output(task, output):
-    """Mask the values of the tasks protected variables in the output.
+def _get_protected_values(task: Task) -> list[str]:
+    """Returns the protected variable values that should be masked in task output
 
-    Does a simple protection for variable values over 4 characters
-    long. This is arbitrary, but the results are easily reversed if
-    its too short.
+    Only values over 4 characters long are masked. This is arbitrary, but the
+    results are easily reversed if its too short.
     """
-    mask = list(task.variables.filter(protect=True).values_list("value", flat=True))
+    values = task.variables.filter(protect=True).values_list("value", flat=True)
+
+    return [value for value in values if len(value) > 4]
+
+
+def _protect_output(task, output, protected_values=None):
+    """Mask the values of the tasks protected variables in the output. The values
+    can be supplied if they are already known, see _get_protected_values."""
+    if protected_values is None:
+        protected_values = _get_protected_values(task)
+
     protected_output = output
-    for to_mask in mask:
-        if len(to_mask) > 4:
-            protected_output = protected_output.replace(to_mask, "********")
+    for to_mask in protected_values:
+        protected_output = protected_output.replace(to_mask, "********")
 
     return protected_output
 
 
+def _attach_uploaded_output(
+    task_output: TaskLog | TaskResult,
+    task_result_message: dict,
+    field: str,
+    save: bool = True,
+) -> None:
+    """Attach output that the runner uploaded directly to storage
+
+    Args:
+        task_output: The TaskLog or TaskResult the output belongs to
+        task_result_message: The message body from a TASK_RESULT message
+        field: The message field the output would otherwise be in
+        save: Whether to save the task_output
+    """
+    reference = task_result_message[f"{field}_ref"]
+
+    if reference.get("key") != task_output.storage_name:
+        raise ValueError(f"Unexpected storage key {reference.get('key')} for {field}")
+
+    logger.debug(
+        "Task %s %s uploaded by runner (size: %s, sha256: %s)",
+        task_output.task.id,
+        field,
+        reference.get("size"),
+        reference.get("sha256"),
+    )
+    task_output.attach_uploaded(save=save)
+
+
 @app.task(
     base=FailedTaskHandler,
     default_retry_delay=30,
@@ -102,30 +202,67 @@ def publish_task(*, task_id: UUID) -> None:
     """
     logger.debug(f"Publishing message for Task: {task_id}")
 
-    task = (
-        Task.objects.select_related("environment")
-        .prefetch_related("tasked_object")
-        .get(id=task_id)
-    )
+    # Only hold the lock while checking and marking the task, not while the message is
+    # built and sent, so that cancellation and results for it aren't held up
+    with transaction.atomic():
+        task = (
+            Task.objects.select_for_update(of=("self",))
+            .select_related("environment")
+            .prefetch_related("tasked_object")
+            .get(id=task_id)
+        )
+
+        # It may have been canceled before it was published, or between retries
+        if task.finished:
+            logger.info(f"Task {task.id} is {task.status}, not publishing it")
+            return
 
-    try:
         # This may be a retry, make sure the task is marked as IN_PROGRESS
         task.status = Task.IN_PROGRESS
-        task.save()
+        task.save(update_fields=["status"])
 
+    try:
         exchange, routing_key = get_route(task)
-        send_message(
-            exchange,
-            routing_key,
-            "TASK_PACKAGE",
-            _generate_task_message(task, _handle_parameters(task)),
-        )
+        message = _generate_task_message(task, _handle_parameters(task))
+        send_message(exchange, routing_key, "TASK_PACKAGE", message)
     except Exception as exc:
         logger.info(
             f"Exception caught publishing task {task.id}, publish may be retried."
         )
         raise exc
 
+    # A cancellation sent while the task was being published may have reached the
+    # runners before the task did, so tell them again
+    if Task.objects.filter(id=task.id, status=Task.CANCELED).exists():
+        logger.info(f"Task {task.id} was canceled while it was being published")
+        _publish_cancel_msg(task)
+        return
+
+    TaskTimings.objects.update_or_create(
+        task=task,
+        defaults={"published_at": _from_timestamp(message["published_at"])},
+    )
+
+
+@app.task()
+def publish_task_batch(*, task_ids: list[UUID]) -> None:
+    """Publish the tasking messages for many tasks, as publish_task does for one
+
+    A task that can't be published is handed to publish_task to be retried, so that it
+    doesn't hold up, or get republished with, the rest of the batch.
+
+    Args:
+        task_ids: IDs of the tasks to be executed
+    """
+    for task_id in task_ids:
+        try:
+            publish_task.run(task_id=task_id)
+        except Exception as exc:
+            logger.info(f"Unable to publish task {task_id}, retrying: {exc}")
+            publish_task.apply_async(
+                kwargs={"task_id": task_id}, countdown=publish_task.default_retry_delay
+            )
+
 
 @app.task()
 def record_task_result(task_result_message: dict) -> None:
@@ -136,29 +273,581 @@ def record_task_result(task_result_message: dict) -> None:
     """
     task_id = task_result_message["task_id"]
     status = task_result_message["status"]
-    output = task_result_message["output"]
-    result = task_result_message["result"]
+    termination = task_result_message.get("termination")
+
+    # Lock the task so that a log chunk being recorded concurrently can't overwrite
+    # the final log, see record_task_log_chunk
+    with transaction.atomic():
+        try:
+            task = Task.objects.select_for_update().get(id=task_id)
+        except Task.DoesNotExist:
+            logger.error(
+                "Unable to record results for task %s: task not found", task_id
+            )
+            return
 
-    try:
-        task = Task.objects.get(id=task_id)
-    except Task.DoesNotExist:
-        logger.error("Unable to record results for task %s: task not found", task_id)
-        return
+        # A result can arrive more than once, such as when the runner republishes a
+        # spooled result, and the first one recorded is kept
+        if TaskResult.objects.filter(task=task).exists():
+            logger.warning("Ignoring duplicate result for task %s", task_id)
+            return
+
+        # The log may already exist, such as with an error recorded by mark_error
+        task_log, _ = TaskLog.objects.get_or_create(task=task)
+        task_result = TaskResult(task=task)
+
+        if "output_ref" in task_result_message:
+            _attach_uploaded_output(task_log, task_result_message, "output")
+        else:
+            output = task_result_message["output"]
+            task_log.save_log(_protect_output(task, output))
+
+        # The complete log replaces the output streamed while the task ran
+        TaskLogChunk.objects.filter(task=task).delete()
+
+        if "result_ref" in task_result_message:
+            _attach_uploaded_output(task_result, task_result_message, "result")
+        else:
+            task_result.save_result(task_result_message["result"])
+
+        _record_timings(task, task_result_message.get("timings") or {})
 
-    TaskLog(task=task).save_log(_protect_output(task, output))
-    TaskResult(task=task).save_result(result)
+        if usage := task_result_message.get("usage"):
+            _record_usage(task, usage)
 
-    # TODO: This status determination feels like it belongs in the runner. This should
-    #       be reworked so that there are explicitly known statuses that could come
-    #       back from the runner, rather than passing through the command exit status
-    #       as is happening now.
-    _update_task_status(task, status)
+        # The output of a canceled task is kept, but it stays canceled
+        if canceled := task.status == Task.CANCELED:
+            logger.debug("Recorded output of canceled task %s", task_id)
+        else:
+            # TODO: This status determination feels like it belongs in the runner.
+            #       This should be reworked so that there are explicitly known
+            #       statuses that could come back from the runner, rather than
+            #       passing through the command exit status as is happening now.
+            _update_task_status(task, status, termination)
+
+    if canceled:
+        return
 
     # If this task is part of a WorkflowRun continue it or update its status
     if workflow_run_step := WorkflowRunStep.objects.filter(step_task=task):
         _handle_workflow_run(workflow_run_step.get(), task)
 
 
+def _record_timings(task: Task, timings: dict) -> None:
+    """Records when the runner started and finished the task, along with the time it
+    spent in each phase, from the "timings" of a TASK_RESULT message"""
+    TaskTimings.objects.update_or_create(task=task, defaults=_get_timings(timings))
+
+
+def _get_timings(timings: dict) -> dict:
+    """Returns the TaskTimings fields for the "timings" of a TASK_RESULT message"""
+    recorded_at = datetime.now(timezone.utc)
+    phases = dict(timings.get("phases") or {})
+    defaults = {"recorded_at": recorded_at, "phases": phases}
+
+    if started_at := timings.get("started_at"):
+        defaults["started_at"] = _from_timestamp(started_at)
+
+    if completed_at := timings.get("completed_at"):
+        defaults["completed_at"] = _from_timestamp(completed_at)
+
+        # The runner can't include the time taken to publish its own result. Its
+        # clock may differ slightly from ours, so this is never less than 0.
+        published = (recorded_at - defaults["completed_at"]).total_seconds()
+        phases["publish"] = max(published, 0.0)
+
+    return defaults
+
+
+def _record_usage(task: Task, usage: dict) -> None:
+    """Records the resources the task's container used, from the "usage" of a
+    TASK_RESULT message"""
+    TaskUsage.objects.update_or_create(task=task, defaults=_get_usage(usage))
+
+
+def _get_usage(usage: dict) -> dict:
+    """Returns the TaskUsage fields for the "usage" of a TASK_RESULT message"""
+    return {name: usage[name] for name in USAGE_FIELDS if name in usage}
+
+
+def _from_timestamp(timestamp: float) -> datetime:
+    """Converts seconds since the epoch, as sent in messages, to a datetime"""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+@app.task()
+def record_task_result_batch(task_result_batch_message: dict) -> None:
+    """Records each of the results in a TASK_RESULT_BATCH message
+
+    A result that can't be recorded doesn't prevent the rest from being recorded.
+
+    Args:
+        task_result_batch_message: The message body from a TASK_RESULT_BATCH message.
+    """
+    record_task_results(task_result_batch_message["results"])
+
+
+@app.task()
+def record_task_results(task_result_messages: list[dict]) -> None:
+    """Records many TASK_RESULT messages, as record_task_result does for one
+
+    The tasks are read and updated with a query for each step rather than for each
+    result, and their output is uploaded to storage concurrently. A result that can't
+    be recorded doesn't prevent the rest from being recorded. Should recording them
+    together fail, each is recorded by record_task_result instead.
+
+    The listener acknowledges the messages once they are handed to this task, so
+    results that fail to be recorded are sent to the TASK_RESULTS_DEAD_LETTER_QUEUE,
+    see _dead_letter_results. Results for tasks that don't exist, or already have one,
+    are only logged.
+
+    Args:
+        task_result_messages: The message bodies of TASK_RESULT messages.
+    """
+    start = perf_counter()
+
+    try:
+        recorded, finished, failed = _record_task_results(task_result_messages)
+    except Exception as exc:
+        logger.warning("Unable to record results together, recording each: %s", exc)
+        recorded = 0
+        finished = []
+        failed = []
+
+        for task_result_message in task_result_messages:
+            try:
+                record_task_result(task_result_message)
+                recorded += 1
+            except Exception as exc:
+                logger.error(
+                    "Unable to record results for task %s: %s",
+                    task_result_message.get("task_id"),
+                    exc,
+                )
+                failed.append(task_result_message)
+
+    _dead_letter_results(failed)
+
+    # Once the results are recorded they aren't recorded again, whatever happens to
+    # the workflow runs
+    _continue_workflow_runs(finished)
+
+    elapsed = perf_counter() - start
+    logger.info(
+        "Recorded %d of %d results in %.3fs (%.1f results/s)",
+        recorded,
+        len(task_result_messages),
+        elapsed,
+        recorded / elapsed if elapsed else 0.0,
+    )
+
+
+def _dead_letter_results(task_result_messages: list[dict]) -> None:
+    """Sends TASK_RESULT messages that couldn't be recorded to the
+    TASK_RESULTS_DEAD_LETTER_QUEUE, from where they can be replayed with the
+    dead_letters command"""
+    for task_result_message in task_result_messages:
+        try:
+            send_message(
+                "",
+                TASK_RESULTS_DEAD_LETTER_QUEUE,
+                "TASK_RESULT",
+                task_result_message,
+                persistent=True,
+            )
+        except Exception as exc:
+            logger.error(
+                "Unable to dead letter results for task %s: %s",
+                task_result_message.get("task_id"),
+                exc,
+            )
+
+
+def _record_task_results(
+    task_result_messages: list[dict],
+) -> tuple[int, list[Task], list[dict]]:
+    """Records the results for record_task_results
+
+    Returns:
+        The number of results recorded, along with the tasks that finished, whose
+        workflow runs are yet to be continued, and the messages whose output couldn't
+        be stored
+    """
+    messages = {}
+
+    for task_result_message in task_result_messages:
+        try:
+            task_id = UUID(str(task_result_message["task_id"]))
+        except (KeyError, ValueError) as exc:
+            logger.error(
+                "Unable to record results for task %s: %s",
+                task_result_message.get("task_id"),
+                exc,
+            )
+            continue
+
+        if task_id in messages:
+            logger.warning("Ignoring duplicate result for task %s", task_id)
+        else:
+            messages[task_id] = task_result_message
+
+    # The output is stored before the tasks are locked, so that log chunks,
+    # cancellations and errors for them aren't held up by the uploads
+    tasks = (
+        Task.objects.select_related("environment")
+        .prefetch_related("tasked_object")
+        .in_bulk(messages.keys())
+    )
+
+    for task_id in messages.keys() - tasks.keys():
+        logger.error("Unable to record results for task %s: task not found", task_id)
+
+    _drop_recorded_tasks(tasks)
+    task_logs = TaskLog.objects.in_bulk(tasks.keys())
+    outputs = _store_task_outputs(
+        [(task, task_logs.get(task.id), messages[task.id]) for task in tasks.values()]
+    )
+
+    stored_ids = {task_log.task_id for task_log, _, _ in outputs}
+    failed = [messages[task_id] for task_id in tasks if task_id not in stored_ids]
+
+    try:
+        recorded, finished = _save_task_outputs(outputs, messages)
+    except Exception:
+        _delete_stored_files([file for _, _, files in outputs for file in files])
+        raise
+
+    # Output stored for tasks that were deleted, or had their result recorded, while
+    # it was being stored isn't kept
+    recorded_ids = {task.id for task in recorded}
+    _delete_stored_files(
+        [
+            file
+            for task_log, _, files in outputs
+            if task_log.task_id not in recorded_ids
+            for file in files
+        ]
+    )
+
+    return len(recorded), finished, failed
+
+
+def _drop_recorded_tasks(tasks: dict[UUID, Task]) -> None:
+    """Removes the tasks that already have a TaskResult from tasks, by id"""
+    for task_id in TaskResult.objects.filter(task_id__in=tasks.keys()).values_list(
+        "task_id", flat=True
+    ):
+        logger.warning("Ignoring duplicate result for task %s", task_id)
+        del tasks[task_id]
+
+
+def _save_task_outputs(
+    outputs: list[tuple[TaskLog, TaskResult, list[FieldFile]]], messages: dict
+) -> tuple[list[Task], list[Task]]:
+    """Saves the stored output of the tasks and updates their status, for
+    _record_task_results
+
+    As in record_task_result, the tasks are locked so that log chunks being recorded
+    concurrently can't overwrite the final logs. Since they weren't while the output
+    was stored, they are checked again for results recorded in the meantime.
+
+    Args:
+        outputs: The TaskLog and TaskResult of each task, with the files uploaded
+                 for them, as returned by _store_task_outputs
+        messages: The TASK_RESULT message of each task, by task id
+
+    Returns:
+        The tasks whose output was saved, and those of them that finished
+    """
+    with transaction.atomic():
+        tasks = (
+            Task.objects.select_for_update(of=("self",))
+            .select_related("scheduled_task")
+            .in_bulk([task_log.task_id for task_log, _, _ in outputs])
+        )
+        _drop_recorded_tasks(tasks)
+
+        outputs = [output for output in outputs if output[0].task_id in tasks]
+
+        # The log may have been created since it was stored, such as by mark_error
+        existing_logs = set(
+            TaskLog.objects.filter(task_id__in=tasks.keys()).values_list(
+                "task_id", flat=True
+            )
+        )
+
+        TaskLog.objects.bulk_create(
+            task_log
+            for task_log, _, _ in outputs
+            if task_log.task_id not in existing_logs
+        )
+        TaskLog.objects.bulk_update(
+            [
+                task_log
+                for task_log, _, _ in outputs
+                if task_log.task_id in existing_logs
+            ],
+            ["file"],
+        )
+        TaskResult.objects.bulk_create(task_result for _, task_result, _ in outputs)
+
+        recorded = [tasks[task_log.task_id] for task_log, _, _ in outputs]
+
+        # The complete logs replace the output streamed while the tasks ran
+        TaskLogChunk.objects.filter(task__in=recorded).delete()
+        _record_timings_and_usage(recorded, messages)
+
+        # The output of a canceled task is kept, but it stays canceled
+        finished = [task for task in recorded if task.status != Task.CANCELED]
+        updated_at = datetime.now(timezone.utc)
+
+        for task in finished:
+            task_result_message = messages[task.id]
+            _set_task_status(
+                task,
+                task_result_message["status"],
+                task_result_message.get("termination"),
+            )
+            task.updated_at = updated_at
+
+        Task.objects.bulk_update(finished, ["status", "updated_at"])
+
+    return recorded, finished
+
+
+def _continue_workflow_runs(tasks: list[Task]) -> None:
+    """If these tasks are part of a WorkflowRun continue it or update its status. A
+    run that can't be continued doesn't prevent the rest from being."""
+    tasks_by_id = {task.id: task for task in tasks}
+
+    for workflow_run_step in WorkflowRunStep.objects.filter(step_task__in=tasks):
+        task = tasks_by_id[workflow_run_step.step_task_id]
+
+        try:
+            _handle_workflow_run(workflow_run_step, task)
+        except Exception as exc:
+            logger.error("Unable to continue workflow run of task %s: %s", task.id, exc)
+
+
+def _store_task_outputs(
+    task_outputs: list[tuple[Task, TaskLog | None, dict]]
+) -> list[tuple[TaskLog, TaskResult, list[FieldFile]]]:
+    """Builds the TaskLog and TaskResult for each task from its TASK_RESULT message,
+    uploading the output to storage concurrently. Neither is saved.
+
+    Args:
+        task_outputs: Each task with its existing TaskLog, if any, and message
+
+    Returns:
+        The TaskLog and TaskResult of each task whose output could be stored, with the
+        files that were uploaded for them
+    """
+    protected_values = {}
+    uploads = []
+
+    for task, task_log, task_result_message in task_outputs:
+        # The log may already exist, such as with an error recorded by mark_error
+        if task_log is None:
+            task_log = TaskLog(task=task)
+        else:
+            task_log.task = task
+
+        try:
+            if "output_ref" in task_result_message:
+                log = None
+            else:
+                # Tasks of the same function in an environment share protected values
+                key = (task.environment_id, tuple(task.tasked_object.variables))
+
+                if key not in protected_values:
+                    protected_values[key] = _get_protected_values(task)
+
+                log = _protect_output(
+                    task, task_result_message["output"], protected_values[key]
+                )
+        except Exception as exc:
+            logger.error("Unable to record results for task %s: %s", task.id, exc)
+            continue
+
+        uploads.append((task_log, TaskResult(task=task), task_result_message, log))
+
+    with ThreadPoolExecutor(max_workers=OUTPUT_UPLOAD_THREADS) as executor:
+        stored = list(executor.map(lambda upload: _store_task_output(*upload), uploads))
+
+    return [
+        (task_log, task_result, files)
+        for (task_log, task_result, _, _), files in zip(uploads, stored)
+        if files is not None
+    ]
+
+
+def _store_task_output(
+    task_log: TaskLog, task_result: TaskResult, task_result_message: dict, log: str
+) -> list[FieldFile] | None:
+    """Uploads, or attaches, the log and result of a task for _store_task_outputs
+
+    Returns:
+        The files that were uploaded, or None if the output couldn't be stored, in
+        which case any that were uploaded have been deleted
+    """
+    files = []
+
+    try:
+        if log is None:
+            _attach_uploaded_output(task_log, task_result_message, "output", save=False)
+        else:
+            task_log.save_log(log, save=False)
+
+            # Empty output isn't uploaded, see TaskOutput.save_content
+            if log:
+                files.append(task_log.file)
+
+        if "result_ref" in task_result_message:
+            _attach_uploaded_output(
+                task_result, task_result_message, "result", save=False
+            )
+        else:
+            task_result.save_result(task_result_message["result"], save=False)
+
+            if task_result_message["result"]:
+                files.append(task_result.file)
+    except Exception as exc:
+        logger.error("Unable to record results for task %s: %s", task_log.task_id, exc)
+        _delete_stored_files(files)
+        return None
+
+    return files
+
+
+def _delete_stored_files(files: list[FieldFile]) -> None:
+    """Deletes files uploaded by _store_task_outputs whose output wasn't recorded"""
+    for file in files:
+        try:
+            file.storage.delete(file.name)
+        except Exception as exc:
+            logger.warning("Unable to delete stored output %s: %s", file.name, exc)
+
+
+def _record_timings_and_usage(tasks: list[Task], messages: dict) -> None:
+    """Records the timings and usage in the TASK_RESULT messages of the tasks, see
+    _record_timings and _record_usage"""
+    timings = [
+        TaskTimings(task=task, **_get_timings(messages[task.id].get("timings") or {}))
+        for task in tasks
+    ]
+    usage = [
+        TaskUsage(task=task, **_get_usage(messages[task.id]["usage"]))
+        for task in tasks
+        if messages[task.id].get("usage")
+    ]
+
+    # The timings may already exist with when the task was published
+    TaskTimings.objects.bulk_create(
+        timings,
+        update_conflicts=True,
+        unique_fields=["task"],
+        update_fields=["started_at", "completed_at", "recorded_at", "phases"],
+    )
+    TaskUsage.objects.bulk_create(
+        usage,
+        update_conflicts=True,
+        unique_fields=["task"],
+        update_fields=USAGE_FIELDS,
+    )
+
+
+@app.task()
+def record_task_log_chunk(task_log_chunk_message: dict) -> None:
+    """Records the output from a TASK_LOG_CHUNK message as a TaskLogChunk
+
+    Chunks arriving after the task has finished are ignored, since the TASK_RESULT
+    carries the complete log. Only the chunk's own output is masked, along with
+    where it meets the chunks either side of it, see _mask_boundary.
+
+    Args:
+        task_log_chunk_message: The message body from a TASK_LOG_CHUNK message.
+    """
+    task_id = task_log_chunk_message["task_id"]
+    sequence = task_log_chunk_message.get("sequence")
+    output = task_log_chunk_message["output"]
+    skipped = task_log_chunk_message.get("skipped", 0)
+
+    with transaction.atomic():
+        try:
+            task = Task.objects.select_for_update().get(id=task_id)
+        except Task.DoesNotExist:
+            logger.error("Unable to record log for task %s: task not found", task_id)
+            return
+
+        if task.finished:
+            return
+
+        chunks = TaskLogChunk.objects.filter(task=task)
+
+        # Runners from before chunks were numbered send them in order
+        if sequence is None:
+            last = chunks.order_by("-sequence").values_list("sequence", flat=True)
+            sequence = last[0] + 1 if last else 0
+        elif chunks.filter(sequence=sequence).exists():
+            logger.debug("Ignoring duplicate log chunk for task %s", task_id)
+            return
+
+        protected_values = _get_protected_values(task)
+        chunk = TaskLogChunk(
+            task=task,
+            sequence=sequence,
+            output=_protect_output(task, output, protected_values),
+        )
+        before = chunks.filter(sequence__lt=sequence).order_by("-sequence").first()
+        after = chunks.filter(sequence__gt=sequence).order_by("sequence").first()
+        updated = []
+
+        if skipped:
+            separator = "\n" if before and not before.output.endswith("\n") else ""
+            marker = f"{separator}[... {skipped} bytes of output skipped ...]\n"
+            chunk.output = f"{marker}{chunk.output}"
+
+            # Nothing can be split across output that was skipped
+            before = None
+
+        if before is not None and _mask_boundary(before, chunk, protected_values):
+            updated.append(before)
+
+        if after is not None and _mask_boundary(chunk, after, protected_values):
+            updated.append(after)
+
+        chunk.save()
+        TaskLogChunk.objects.bulk_update(updated, ["output"])
+
+
+def _mask_boundary(
+    first: TaskLogChunk, second: TaskLogChunk, protected_values: list[str]
+) -> bool:
+    """Masks the protected values split between the end of the first chunk and the
+    start of the second, which masking either chunk alone can't find. A value that
+    is found is masked in the second chunk, along with the end of the first.
+
+    Returns:
+        Whether the chunks were changed
+    """
+    if not protected_values:
+        return False
+
+    # The most of a value that can be in either chunk
+    overlap = max(len(value) for value in protected_values) - 1
+    split = max(len(first.output) - overlap, 0)
+    window = f"{first.output[split:]}{second.output[:overlap]}"
+    masked = _protect_output(first.task, window, protected_values)
+
+    if masked == window:
+        return False
+
+    first.output = first.output[:split]
+    second.output = f"{masked}{second.output[overlap:]}"
+
+    return True
+
+
 @app.task
 def run_scheduled_task(scheduled_task_id: str) -> None:
     """Creates and executes a Task according to a schedule
@@ -197,16 +886,26 @@ def run_scheduled_task(scheduled_task_id: str) -> None:
     scheduled_task.update_most_recent_task(task)
 
 
-def _update_task_status(task: Task, status: int) -> None:
-    match status:
-        case 0:
+def _update_task_status(task: Task, status: int, termination: str | None) -> None:
+    _set_task_status(task, status, termination)
+    task.save()
+
+
+def _set_task_status(task: Task, status: int, termination: str | None) -> None:
+    """Sets the status of a task from the result the runner reported, without saving
+    the task"""
+    match termination, status:
+        case "TIMEOUT", _:
+            task.status = Task.TIMEOUT
+        case "CANCELED", _:
+            task.status = Task.CANCELED
+        case _, 0:
             task.status = Task.COMPLETE
         case _:
             task.status = Task.ERROR
-            if task.scheduled_task is not None:
-                task.scheduled_task.error()
 
-    task.save()
+    if task.status in [Task.ERROR, Task.TIMEOUT] and task.scheduled_task is not None:
+        task.scheduled_task.error()
 
 
 def _handle_workflow_run(workflow_run_step: WorkflowRunStep, task: Task) -> None:
@@ -234,6 +933,10 @@ def _handle_workflow_run(workflow_run_step: WorkflowRunStep, task: Task) -> None
         case Task.ERROR:
             workflow_task.status = Task.ERROR
             workflow_task.save()
+        case Task.CANCELED | Task.TIMEOUT:
+            if not workflow_task.finished:
+                workflow_task.status = task.status
+                workflow_task.save()
 
 
 def _handle_parameters(task: Task) -> dict:
@@ -317,10 +1020,117 @@ def start_task(task: Task) -> None:
         mark_error(task, "Failed to start", error=exc)
 
 
+def start_tasks(tasks: list[Task]) -> None:
+    """Start many tasks, such as ones created together with bulk_create
+
+    This is the same as calling start_task for each of the tasks, except that function
+    tasks are marked IN_PROGRESS with a single update and published in batches of
+    PUBLISH_BATCH_SIZE by publish_task_batch. The tasks are only published once the
+    transaction they are being started in commits, so that none are published for
+    tasks that are rolled back.
+
+    Args:
+        tasks: Tasks to start, all of which must be PENDING
+
+    Raises:
+        InvalidStatus: A task cannot be started based on its current status
+    """
+    if any(task.status != Task.PENDING for task in tasks):
+        raise InvalidStatus("Tasks that are not pending cannot be started")
+
+    function_tasks = []
+    other_tasks = []
+
+    for task in tasks:
+        if task.tasked_type.model_class() is Function:
+            function_tasks.append(task)
+        else:
+            other_tasks.append(task)
+
+    Task.objects.filter(id__in=[task.id for task in function_tasks]).update(
+        status=Task.IN_PROGRESS, updated_at=datetime.now(tz=timezone.utc)
+    )
+
+    for task in function_tasks:
+        task.status = Task.IN_PROGRESS
+
+    transaction.on_commit(partial(_publish_tasks, function_tasks, other_tasks))
+
+
+def _publish_tasks(function_tasks: list[Task], other_tasks: list[Task]) -> None:
+    """Publishes the function tasks in batches and starts the others, see start_tasks"""
+    for task in other_tasks:
+        start_task(task)
+
+    for start in range(0, len(function_tasks), PUBLISH_BATCH_SIZE):
+        end = start + PUBLISH_BATCH_SIZE
+        batch = function_tasks[start:end]
+
+        try:
+            publish_task_batch.delay(task_ids=[task.id for task in batch])
+        except Exception as exc:
+            for task in batch:
+                mark_error(task, "Failed to start", error=exc)
+
+
+def cancel_task(task: Task) -> None:
+    """Cancel a task that has not finished
+
+    The task is marked CANCELED immediately and runners are told to stop it with a
+    CANCEL_TASK message. If the runner still sends the task's result, its output is
+    recorded but the task stays canceled. Canceling a workflow task cancels the step
+    that is running, and canceling a step cancels its workflow.
+
+    Args:
+        task: Task to cancel
+
+    Raises:
+        InvalidStatus: The task has already finished
+    """
+    with transaction.atomic():
+        task = Task.objects.select_for_update().get(id=task.id)
+
+        if task.finished:
+            raise InvalidStatus(f"Task with status {task.status} cannot be canceled")
+
+        task.status = Task.CANCELED
+        task.save()
+
+    if task.tasked_type.model_class() is Workflow:
+        for step in task.steps.select_related("step_task").exclude(step_task=None):
+            if not step.step_task.finished:
+                cancel_task(step.step_task)
+    else:
+        _publish_cancel_msg(task)
+
+    if workflow_run_step := WorkflowRunStep.objects.filter(step_task=task).first():
+        _handle_workflow_run(workflow_run_step, task)
+
+
+def _publish_cancel_msg(task: Task) -> None:
+    """Tells every runner to stop the task if they are running it"""
+    try:
+        send_message(BROADCAST_EXCHANGE, "", "CANCEL_TASK", {"task_id": str(task.id)})
+    except Exception as exc:
+        # The task is already canceled, a runner that has it will report the result
+        # but it won't change the status
+        logger.warning("Unable to send cancellation of task %s: %s", task.id, exc)
+
+
 def mark_error(task, message, error=None):
-    """Changes the task status to errored and logs the message"""
-    task.status = Task.ERROR
-    task.save()
+    """Changes the task status to errored and logs the message. A task that has been
+    canceled stays canceled."""
+    with transaction.atomic():
+        if (
+            Task.objects.select_for_update()
+            .filter(id=task.id, status=Task.CANCELED)
+            .exists()
+        ):
+            logger.info(f"Task {task.id} was canceled, not marking it errored")
+            return
+
+        task.status = Task.ERROR
+        task.save()
 
     if message:
         extra = f" Error: {str(error)}" if error else ""
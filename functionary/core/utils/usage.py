@@ -0,0 +1,77 @@
+from dataclasses import dataclass
+
+from core.models import Function, TaskTimings, TaskUsage
+
+# The number of most recent tasks a function's usage is summarized from
+SUMMARY_TASKS = 500
+
+
+@dataclass
+class FunctionUsage:
+    """The runtime and memory of a function's recent tasks
+
+    Attributes:
+        tasks: The number of tasks with a recorded runtime
+        runtime_p50: The median seconds a task ran for
+        runtime_p95: The 95th percentile of seconds a task ran for
+        peak_memory_p95: The 95th percentile of the peak memory of a task, in bytes
+        peak_memory_max: The most memory any task used, in bytes
+    """
+
+    tasks: int = 0
+    runtime_p50: float | None = None
+    runtime_p95: float | None = None
+    peak_memory_p95: int | None = None
+    peak_memory_max: int | None = None
+
+
+def get_function_usage(function: Function, limit: int = SUMMARY_TASKS) -> FunctionUsage:
+    """Summarizes the runtime and peak memory of the function's most recent tasks
+
+    The runtime is the time from the runner starting a task until it finished. Only
+    tasks run by a runner that reports timings and resource usage are included.
+
+    Args:
+        function: The function to summarize
+        limit: The number of most recent tasks to include
+
+    Returns:
+        FunctionUsage for the function, which is empty if it has no such tasks
+    """
+    tasks = function.tasks.all()
+
+    spans = (
+        TaskTimings.objects.filter(
+            task__in=tasks, started_at__isnull=False, completed_at__isnull=False
+        )
+        .order_by("-completed_at")
+        .values_list("started_at", "completed_at")[:limit]
+    )
+    runtimes = sorted(
+        (completed - started).total_seconds() for started, completed in spans
+    )
+
+    peak_memory = sorted(
+        TaskUsage.objects.filter(task__in=tasks)
+        .order_by("-task__created_at")
+        .values_list("peak_memory", flat=True)[:limit]
+    )
+
+    usage = FunctionUsage(tasks=len(runtimes))
+
+    if runtimes:
+        usage.runtime_p50 = _percentile(runtimes, 50)
+        usage.runtime_p95 = _percentile(runtimes, 95)
+
+    if peak_memory:
+        usage.peak_memory_p95 = _percentile(peak_memory, 95)
+        usage.peak_memory_max = peak_memory[-1]
+
+    return usage
+
+
+def _percentile(values: list, percent: int):
+    """Returns the nearest-rank percentile of the sorted values"""
+    rank = -(-len(values) * percent // 100)
+
+    return values[max(rank, 1) - 1]
@@ -53,6 +53,21 @@ else:
 # Expose OpenSSL standard env variable via django settings
 SSL_CERT_FILE = os.getenv("SSL_CERT_FILE")
 
+# Broker connections each process keeps open for publishing messages to the runners
+MESSAGING_PUBLISHER_POOL_SIZE = int(os.environ.get("MESSAGING_PUBLISHER_POOL_SIZE", 4))
+
+# Connections the listener consumes messages from the runners over, each in a thread
+LISTENER_CONSUMERS = int(os.environ.get("LISTENER_CONSUMERS", 1))
+
+# Each consumer collects up to LISTENER_RESULT_BATCH_SIZE task results, waiting at
+# most LISTENER_RESULT_BATCH_WINDOW seconds, before handing them to a worker to record
+# together. LISTENER_PREFETCH_COUNT bounds the messages it holds unacknowledged.
+LISTENER_RESULT_BATCH_SIZE = int(os.environ.get("LISTENER_RESULT_BATCH_SIZE", 100))
+LISTENER_RESULT_BATCH_WINDOW = float(
+    os.environ.get("LISTENER_RESULT_BATCH_WINDOW", 0.5)
+)
+LISTENER_PREFETCH_COUNT = int(os.environ.get("LISTENER_PREFETCH_COUNT", 200))
+
 # Application definition
 INSTALLED_APPS = [
     "django.contrib.auth",
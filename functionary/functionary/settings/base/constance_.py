@@ -1,5 +1,8 @@
 CONSTANCE_BACKEND = "constance.backends.database.DatabaseBackend"
 CONSTANCE_DATABASE_PREFIX = "constance:functionary:"
+# Seconds each process reuses the values get_config read for. A change is seen at
+# once by the process that made it, and by every other process within this time.
+CONSTANCE_VALUES_TTL = 5
 CONSTANCE_ADDITIONAL_FIELDS = {
     "config_field": ["django.forms.fields.JSONField", {}],
     "optional_int": [
@@ -70,6 +73,11 @@ CONSTANCE_CONFIG = {
     "S3_SECRET_KEY": ("", "Secret Key", "required_password_field"),
     "S3_SECURE": (False, "Require Secure Access", bool),
     "S3_PRESIGNED_URL_TIMEOUT_MINUTES": (5, "Download URL Timeout (minutes)", int),
+    "S3_UPLOAD_URL_TIMEOUT_MINUTES": (
+        1440,
+        "Task Output Upload URL Timeout (minutes)",
+        int,
+    ),
     "TRUSTED_HEADER_AUTHENTICATION_ENABLED": (
         False,
         "Trusted Header Authentication Enabled",
@@ -128,6 +136,7 @@ CONSTANCE_CONFIG_FIELDSETS = {
             "S3_ACCESS_KEY",
             "S3_SECRET_KEY",
             "S3_PRESIGNED_URL_TIMEOUT_MINUTES",
+            "S3_UPLOAD_URL_TIMEOUT_MINUTES",
         )
     },
     "UI Banner 1": {"fields": ("UI_BANNER_1_TEXT", "UI_BANNER_1_BG", "UI_BANNER_1_FG")},
@@ -15,6 +15,7 @@ from django.views.decorators.http import require_GET, require_POST
 from core.auth import Permission
 from core.models import Environment, Function, Task, Workflow
 from core.utils.tasking import start_task
+from core.utils.usage import get_function_usage
 from ui.forms.tasks import (
     TaskMetadataForm,
     TaskParameterForm,
@@ -65,6 +66,7 @@ class FunctionDetailView(PermissionedDetailView):
             ]
 
         context["missing_variables"] = missing_variables
+        context["usage"] = get_function_usage(function)
         context["breadcrumbs"] = [
             {
                 "label": "Functions",
@@ -137,6 +137,10 @@ def _get_workflow_steps(task: Task) -> dict:
                 details["icon"] = "fa-circle-check"
             case "ERROR":
                 details["icon"] = "fa-circle-exclamation"
+            case "CANCELED":
+                details["icon"] = "fa-ban"
+            case "TIMEOUT":
+                details["icon"] = "fa-clock"
 
         step_details.append(details)
 
@@ -184,7 +188,13 @@ class TaskDetailView(PermissionedDetailView):
         return (
             super()
             .get_queryset()
-            .select_related("environment", "creator", "taskresult", "environment__team")
+            .select_related(
+                "environment",
+                "creator",
+                "taskresult",
+                "tasktimings",
+                "environment__team",
+            )
         )
 
     def get_context_data(self, **kwargs):
@@ -1,24 +1,127 @@
+import { readFileSync, rmSync } from "fs";
+import { createServer } from "net";
+import { createInterface } from "readline";
+import { format } from "util";
 import * as functions from "./functions.js";
 
-const validParams = ["--function", "--parameters"];
+const usage =
+  "Invalid commandline, --function <function_name> --parameters <parameters in JSON format>" +
+  " | --parameters-file <file containing the parameters in JSON format, or - for stdin>" +
+  " | --serve [--socket <unix socket path>]";
+const validParams = ["--function", "--parameters", "--parameters-file"];
+const consoleMethods = ["log", "info", "warn", "error", "debug"];
 const args = process.argv.slice(2);
+const options = {};
 
-if (
-  args.length != 4 ||
-  !validParams.includes(args[0]) ||
-  !validParams.includes(args[2])
-) {
-  console.log(
-    "Invalid commandline, --function <function_name> --parameters <parameters in JSON format>"
-  );
-  console.log(`Got: ${args}`);
-  process.exit(1);
+// Calls the function described by a server mode request. The request holds the
+// "function" to call and its "parameters", along with an optional "id" that is
+// returned in the response. The response holds the "status", 0 if the function
+// returned and 1 if it threw, the "output" it logged, and the JSON encoded "result".
+async function invoke(request) {
+  const output = [];
+  const saved = {};
+  let status = 0;
+  let result = null;
+
+  for (const method of consoleMethods) {
+    saved[method] = console[method];
+    console[method] = (...values) => output.push(format(...values) + "\n");
+  }
+
+  try {
+    result = await functions[request.function](request.parameters ?? {});
+  } catch (error) {
+    console.error(error);
+    status = 1;
+  } finally {
+    Object.assign(console, saved);
+  }
+
+  return {
+    id: request.id ?? null,
+    status,
+    output: output.join(""),
+    result: JSON.stringify(result ?? null),
+  };
+}
+
+// Answers newline delimited JSON requests with a JSON response line each, one at a
+// time, until the input is closed
+async function serve(input, write) {
+  for await (const line of createInterface({ input, crlfDelay: Infinity })) {
+    if (!line.trim()) {
+      continue;
+    }
+
+    let response;
+
+    try {
+      response = await invoke(JSON.parse(line));
+    } catch (error) {
+      response = {
+        id: null,
+        status: 1,
+        output: `Bad request: ${error}\n`,
+        result: "null",
+      };
+    }
+
+    write(JSON.stringify(response) + "\n");
+  }
+}
+
+// Serves the connections to a Unix socket at path, one after another
+function serveSocket(path) {
+  let previous = Promise.resolve();
+
+  rmSync(path, { force: true });
+  createServer((connection) => {
+    previous = previous
+      .then(() => serve(connection, (data) => connection.write(data)))
+      .catch(() => {})
+      .finally(() => connection.end());
+  }).listen(path);
 }
 
-const toCall = args[0] === "--function" ? args[1] : args[3];
-const parameters = args[2] === "--parameters" ? args[3] : args[1];
+if (args[0] === "--serve") {
+  if (args.length === 1) {
+    // Anything the functions log is captured, so stdout only has responses
+    await serve(process.stdin, (data) => process.stdout.write(data));
+    process.exit(0);
+  } else if (args.length === 3 && args[1] === "--socket") {
+    serveSocket(args[2]);
+  } else {
+    console.log(usage);
+    process.exit(1);
+  }
+} else {
+  for (let i = 0; i < args.length; i += 2) {
+    if (!validParams.includes(args[i]) || args[i + 1] === undefined) {
+      options.invalid = true;
+      break;
+    }
+    options[args[i]] = args[i + 1];
+  }
 
-const retVal = await functions[toCall](JSON.parse(parameters));
+  if (
+    options.invalid ||
+    !("--function" in options) ||
+    ("--parameters" in options) === ("--parameters-file" in options)
+  ) {
+    console.log(usage);
+    console.log(`Got: ${args}`);
+    process.exit(1);
+  }
 
-console.log("==== Output From Command ====");
-console.log(JSON.stringify(retVal));
+  const toCall = options["--function"];
+  const parametersFile = options["--parameters-file"];
+  const parameters =
+    parametersFile === undefined
+      ? options["--parameters"]
+      : readFileSync(parametersFile === "-" ? 0 : parametersFile, "utf8");
+
+  const retVal = await functions[toCall](JSON.parse(parameters));
+
+  console.log("==== Output From Command ====");
+  console.log(JSON.stringify(retVal));
+}
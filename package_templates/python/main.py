@@ -1,24 +1,148 @@
 import argparse
+import contextlib
+import io
 import json
 import logging
+import os
+import socket
 import sys
+import traceback
+from typing import IO
 
 import functions
 
-logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+class _CurrentStdoutHandler(logging.StreamHandler):
+    """Logs to whatever sys.stdout is at the time, so server mode can capture it"""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+logging.basicConfig(level=logging.INFO, handlers=[_CurrentStdoutHandler()])
+
+
+def load_parameters(args: argparse.Namespace) -> dict:
+    """Load the function parameters from the command line, a file, or stdin"""
+    if args.parameters_file is None:
+        return json.loads(args.parameters)
+
+    if args.parameters_file == "-":
+        return json.load(sys.stdin)
+
+    with open(args.parameters_file) as parameters_file:
+        return json.load(parameters_file)
+
+
+def invoke(request: dict) -> dict:
+    """Call the function described by a server mode request
+
+    The request holds the "function" to call and its "parameters", along with an
+    optional "id" that is returned in the response. The response holds the "status",
+    0 if the function returned and 1 if it raised, the "output" it printed or logged,
+    and the JSON encoded "result".
+    """
+    output = io.StringIO()
+    status = 0
+    result = None
+
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            result = getattr(functions, request["function"])(
+                **request.get("parameters", {})
+            )
+        except Exception:
+            traceback.print_exc()
+            status = 1
+
+    return {
+        "id": request.get("id"),
+        "status": status,
+        "output": output.getvalue(),
+        "result": json.dumps(result, default=str),
+    }
+
+
+def serve(requests: IO[str], responses: IO[str]) -> None:
+    """Answer newline delimited JSON requests with a JSON response line each, one at
+    a time, until requests is closed"""
+    for line in requests:
+        if not line.strip():
+            continue
+
+        try:
+            request = json.loads(line)
+
+            if not isinstance(request, dict):
+                raise TypeError(f"expected a JSON object, got {type(request).__name__}")
+
+            response = invoke(request)
+        except (KeyError, TypeError, ValueError) as exc:
+            response = {
+                "id": None,
+                "status": 1,
+                "output": f"Bad request: {exc}\n",
+                "result": "null",
+            }
+
+        responses.write(json.dumps(response) + "\n")
+        responses.flush()
+
+
+def serve_socket(path: str) -> None:
+    """Serve the connections to a Unix socket at path, one after another"""
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(path)
+        server.listen()
+
+        while True:
+            connection, _ = server.accept()
+
+            with connection, connection.makefile("rw", encoding="utf-8") as stream:
+                serve(stream, stream)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-f", "--function", help="the function to call")
-    parser.add_argument(
+    parameters = parser.add_mutually_exclusive_group(required=True)
+    parameters.add_argument(
         "-p",
         "--parameters",
         help="the parameters to pass to the function in JSON format",
     )
+    parameters.add_argument(
+        "--parameters-file",
+        help="a file containing the parameters in JSON format, or - for stdin",
+    )
+    parameters.add_argument(
+        "--serve",
+        action="store_true",
+        help="call functions for newline delimited JSON requests read from stdin, "
+        "or the --socket, writing a JSON response line for each",
+    )
+    parser.add_argument("--socket", help="a Unix socket path to serve requests on")
 
     args = parser.parse_args()
 
-    result = getattr(functions, args.function)(**json.loads(args.parameters))
+    if args.serve:
+        if args.socket:
+            serve_socket(args.socket)
+        else:
+            # Anything the functions print is captured, so stdout only has responses
+            serve(sys.stdin, sys.stdout)
+
+        sys.exit(0)
+
+    result = getattr(functions, args.function)(**load_parameters(args))
     output = json.dumps(result, default=str)
 
     print(f"==== Output From Command ====\n{output}")
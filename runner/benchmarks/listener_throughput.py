@@ -0,0 +1,176 @@
+"""Listener dispatch throughput benchmark
+
+Compares the "poll" and "consume" listener modes against an in-memory stand-in for
+the broker and the celery workers, so no RabbitMQ or docker is required. Tasks are
+simulated by sleeping for the requested duration in a pool sized to the worker
+concurrency, and every Inspect.active() call costs a simulated broadcast round-trip.
+
+Usage (from the runner directory):
+
+    python -m benchmarks.listener_throughput --tasks 50 --duration 0.1
+"""
+import argparse
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from threading import Lock
+from time import monotonic, sleep
+from unittest import mock
+
+from pika.spec import Basic, BasicProperties
+
+from runner import listener
+
+
+class Finished(Exception):
+    """Raised by the stand-in broker once every message has been acked"""
+
+
+class StandInBroker:
+    """Just enough of a pika connection and channel to drive the listener loops"""
+
+    def __init__(self, tasks: int):
+        self.ready = deque(
+            json.dumps({"id": str(task_id)}).encode() for task_id in range(tasks)
+        )
+        self.total = tasks
+        self.acked = 0
+        self.unacked = 0
+        self.prefetch = 0
+        self.next_tag = 1
+        self.on_message = None
+        self.properties = BasicProperties(headers={"x-msg-type": "TASK_PACKAGE"})
+
+    def _check_finished(self):
+        if self.acked == self.total:
+            raise Finished
+
+    def _next_method(self, method_class):
+        method = method_class(delivery_tag=self.next_tag)
+        self.next_tag += 1
+        self.unacked += 1
+
+        return method
+
+    def basic_get(self, queue):
+        self._check_finished()
+
+        if not self.ready:
+            return None, None, None
+
+        return self._next_method(Basic.GetOk), self.properties, self.ready.popleft()
+
+    def basic_qos(self, prefetch_count):
+        self.prefetch = prefetch_count
+
+    def basic_consume(self, queue, on_message_callback):
+        self.on_message = on_message_callback
+
+    def basic_ack(self, delivery_tag):
+        self.acked += 1
+        self.unacked -= 1
+
+    def process_data_events(self, time_limit=0):
+        self._check_finished()
+        delivered = False
+
+        while self.ready and (not self.prefetch or self.unacked < self.prefetch):
+            method = self._next_method(Basic.Deliver)
+            self.on_message(self, method, self.properties, self.ready.popleft())
+            delivered = True
+
+        if not delivered:
+            sleep(time_limit)
+
+
+class StandInWorkers:
+    """Simulates the celery worker pool executing run_task"""
+
+    def __init__(self, concurrency: int, duration: float, completions: Queue):
+        self.pool = ThreadPoolExecutor(max_workers=concurrency)
+        self.duration = duration
+        self.completions = completions
+        self.active = set()
+        self.lock = Lock()
+
+    def _run(self, task_id: str):
+        sleep(self.duration)
+
+        with self.lock:
+            self.active.discard(task_id)
+
+        self.completions.put(task_id)
+
+    def dispatch(self, msg_type: str, msg_body: dict):
+        with self.lock:
+            self.active.add(msg_body["id"])
+
+        self.pool.submit(self._run, msg_body["id"])
+
+    def active_tasks(self, inspect, round_trip: float) -> list:
+        sleep(round_trip)
+
+        with self.lock:
+            return list(self.active)
+
+
+def run(mode: str, tasks: int, concurrency: int, duration: float, round_trip: float):
+    broker = StandInBroker(tasks)
+    completions = Queue()
+    workers = StandInWorkers(concurrency, duration, completions)
+
+    with (
+        mock.patch.object(listener, "_dispatch", workers.dispatch),
+        mock.patch.object(listener, "_get_worker_concurrency", lambda: concurrency),
+        mock.patch.object(
+            listener,
+            "_get_current_worker_tasks",
+            lambda inspect: workers.active_tasks(inspect, round_trip),
+        ),
+    ):
+        start = monotonic()
+
+        try:
+            if mode == "consume":
+                listener._consume(broker, broker, completions)
+            else:
+                listener._poll(broker, None)
+        except Finished:
+            pass
+
+        # Poll mode acks at dispatch, so let the last tasks finish before stopping
+        workers.pool.shutdown(wait=True)
+
+    return monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--duration", type=float, default=0.1, help="simulated task seconds"
+    )
+    parser.add_argument(
+        "--round-trip",
+        type=float,
+        default=0.05,
+        help="simulated Inspect.active() broadcast seconds",
+    )
+    parser.add_argument("--mode", choices=["poll", "consume"], action="append")
+    args = parser.parse_args()
+
+    ideal = args.tasks * args.duration / args.concurrency
+    print(f"{args.tasks} tasks of {args.duration}s, concurrency {args.concurrency}")
+    print(f"{'ideal':>8}: {ideal:8.2f}s {args.tasks / ideal:8.1f} tasks/s")
+
+    for mode in args.mode or ["poll", "consume"]:
+        elapsed = run(
+            mode, args.tasks, args.concurrency, args.duration, args.round_trip
+        )
+        print(f"{mode:>8}: {elapsed:8.2f}s {args.tasks / elapsed:8.1f} tasks/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Container versus local process per-task latency benchmark
+
+Runs the same function repeatedly through execute_task, first in a new container
+for every task and then as a local process, as for a package listed in
+LOCAL_PACKAGES. Requires access to a docker daemon and an image built from
+package_templates/python or package_templates/javascript (or any package image).
+
+Usage (from the runner directory):
+
+    python -m benchmarks.local_process --image localhost:5000/templates/python:latest
+"""
+import argparse
+import json
+import tempfile
+from unittest import mock
+
+from runner import config, local
+
+from .warm_pool import report, run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image", required=True)
+    parser.add_argument("--function", default="echo")
+    parser.add_argument("--parameters", default='{"message": "benchmark"}')
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    parameters = json.loads(args.parameters)
+
+    with mock.patch.object(config, "WARM_POOL_SIZE", 0):
+        report("docker", run(args.image, args.function, parameters, args.runs))
+
+    with (
+        tempfile.TemporaryDirectory() as package_dir,
+        mock.patch.object(config, "LOCAL_PACKAGES", [args.image]),
+        mock.patch.object(config, "LOCAL_PACKAGE_DIR", package_dir),
+        mock.patch.object(local, "_local_packages", None),
+    ):
+        # The first task prepares the package, so don't count it
+        report("prep", run(args.image, args.function, parameters, 1))
+        report("local", run(args.image, args.function, parameters, args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Cold versus warm container per-task latency benchmark
+
+Runs the same function repeatedly through execute_task, first starting a new
+container for every task and then with the warm container pool enabled. Requires
+access to a docker daemon and an image built from package_templates/python (or any
+package image).
+
+Usage (from the runner directory):
+
+    python -m benchmarks.warm_pool --image localhost:5000/templates/python:latest
+"""
+import argparse
+import json
+import statistics
+from time import perf_counter
+from unittest import mock
+
+from prometheus_client import REGISTRY
+
+from runner import config, pool
+from runner.handlers import execute_task
+
+
+def run(image: str, function: str, parameters: dict, runs: int) -> list[float]:
+    """Execute the function runs times and return the latency of each"""
+    latencies = []
+
+    for run_number in range(runs):
+        task = {
+            "id": f"benchmark-{run_number}",
+            "package": image,
+            "function": function,
+            "function_parameters": parameters,
+            "variables": {},
+        }
+
+        start = perf_counter()
+        result = execute_task(task)
+        latencies.append(perf_counter() - start)
+
+        if result["status"] != 0:
+            raise RuntimeError(f"Function failed: {result['output']}")
+
+    return latencies
+
+
+def report(name: str, latencies: list[float]):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    print(
+        f"{name:>5}: mean {statistics.mean(latencies) * 1000:8.1f}ms  "
+        f"p50 {statistics.median(latencies) * 1000:8.1f}ms  "
+        f"p95 {p95 * 1000:8.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image", required=True)
+    parser.add_argument("--function", default="echo")
+    parser.add_argument("--parameters", default='{"message": "benchmark"}')
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    parameters = json.loads(args.parameters)
+
+    with mock.patch.object(config, "WARM_POOL_SIZE", 0):
+        report("cold", run(args.image, args.function, parameters, args.runs))
+
+    with mock.patch.object(config, "WARM_POOL_SIZE", 1):
+        # The first task starts the warm container, so don't count it
+        run(args.image, args.function, parameters, 1)
+        report("warm", run(args.image, args.function, parameters, args.runs))
+        pool.get_pool().shutdown()
+
+    clients, client_seconds = _phase("client")
+    logins, login_seconds = _phase("login")
+    print(
+        f"docker client: {clients:.0f} created in {client_seconds * 1000:.1f}ms, "
+        f"{logins:.0f} logins in {login_seconds * 1000:.1f}ms"
+    )
+
+
+def _phase(phase: str) -> tuple[float, float]:
+    """Returns the number of times the phase was timed and the total seconds"""
+    name = "functionary_runner_phase_seconds"
+    labels = {"phase": phase}
+
+    return (
+        REGISTRY.get_sample_value(f"{name}_count", labels) or 0,
+        REGISTRY.get_sample_value(f"{name}_sum", labels) or 0,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,49 @@
 import logging
+import multiprocessing
 import sys
+from multiprocessing.queues import Queue
 from os import getenv
 
 from runner import Listener, Worker
+from runner.celery import WORKER_CONCURRENCY
+from runner.config import EXECUTOR, METRICS_PORT, SCHEDULER_MAX_TASKS
+from runner.metrics import start_metrics_server
 
 LOG_LEVEL = getenv("LOG_LEVEL", "INFO")
 logging.basicConfig(stream=sys.stdout, level=LOG_LEVEL)
 
 
-def spawn_listener() -> Listener:
-    listener = Listener()
+def spawn_listener(completions: Queue | None = None) -> Listener:
+    listener = Listener(completions=completions)
     listener.start()
 
     return listener
 
 
-def spawn_worker() -> Worker:
-    worker = Worker()
+def spawn_worker(completions: Queue | None = None) -> Worker:
+    worker = Worker(completions=completions)
     worker.start()
 
     return worker
 
 
-if __name__ == "__main__":
+def run_native() -> None:
+    """Run only the listener, which executes tasks itself"""
     listener = spawn_listener()
-    worker = spawn_worker()
+
+    logging.debug("Started listener process with native executor")
+
+    listener.join()
+
+
+def run_celery() -> None:
+    """Run the listener along with a celery worker that executes the tasks"""
+    # The worker tells the listener when tasks finish, so that their messages can be
+    # acked in consume mode, and so that they are remembered for deduplication
+    completions = multiprocessing.Queue()
+
+    listener = spawn_listener(completions)
+    worker = spawn_worker(completions)
 
     logging.debug("Started worker and listener processes")
 
@@ -32,3 +51,16 @@ if __name__ == "__main__":
     # immediately exit.
     listener.join()
     worker.join()
+
+
+if __name__ == "__main__":
+    if METRICS_PORT:
+        slots = SCHEDULER_MAX_TASKS if EXECUTOR == "native" else WORKER_CONCURRENCY
+        start_metrics_server(METRICS_PORT, slots)
+
+        logging.debug("Serving metrics on port %d", METRICS_PORT)
+
+    if EXECUTOR == "native":
+        run_native()
+    else:
+        run_celery()
@@ -1,11 +1,13 @@
 from logging import getLevelName
 from multiprocessing import Process
+from multiprocessing.queues import Queue
 from os import getenv
 
 from celery.apps.worker import Worker as CeleryWorker
 from setproctitle import setproctitle
 
 from runner.celery import WORKER_CONCURRENCY, WORKER_HOSTNAME, app
+from runner.handlers import report_completions
 from runner.listener import start_listening
 from runner.messaging import wait_for_connection
 
@@ -19,11 +21,15 @@ class Worker(Process):
     Attributes:
         name: Identification name given to the process
         app: Celery App used to create Celery Workers
+        completions: Queue to report finished task ids on, if any
     """
 
-    def __init__(self, name: str = "functionary: runner worker") -> None:
+    def __init__(
+        self, name: str = "functionary: runner worker", completions: Queue | None = None
+    ) -> None:
         super().__init__(name=name)
         self.app = app
+        self.completions = completions
         self.loglevel = getLevelName(getenv("CELERY_LOG_LEVEL", "WARNING").upper())
 
     def run(self) -> None:
@@ -50,6 +56,9 @@ class Worker(Process):
         # name is correct if anything happens prior to celery forking the workers
         setproctitle(self.name)
 
+        if self.completions is not None:
+            report_completions(self.completions)
+
         wait_for_connection()
         worker = CeleryWorker(app=self.app, hostname=WORKER_HOSTNAME)
         worker.setup_defaults(concurrency=WORKER_CONCURRENCY, loglevel=self.loglevel)
@@ -63,11 +72,17 @@ class Listener(Process):
 
     Attributes:
         name: Identification name given to the process
+        completions: Queue the Worker reports finished task ids on, if any
 
     """
 
-    def __init__(self, name: str = "functionary: runner listener") -> None:
+    def __init__(
+        self,
+        name: str = "functionary: runner listener",
+        completions: Queue | None = None,
+    ) -> None:
         super().__init__(name=name)
+        self.completions = completions
 
     def run(self) -> None:
         """Runs the Listener process
@@ -89,4 +104,4 @@ class Listener(Process):
         """
         setproctitle(self.name)
         wait_for_connection()
-        start_listening()
+        start_listening(self.completions)
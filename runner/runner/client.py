@@ -0,0 +1,135 @@
+"""Docker client shared by everything running in a runner process
+
+Building a DockerClient creates a new HTTP connection pool to the docker socket, so
+a single client is created per process and reused for every task and image pull.
+Registry logins are remembered by the client, so the registry is only contacted
+again when a pull is rejected for lack of authorization.
+
+The time spent setting up the client and logging in is observed in the metrics, as
+the "client" and "login" phases.
+"""
+import logging
+import os
+from threading import Lock
+
+import docker
+from docker.errors import APIError, DockerException
+
+from . import config
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Fragments of the error messages docker returns when a registry refuses a pull
+_AUTH_ERRORS = ("unauthorized", "authentication required", "denied")
+
+
+class DockerClientError(Exception):
+    pass
+
+
+_lock = Lock()
+
+# Client for this process along with the pid it was created in, see get_docker_client
+_client: tuple[int, docker.DockerClient] | None = None
+
+# (client id, registry, username) for each login made, see login_docker_client
+_logins: set[tuple[int, str | None, str]] = set()
+
+
+def get_docker_client(login: bool = False) -> docker.DockerClient:
+    """Returns the DockerClient for the current process, optionally logging it in
+
+    Args:
+        login: True to also login the DockerClient
+
+    Raises:
+        DockerClientError: Setup of the docker client failed
+    """
+    global _client
+
+    with _lock:
+        if _client is None or _client[0] != os.getpid():
+            try:
+                with timed("client"):
+                    client = docker.from_env(max_pool_size=config.DOCKER_MAX_POOL_SIZE)
+            except DockerException as exc:
+                logger.critical("Unable to establish docker socket connection.")
+                raise DockerClientError(f"Docker client setup failed: {exc}")
+
+            logger.debug("Created docker client")
+
+            _client = (os.getpid(), client)
+
+    if login:
+        login_docker_client(_client[1])
+
+    return _client[1]
+
+
+def login_docker_client(client: docker.DockerClient, reauth: bool = False) -> None:
+    """Login the given DockerClient.
+
+    The client keeps the credentials once logged in, so this only contacts the
+    registry the first time or when reauth is set.
+
+    Args:
+        client: The DockerClient to login
+        reauth: True to login again even if the client already has credentials
+    """
+    username = os.getenv("REGISTRY_USER")
+    password = os.getenv("REGISTRY_PASSWORD")
+    registry = os.getenv("REGISTRY_HOST")
+
+    if port := os.getenv("REGISTRY_PORT"):
+        registry += f":{port}"
+
+    if not (username and password):
+        return
+
+    login = (id(client), registry, username)
+
+    if not reauth and login in _logins:
+        return
+
+    try:
+        with timed("login"):
+            client.login(
+                username=username, password=password, registry=registry, reauth=True
+            )
+    except APIError as exc:
+        logger.critical("Docker login failed. Check REGISTRY_* settings.")
+        raise DockerClientError(f"Docker login failed: {exc}")
+
+    _logins.add(login)
+    logger.debug("Logged in to %s", registry)
+
+
+def pull(client: docker.DockerClient, image: str) -> None:
+    """Pull the image, logging in again once if the registry refuses the pull
+
+    Raises:
+        DockerClientError: The client could not be logged in
+        DockerException: The image could not be pulled
+    """
+    login_docker_client(client)
+
+    try:
+        client.images.pull(image)
+    except APIError as exc:
+        if not is_auth_error(exc):
+            raise
+
+        logger.info("Pull of %s was not authorized, logging in again", image)
+        login_docker_client(client, reauth=True)
+        client.images.pull(image)
+
+
+def is_auth_error(exc: APIError) -> bool:
+    """Whether the error is the registry refusing a request for lack of credentials"""
+    if exc.status_code in (401, 403):
+        return True
+
+    message = str(exc.explanation or exc).lower()
+
+    return any(fragment in message for fragment in _AUTH_ERRORS)
@@ -9,3 +9,122 @@ RABBITMQ_CACERT = os.getenv("RABBITMQ_CACERT")
 RABBITMQ_CERT = os.getenv("RABBITMQ_CERT")
 RABBITMQ_KEY = os.getenv("RABBITMQ_KEY")
 RABBITMQ_VHOST = os.getenv("RUNNER_DEFAULT_VHOST", "public")
+
+# "poll" checks the celery workers for capacity before fetching each message, while
+# "consume" lets the broker handle flow control via the channel prefetch.
+LISTENER_MODE = os.getenv("LISTENER_MODE", "poll").lower()
+
+# "celery" hands tasks to the celery worker process, while "native" runs them on a
+# thread pool inside the listener. The native executor always consumes.
+EXECUTOR = os.getenv("EXECUTOR", "celery").lower()
+
+# Number of warm containers to keep per recently used image. 0 disables the pool.
+WARM_POOL_SIZE = int(os.getenv("WARM_POOL_SIZE", 0))
+WARM_POOL_MAX_USES = int(os.getenv("WARM_POOL_MAX_USES", 100))
+WARM_POOL_IDLE_TIMEOUT = float(os.getenv("WARM_POOL_IDLE_TIMEOUT", 300))
+
+# Connections kept open to the docker socket by each process. Every running task
+# holds one while its output is followed.
+DOCKER_MAX_POOL_SIZE = int(
+    os.getenv("DOCKER_MAX_POOL_SIZE", max(10, 2 * (os.cpu_count() or 1)))
+)
+
+# Image pulls run concurrently on their own pool, separate from the task slots
+IMAGE_PULL_CONCURRENCY = int(os.getenv("IMAGE_PULL_CONCURRENCY", 2))
+
+# Directory of the locks that keep the runner's processes from pulling the same image
+# at the same time
+IMAGE_PULL_LOCK_DIR = os.getenv(
+    "IMAGE_PULL_LOCK_DIR", os.path.expanduser("~/.functionary/pulls")
+)
+
+# Bytes of disk package images may use before the least recently used are removed.
+# 0 disables eviction.
+IMAGE_CACHE_DISK_BUDGET = int(os.getenv("IMAGE_CACHE_DISK_BUDGET", 0))
+IMAGE_CACHE_PROTECT_SECONDS = float(os.getenv("IMAGE_CACHE_PROTECT_SECONDS", 3600))
+IMAGE_CACHE_EVICT_INTERVAL = float(os.getenv("IMAGE_CACHE_EVICT_INTERVAL", 300))
+
+# Results that finish close together are sent in one TASK_RESULT_BATCH message by
+# the native executor. A RESULT_BATCH_MAX_SIZE of 1 sends each result on its own.
+RESULT_BATCH_MAX_SIZE = int(os.getenv("RESULT_BATCH_MAX_SIZE", 50))
+RESULT_BATCH_MAX_DELAY = float(os.getenv("RESULT_BATCH_MAX_DELAY", 0.05))
+RESULT_BATCH_MAX_BYTES = int(os.getenv("RESULT_BATCH_MAX_BYTES", 1024 * 1024))
+
+# Results are spooled to this SQLite database until they have been published, so
+# that they survive broker outages and restarts. Results that fail to publish are
+# retried after RESULT_SPOOL_RETRY_DELAY seconds, doubling up to the max delay.
+RESULT_SPOOL_PATH = os.getenv(
+    "RESULT_SPOOL_PATH", os.path.expanduser("~/.functionary/results.sqlite3")
+)
+RESULT_SPOOL_RETRY_DELAY = float(os.getenv("RESULT_SPOOL_RETRY_DELAY", 30))
+RESULT_SPOOL_MAX_RETRY_DELAY = float(os.getenv("RESULT_SPOOL_MAX_RETRY_DELAY", 600))
+RESULT_SPOOL_DRAIN_INTERVAL = float(os.getenv("RESULT_SPOOL_DRAIN_INTERVAL", 5))
+# The most spooled results published with one broker confirm, split into messages of
+# RESULT_BATCH_MAX_SIZE results.
+RESULT_SPOOL_DRAIN_SIZE = int(os.getenv("RESULT_SPOOL_DRAIN_SIZE", 500))
+
+# Function parameters larger than this, in bytes, are copied into the container as
+# a file rather than passed on the command line. The default is the longest single
+# argument Linux allows, 128KiB including its terminating null, so parameters only
+# go in a file when they couldn't be run otherwise. Only package images built on the
+# current templates have a harness that supports --parameters-file, older images
+# have to be rebuilt to take parameters larger than this.
+PARAMETERS_FILE_THRESHOLD = int(os.getenv("PARAMETERS_FILE_THRESHOLD", 128 * 1024 - 1))
+
+# Output or results larger than this, in bytes, are uploaded straight to storage when
+# the control plane provides upload URLs, rather than sent in the TASK_RESULT.
+RESULT_UPLOAD_THRESHOLD = int(os.getenv("RESULT_UPLOAD_THRESHOLD", 64 * 1024))
+RESULT_UPLOAD_TIMEOUT = float(os.getenv("RESULT_UPLOAD_TIMEOUT", 300))
+
+# Capacity shared by the tasks the native executor runs at once. A CPU or memory
+# capacity of 0 uses what the host has. Tasks of packages that don't declare their
+# resources are allotted the defaults, a TASK_DEFAULT_MEMORY of 0 allots none.
+TASK_CPU_CAPACITY = float(os.getenv("TASK_CPU_CAPACITY", 0))
+TASK_MEMORY_CAPACITY = int(os.getenv("TASK_MEMORY_CAPACITY", 0))
+TASK_DEFAULT_CPU = float(os.getenv("TASK_DEFAULT_CPU", 1))
+TASK_DEFAULT_MEMORY = int(os.getenv("TASK_DEFAULT_MEMORY", 0))
+SCHEDULER_MAX_TASKS = int(os.getenv("SCHEDULER_MAX_TASKS", 4 * (os.cpu_count() or 1)))
+SCHEDULER_BACKFILL_WINDOW = float(os.getenv("SCHEDULER_BACKFILL_WINDOW", 30))
+
+# Seconds a task may run for when the control plane doesn't give it a timeout. 0
+# lets such tasks run until they finish.
+TASK_DEFAULT_TIMEOUT = float(os.getenv("TASK_DEFAULT_TIMEOUT", 0))
+
+# Directory where the processes running tasks record what each runs in, so that the
+# listener can cancel tasks run by the celery worker processes
+TASK_CONTROL_DIR = os.getenv(
+    "TASK_CONTROL_DIR", os.path.expanduser("~/.functionary/tasks")
+)
+
+# Seconds a task is remembered after it finishes, during which a redelivery of it is
+# dropped rather than run again, and the most tasks remembered at once
+TASK_DEDUP_WINDOW = float(os.getenv("TASK_DEDUP_WINDOW", 3600))
+TASK_DEDUP_MAX_TASKS = int(os.getenv("TASK_DEDUP_MAX_TASKS", 10000))
+
+# Packages trusted to run in a local process rather than a container, as a comma
+# separated list of image names, which may use shell-style wildcards. Each package is
+# prepared once in LOCAL_PACKAGE_DIR.
+LOCAL_PACKAGES = [
+    pattern.strip()
+    for pattern in os.getenv("LOCAL_PACKAGES", "").split(",")
+    if pattern.strip()
+]
+LOCAL_PACKAGE_DIR = os.getenv(
+    "LOCAL_PACKAGE_DIR", os.path.expanduser("~/.functionary/packages")
+)
+
+# Seconds between samples of a running task's container stats, which are summarized
+# in its result. Each sample is one request to docker. 0 disables sampling.
+USAGE_SAMPLE_INTERVAL = float(os.getenv("USAGE_SAMPLE_INTERVAL", 5))
+
+# Container output held in memory before spilling to a temporary file, in bytes
+OUTPUT_SPOOL_THRESHOLD = int(os.getenv("OUTPUT_SPOOL_THRESHOLD", 1024 * 1024))
+OUTPUT_CHUNK_SIZE = 64 * 1024
+
+# Seconds between TASK_LOG_CHUNK messages for a running task. 0 disables streaming.
+LOG_STREAM_INTERVAL = float(os.getenv("LOG_STREAM_INTERVAL", 1))
+LOG_STREAM_MAX_BYTES = int(os.getenv("LOG_STREAM_MAX_BYTES", 64 * 1024))
+
+# Port that Prometheus metrics are served on by the main runner process. 0 disables
+# the endpoint.
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
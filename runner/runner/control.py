@@ -0,0 +1,304 @@
+"""Timeouts and cancellation of running tasks
+
+Each task is tracked while it executes so that its container can be killed when its
+deadline passes or a CANCEL_TASK message arrives for it. A task stopped either way
+has its result sent with a termination of TIMEOUT or CANCELED.
+
+Tasks run by the celery executor live in the worker processes rather than the
+listener that receives CANCEL_TASK. The worker records the container or process
+group each task runs in with the TaskRegistry, which the listener kills it by, and
+the listener records the cancellation there so that the worker reports the task as
+CANCELED, or stops it as soon as it starts.
+"""
+import json
+import logging
+import os
+import signal
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock, Timer
+from time import time
+from typing import Callable, Iterator
+
+from docker.errors import DockerException
+
+from . import config
+from .client import get_docker_client
+
+logger = logging.getLogger(__name__)
+
+# Label holding the task id on the containers tasks are run in
+TASK_LABEL = "functionary.task"
+
+CANCELED = "CANCELED"
+TIMEOUT = "TIMEOUT"
+
+# The number of cancellations remembered for tasks that haven't arrived yet
+_CANCELED_HISTORY = 1000
+
+# Seconds a cancellation is kept in the TaskRegistry. CANCEL_TASK is sent to every
+# runner, so most are for tasks that will never run here.
+_CANCELED_MARKER_AGE = 3600
+
+
+class TaskRegistry:
+    """Where the processes executing tasks record what each runs in, so that a task
+    can be stopped from another process
+
+    Each running task has a file named for its id, holding the container or process
+    group its function runs in. A cancellation is recorded as a file named for the
+    task id with a ".canceled" suffix.
+
+    Args:
+        path: The directory the files are kept in
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def register(self, task_id: str, target: dict) -> None:
+        """Record what the task runs in, a "container" id or "process_group" id"""
+        os.makedirs(self.path, exist_ok=True)
+        temp_path = f"{self._target_path(task_id)}.tmp"
+
+        with open(temp_path, "w") as file:
+            json.dump(target, file)
+
+        os.replace(temp_path, self._target_path(task_id))
+
+    def unregister(self, task_id: str) -> None:
+        """Forget what the task runs in, such as once it has exited"""
+        self._remove(self._target_path(task_id))
+
+    def clear(self, task_id: str) -> None:
+        """Forget the task along with its cancellation, once it has finished"""
+        self._remove(self._target_path(task_id))
+        self._remove(self._canceled_path(task_id))
+
+    def get(self, task_id: str) -> dict | None:
+        """Returns what the task runs in, or None if it isn't running"""
+        try:
+            with open(self._target_path(task_id)) as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def cancel(self, task_id: str) -> None:
+        """Record that the task was canceled, forgetting old cancellations"""
+        os.makedirs(self.path, exist_ok=True)
+        expired = time() - _CANCELED_MARKER_AGE
+
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".canceled") and entry.stat().st_mtime < expired:
+                self._remove(entry.path)
+
+        with open(self._canceled_path(task_id), "w"):
+            pass
+
+    def is_canceled(self, task_id: str) -> bool:
+        return os.path.exists(self._canceled_path(task_id))
+
+    def _target_path(self, task_id: str) -> str:
+        return os.path.join(self.path, task_id)
+
+    def _canceled_path(self, task_id: str) -> str:
+        return os.path.join(self.path, f"{task_id}.canceled")
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class RunningTask:
+    """A task being executed, which may be stopped
+
+    Attributes:
+        task_id: The id of the task
+        reason: CANCELED or TIMEOUT once the task has been stopped, otherwise None
+        registry: Where what the task runs in is recorded for other processes, if
+            anywhere
+    """
+
+    def __init__(self, task_id: str, registry: TaskRegistry | None = None):
+        self.task_id = task_id
+        self.registry = registry
+
+        self._lock = Lock()
+        self._reason: str | None = None
+        self._kill: Callable[[], None] | None = None
+
+    @property
+    def reason(self) -> str | None:
+        # Another process may have killed the task, see TaskControl.cancel
+        if self._reason is None and self.registry is not None:
+            if self.registry.is_canceled(self.task_id):
+                self._reason = CANCELED
+
+        return self._reason
+
+    @reason.setter
+    def reason(self, reason: str | None) -> None:
+        self._reason = reason
+
+    def attach(self, kill: Callable[[], None], target: dict | None = None) -> None:
+        """Set how to kill the task's container or process once it has started
+
+        The target, a "container" id or "process_group" id, is recorded in the
+        registry so that other processes can kill it too. If the task was stopped
+        before it started, it is killed now.
+        """
+        if self.registry is not None and target is not None:
+            try:
+                self.registry.register(self.task_id, target)
+            except OSError as exc:
+                # Only other processes are unable to stop it
+                logger.warning("Unable to register task %s: %s", self.task_id, exc)
+
+        with self._lock:
+            self._kill = kill
+
+        if self.reason is not None:
+            self._call_kill(kill)
+
+    def detach(self) -> None:
+        """Forget the container or process, such as once it has exited"""
+        with self._lock:
+            self._kill = None
+
+        if self.registry is not None:
+            self.registry.unregister(self.task_id)
+
+    def stop(self, reason: str) -> None:
+        """Stop the task, killing its container or process if it has started"""
+        with self._lock:
+            if self._reason is not None:
+                return
+
+            self._reason = reason
+            kill = self._kill
+
+        logger.info("Stopping task %s: %s", self.task_id, reason)
+
+        if kill is not None:
+            self._call_kill(kill)
+
+    def _call_kill(self, kill: Callable[[], None]) -> None:
+        try:
+            kill()
+        except DockerException as exc:
+            # Most likely the container exited on its own in the meantime
+            logger.debug("Unable to kill container of task %s: %s", self.task_id, exc)
+
+
+class TaskControl:
+    """The tasks running in this process
+
+    Args:
+        registry: Where tasks running in other processes can be found, and those
+            running in this one are recorded, if anywhere
+    """
+
+    def __init__(self, registry: TaskRegistry | None = None):
+        self.registry = registry
+        self._lock = Lock()
+        self._running: dict[str, RunningTask] = {}
+        self._canceled: deque[str] = deque(maxlen=_CANCELED_HISTORY)
+
+    @contextmanager
+    def track(self, task_id: str, timeout: float | None) -> Iterator[RunningTask]:
+        """Track a task while it executes, stopping it once timeout seconds pass
+
+        Yields:
+            The RunningTask, which is already stopped if it was canceled before it
+            arrived
+        """
+        running_task = RunningTask(task_id, self.registry)
+
+        with self._lock:
+            if task_id in self._canceled:
+                running_task.reason = CANCELED
+
+            self._running[task_id] = running_task
+
+        timer = None
+
+        if timeout:
+            timer = Timer(timeout, running_task.stop, (TIMEOUT,))
+            timer.daemon = True
+            timer.start()
+
+        try:
+            yield running_task
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+            with self._lock:
+                if self._running.get(task_id) is running_task:
+                    del self._running[task_id]
+
+            if self.registry is not None:
+                self.registry.clear(task_id)
+
+    def cancel(self, task_id: str) -> None:
+        """Stop a task, whether it runs in this process or another
+
+        Tasks that haven't arrived yet are stopped as soon as they do.
+        """
+        with self._lock:
+            self._canceled.append(task_id)
+            running_task = self._running.get(task_id)
+
+        if running_task is not None:
+            running_task.stop(CANCELED)
+        elif self.registry is not None:
+            _cancel_registered(self.registry, task_id)
+
+    def is_canceled(self, task_id: str) -> bool:
+        with self._lock:
+            return task_id in self._canceled
+
+
+def get_timeout(task: dict) -> float | None:
+    """Returns the seconds the task may run for, or None if it has no limit"""
+    return task.get("timeout") or config.TASK_DEFAULT_TIMEOUT or None
+
+
+def _cancel_registered(registry: TaskRegistry, task_id: str) -> None:
+    """Stop a task running in another process, such as a celery worker"""
+    try:
+        # Recorded first, so that a task registered in the meantime sees it
+        registry.cancel(task_id)
+    except OSError as exc:
+        logger.warning("Unable to record cancellation of task %s: %s", task_id, exc)
+
+    if (target := registry.get(task_id)) is None:
+        return
+
+    logger.info("Killing %s of task %s", target, task_id)
+
+    try:
+        if container_id := target.get("container"):
+            get_docker_client().api.kill(container_id)
+        elif process_group := target.get("process_group"):
+            os.killpg(process_group, signal.SIGKILL)
+    except (DockerException, ProcessLookupError) as exc:
+        # Most likely the task finished in the meantime
+        logger.debug("Unable to kill %s of task %s: %s", target, task_id, exc)
+
+
+# Control for this process along with the pid it was created in, see get_control
+_control: tuple[int, TaskControl] | None = None
+
+
+def get_control() -> TaskControl:
+    """Returns the TaskControl for the current process"""
+    global _control
+
+    if _control is None or _control[0] != os.getpid():
+        _control = (os.getpid(), TaskControl(TaskRegistry(config.TASK_CONTROL_DIR)))
+
+    return _control[1]
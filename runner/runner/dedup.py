@@ -0,0 +1,102 @@
+"""Deduplication of redelivered tasks
+
+RabbitMQ redelivers a TASK_PACKAGE whose message was never acked, such as when the
+listener's connection drops while the task runs. Running it again would repeat the
+function's side effects and send a second result, so the listener keeps a record of
+the tasks it has received and drops any that arrive again.
+
+A task is remembered from when it arrives until TASK_DEDUP_WINDOW seconds after it
+finishes, or after it arrives when the executor doesn't report it finishing. At most
+TASK_DEDUP_MAX_TASKS are remembered, the oldest being forgotten first. The record is
+kept in memory, so a task redelivered after the runner restarts is run again.
+"""
+import logging
+import os
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+from . import config
+from .metrics import DUPLICATE_TASKS
+
+logger = logging.getLogger(__name__)
+
+
+class TaskHistory:
+    """The tasks received recently
+
+    Attributes:
+        window: Seconds a task is remembered for after it was last seen
+        max_tasks: The most tasks remembered
+    """
+
+    def __init__(self, window: float, max_tasks: int):
+        self.window = window
+        self.max_tasks = max_tasks
+
+        self._lock = Lock()
+        # Task ids by when they were last seen, the oldest first
+        self._seen: OrderedDict[str, float] = OrderedDict()
+
+    def receive(self, task_id: str) -> bool:
+        """Record that the task has arrived
+
+        Returns:
+            False if the task is a duplicate of one received within the window,
+            otherwise True
+        """
+        now = monotonic()
+
+        with self._lock:
+            self._expire(now)
+
+            if task_id in self._seen:
+                duplicate = True
+            else:
+                duplicate = False
+                self._seen[task_id] = now
+
+                if len(self._seen) > self.max_tasks:
+                    self._seen.popitem(last=False)
+
+        if duplicate:
+            logger.info("Task %s was already received, dropping duplicate", task_id)
+            DUPLICATE_TASKS.inc()
+
+        return not duplicate
+
+    def complete(self, task_id: str) -> None:
+        """Record that the task finished, remembering it for another window"""
+        with self._lock:
+            if task_id in self._seen:
+                self._seen[task_id] = monotonic()
+                self._seen.move_to_end(task_id)
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def _expire(self, now: float) -> None:
+        while self._seen:
+            task_id, seen_at = next(iter(self._seen.items()))
+
+            if now - seen_at < self.window:
+                return
+
+            del self._seen[task_id]
+
+
+# History for this process along with the pid it was created in, see get_history
+_history: tuple[int, TaskHistory] | None = None
+
+
+def get_history() -> TaskHistory:
+    """Returns the TaskHistory for the current process"""
+    global _history
+
+    if _history is None or _history[0] != os.getpid():
+        _history = (
+            os.getpid(),
+            TaskHistory(config.TASK_DEDUP_WINDOW, config.TASK_DEDUP_MAX_TASKS),
+        )
+
+    return _history[1]
@@ -0,0 +1,107 @@
+"""In-process task execution
+
+Used when the runner is started with EXECUTOR=native. Rather than handing tasks to
+the celery worker, the listener runs them on a bounded thread pool and publishes
+the results itself, so each task costs one consume and at most one publish. Results
+of tasks that finish close together are published in a single batch. Tasks are
+started as the resources they need become available, see scheduler. Each result is
+spooled before its task is reported as complete, and left there for the drainer if
+it can't be published, see spool.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+
+from . import config
+from .control import get_control
+from .handlers import execute_task, send_results
+from .images import get_image_cache
+from .results import ResultAggregator
+from .scheduler import ResourceScheduler, get_host_capacity, get_requirements
+from .spool import get_spool
+from .utils import create_failed_result
+
+logger = logging.getLogger(__name__)
+
+
+class NativeExecutor:
+    """Executes tasks on a thread pool within the listener process
+
+    Attributes:
+        pool: The thread pool that tasks are run on
+        scheduler: Decides when each task may start, based on its resources
+        results: The aggregator that batches results for publishing
+        spool: Where results are kept until they have been published
+        completions: Queue that the ids of finished tasks are put on
+    """
+
+    def __init__(self, max_workers: int):
+        self.pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="executor"
+        )
+        self.scheduler = ResourceScheduler(
+            get_host_capacity(), max_workers, config.SCHEDULER_BACKFILL_WINDOW
+        )
+        self.results = ResultAggregator(
+            send_results,
+            config.RESULT_BATCH_MAX_SIZE,
+            config.RESULT_BATCH_MAX_DELAY,
+            config.RESULT_BATCH_MAX_BYTES,
+        )
+        self.spool = get_spool()
+        self.completions: Queue[str] = Queue()
+
+    def dispatch(self, msg_type: str, msg_body: dict) -> None:
+        """Submit the work described by a message to the pool
+
+        Args:
+            msg_type: The x-msg-type of the received message
+            msg_body: The decoded message body
+        """
+        match msg_type:
+            case "PULL_IMAGE":
+                get_image_cache().prefetch(msg_body["image_name"])
+            case "CANCEL_TASK":
+                get_control().cancel(msg_body["task_id"])
+            case "TASK_PACKAGE":
+                get_image_cache().touch(msg_body["package"])
+                self.scheduler.submit(
+                    msg_body["id"],
+                    get_requirements(msg_body),
+                    lambda: self.pool.submit(self._run_task, msg_body),
+                )
+            case _:
+                logger.error("Unrecognized message type: %s", msg_type)
+
+    def _run_task(self, task: dict) -> None:
+        try:
+            result = execute_task(task)
+        except Exception as exc:
+            logger.error("Task %s failed: %s", task["id"], exc)
+            result = create_failed_result(task, f"Task execution failed: {exc}")
+
+        try:
+            result_id = self.spool.add(result)
+        except Exception as exc:
+            logger.error("Unable to spool result for task %s: %s", task["id"], exc)
+            result_id = None
+
+        try:
+            self.results.add(result).result()
+        except Exception as exc:
+            logger.warning(
+                "Unable to publish result for task %s, it will be retried: %s",
+                task["id"],
+                exc,
+            )
+        else:
+            if result_id is not None:
+                self.spool.remove([result_id])
+        finally:
+            self.scheduler.release(task["id"])
+            self.completions.put(task["id"])
+
+    def shutdown(self) -> None:
+        """Wait for running tasks to finish and their results to be published"""
+        self.pool.shutdown(wait=True)
+        self.results.shutdown()
@@ -1,20 +1,49 @@
-import itertools
+import io
 import json
 import logging
+import os
+import signal
+import subprocess
+import tarfile
+from dataclasses import dataclass
+from multiprocessing.queues import Queue
 from os import getenv
+from time import perf_counter
 
 import docker
 from celery import Task
+from celery.signals import task_postrun, worker_process_shutdown
 from docker.errors import APIError, DockerException
+from docker.models.containers import Container
 
+from . import config
 from .celery import app
-from .messaging import send_message
+from .client import get_docker_client, pull
+from .control import TASK_LABEL, RunningTask, get_control, get_timeout
+from .images import get_image_cache
+from .local import get_local_packages, is_local
+from .logstream import stream_output
+from .messaging import send_message, send_messages
+from .metrics import TaskTimings, busy_slot, mark_process_dead, observe_queued, timed
+from .output import OutputCapture
+from .pool import WarmPool, get_pool
+from .scheduler import get_container_limits
+from .spool import get_spool
+from .upload import upload_output
+from .usage import ResourceUsage, sample_usage
 from .utils import create_failed_result, create_result
 
-OUTPUT_SEPARATOR = b"==== Output From Command ====\n"
+# Where large parameters are written in the container, see ParametersFile
+PARAMETERS_DIR = "/tmp"
+
+# Exit status reported for a function whose container was killed, as for SIGKILL
+STOPPED_EXIT_STATUS = 137
 
 logger = logging.getLogger(__name__)
 
+# Queue used to tell the listener when a run_task has finished, see report_completions
+_completions: Queue | None = None
+
 
 class ResultPublishingTask(Task):
     """Simple wrapper to make sure failed tasks don't stay in progress"""
@@ -38,143 +67,603 @@ class ResultPublishingTask(Task):
             return
 
         result = create_failed_result(task, f"Task execution failed: {exc}")
-        publish_result.delay(result)
-
+        publish_result(result)
 
-class DockerClientError(Exception):
-    pass
 
+@dataclass
+class ParametersFile:
+    """Function parameters too large for the command line
 
-def _login_docker_client(client: docker.DockerClient):
-    """Login the given DockerClient.
+    They are copied into the container before the function runs and the harness is
+    given the path to read them from with --parameters-file.
 
-    Args:
-        client: The DockerClient to login
+    Attributes:
+        name: The file name within PARAMETERS_DIR
+        content: The JSON encoded parameters
     """
-    username = getenv("REGISTRY_USER")
-    password = getenv("REGISTRY_PASSWORD")
-    registry = getenv("REGISTRY_HOST")
 
-    if port := getenv("REGISTRY_PORT"):
-        registry += f":{port}"
+    name: str
+    content: bytes
 
-    if username and password:
-        try:
-            client.login(username=username, password=password, registry=registry)
-        except APIError as exc:
-            logger.critical("Docker login failed. Check REGISTRY_* settings.")
-            raise DockerClientError(f"Docker login failed: {exc}")
+    @property
+    def path(self) -> str:
+        return f"{PARAMETERS_DIR}/{self.name}"
 
+    def archive(self) -> bytes:
+        """Returns a tar archive of the file, as expected by put_archive"""
+        buffer = io.BytesIO()
+        info = tarfile.TarInfo(self.name)
+        info.size = len(self.content)
+        info.mode = 0o444
 
-def _get_docker_client(login: bool = False) -> docker.DockerClient:
-    """Configures a DockerClient and optionally logs in.
+        with tarfile.open(fileobj=buffer, mode="w") as archive:
+            archive.addfile(info, io.BytesIO(self.content))
 
-    Args:
-        login: True to also login the DockerClient
-    Raises:
-        DockerClientError: Setup of the docker client failed
+        return buffer.getvalue()
+
+
+def _get_run_kwargs(task: dict) -> dict:
+    """Returns the network and resource limit containers.run arguments for the task"""
+    kwargs = get_container_limits(task)
+
+    if network := getenv("FUNCTIONARY_NETWORK"):
+        kwargs["network"] = network
+    elif network_mode := getenv("FUNCTIONARY_NETWORK_MODE"):
+        kwargs["network_mode"] = network_mode
+
+    return kwargs
+
+
+def _exec_in_warm_container(
+    pool: WarmPool,
+    docker_client: docker.DockerClient,
+    package: str,
+    run_command: list[str],
+    variables: dict,
+    run_kwargs: dict,
+    capture: OutputCapture,
+    running_task: RunningTask,
+    timings: TaskTimings,
+    usage: ResourceUsage,
+    parameters_file: ParametersFile | None = None,
+) -> int | None:
+    """Run the function in a container from the warm pool
+
+    A warm container that is killed to stop the task is removed rather than reused.
+
+    Returns:
+        The exit status, or None if no warm container was available and the
+        function should be run in a new container instead.
     """
     try:
-        client = docker.from_env()
+        with timed("create", timings):
+            warm = pool.acquire(docker_client, package, run_kwargs)
     except DockerException as exc:
-        logger.critical("Unable to establish docker socket connection.")
-        raise DockerClientError(f"Docker client setup failed: {exc}")
+        # Most likely the image hasn't been pulled yet, which the cold path handles
+        logger.debug("Unable to start warm container for %s: %s", package, exc)
+        return None
 
-    if login:
-        _login_docker_client(client)
+    if warm is None:
+        return None
 
-    return client
+    healthy = False
+    exit_status = STOPPED_EXIT_STATUS
+    running_task.attach(warm.container.kill, {"container": warm.container.id})
 
+    try:
+        if parameters_file is not None:
+            with timed("start", timings):
+                warm.container.put_archive(PARAMETERS_DIR, parameters_file.archive())
 
-@app.task(
-    default_retry_delay=30,
-    retry_kwargs={
-        "max_retries": 3,
-    },
-    autoretry_for=(DockerException,),
-)
-def pull_image(*, package) -> None:
-    package = package.get("image_name")
+        with (
+            timed("run", timings),
+            sample_usage(
+                warm.container, usage, config.USAGE_SAMPLE_INTERVAL, warm=True
+            ),
+        ):
+            exec_id = docker_client.api.exec_create(
+                warm.container.id, warm.entrypoint + run_command, environment=variables
+            )["Id"]
 
-    docker_client = _get_docker_client(login=True)
-    try:
-        docker_client.images.pull(package)
-    except DockerException as exc:
-        logger.warning(f"Unable to pull docker image for {package}.")
-        raise DockerClientError(f"Docker image pull failed: {exc}")
+            for chunk in docker_client.api.exec_start(exec_id, stream=True):
+                capture.feed(chunk)
 
-    logger.debug(f"Pulled {package}")
+            capture.finish()
 
+        if running_task.reason is not None:
+            return exit_status
 
-@app.task(base=ResultPublishingTask)
-def run_task(*, task):
-    task_id = task.get("id")
-    package = task.get("package")
-    function = task.get("function")
-    parameters = json.dumps(task["function_parameters"])
-    variables = task.get("variables")
-    run_command = ["--function", function, "--parameters", parameters]
+        exit_status = docker_client.api.exec_inspect(exec_id)["ExitCode"]
 
-    logger.info(
-        "Task %s running (function: %s, package %s)", task_id, function, package
-    )
-    docker_client = _get_docker_client()
+        if parameters_file is not None:
+            # The container is reused, so don't leave the parameters behind
+            warm.container.exec_run(["rm", "-f", parameters_file.path])
+
+        healthy = True
+    except DockerException as exc:
+        if running_task.reason is None:
+            raise Exception(f"Unable to execute function. Encountered error: {exc}")
+    finally:
+        running_task.detach()
+        pool.release(warm, healthy)
+
+    return exit_status
+
+
+def _run_in_new_container(
+    docker_client: docker.DockerClient,
+    package: str,
+    run_command: list[str],
+    variables: dict,
+    run_kwargs: dict,
+    capture: OutputCapture,
+    running_task: RunningTask,
+    timings: TaskTimings,
+    usage: ResourceUsage,
+    parameters_file: ParametersFile | None = None,
+) -> int:
+    """Run the function in a new container, removing it afterwards
+
+    Returns:
+        The exit status
+    """
     try:
         kwargs = {
             "auto_remove": False,
             "detach": True,
             "command": run_command,
             "environment": variables,
+            "labels": {TASK_LABEL: running_task.task_id},
+            **run_kwargs,
         }
 
-        if network := getenv("FUNCTIONARY_NETWORK"):
-            kwargs["network"] = network
-        elif network_mode := getenv("FUNCTIONARY_NETWORK_MODE"):
-            kwargs["network_mode"] = network_mode
+        with timed("create", timings):
+            try:
+                # Create the container assuming the image has been pulled.
+                container = docker_client.containers.create(package, **kwargs)
+            except APIError:
+                # The create function should result in an APIError if the image
+                # doesn't exist and it's not able to be pulled. Login and try again.
+                logger.debug("Failed to create container, authenticating and retrying")
+
+                pull(docker_client, package)
+                container = docker_client.containers.create(package, **kwargs)
+    except DockerException as exc:
+        raise Exception(f"Unable to execute function. Encountered error: {exc}")
 
-        try:
-            # Run the container assuming the image has been pulled.
-            container = docker_client.containers.run(package, **kwargs)
-        except APIError:
-            # The run function should result in an APIError if the image doesn't
-            # exist and it's not able to be pulled. Login and try again.
-            logger.debug("Failed to run container, authenticating and retrying")
-
-            _login_docker_client(docker_client)
-            docker_client.images.pull(package)
-            container = docker_client.containers.run(package, **kwargs)
+    try:
+        with timed("start", timings):
+            if parameters_file is not None:
+                container.put_archive(PARAMETERS_DIR, parameters_file.archive())
+
+            container.start()
     except DockerException as exc:
+        _remove_container(container, timings)
         raise Exception(f"Unable to execute function. Encountered error: {exc}")
 
+    running_task.attach(container.kill, {"container": container.id})
+
     try:
-        exit_status = container.wait()["StatusCode"]
-        logs = container.logs(stream=True)
-        output = b"".join(
-            itertools.takewhile(lambda x: x != OUTPUT_SEPARATOR, logs)
-        ).rstrip()
-        result = b"".join(logs).rstrip()
-        logger.info("Task %s succeeded", task_id)
+        with (
+            timed("run", timings),
+            sample_usage(container, usage, config.USAGE_SAMPLE_INTERVAL),
+        ):
+            # Follow the logs while the container runs rather than reading them all
+            # once it has exited, so that they are never held in memory all at once.
+            for chunk in container.logs(stream=True, follow=True):
+                capture.feed(chunk)
+
+            capture.finish()
+            exit_status = container.wait()["StatusCode"]
     except Exception as exc:  # raises both APIError and requests.exceptions.ReadTimeout
-        raise Exception(f"Unable to get result. Encountered error: {exc}")
+        if running_task.reason is None:
+            raise Exception(f"Unable to get result. Encountered error: {exc}")
+
+        exit_status = STOPPED_EXIT_STATUS
+    finally:
+        running_task.detach()
+        _remove_container(container, timings)
+
+    return exit_status
+
+
+def _run_in_local_process(
+    docker_client: docker.DockerClient,
+    package: str,
+    run_command: list[str],
+    variables: dict,
+    capture: OutputCapture,
+    running_task: RunningTask,
+    timings: TaskTimings,
+    parameters_file: ParametersFile | None = None,
+) -> int:
+    """Run the function in a local process, for packages trusted to run outside a
+    container, see local
+
+    Returns:
+        The exit status, which is 128 plus the signal number if the process was
+        killed, as with containers
+    """
+    try:
+        with timed("create", timings):
+            local_package = get_local_packages().get(docker_client, package)
+    except Exception as exc:
+        raise Exception(
+            f"Unable to prepare package {package}. Encountered error: {exc}"
+        )
+
+    try:
+        with timed("start", timings):
+            if parameters_file is not None:
+                _write_parameters_file(parameters_file)
+
+            process = subprocess.Popen(
+                local_package.command + run_command,
+                cwd=local_package.path,
+                env={**local_package.environment, **(variables or {})},
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+    except OSError as exc:
+        _remove_parameters_file(parameters_file)
+        raise Exception(f"Unable to execute function. Encountered error: {exc}")
+
+    running_task.attach(
+        lambda: _kill_process_group(process), {"process_group": process.pid}
+    )
+
+    try:
+        with timed("run", timings):
+            while chunk := process.stdout.read1(config.OUTPUT_CHUNK_SIZE):
+                capture.feed(chunk)
+
+            capture.finish()
+            exit_status = process.wait()
+    finally:
+        running_task.detach()
+        process.stdout.close()
+        _remove_parameters_file(parameters_file)
+
+    return 128 - exit_status if exit_status < 0 else exit_status
+
+
+def _write_parameters_file(parameters_file: ParametersFile) -> None:
+    """Write the parameters file to PARAMETERS_DIR on this host"""
+    fd = os.open(parameters_file.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+
+    with os.fdopen(fd, "wb") as file:
+        file.write(parameters_file.content)
 
+
+def _remove_parameters_file(parameters_file: ParametersFile | None) -> None:
+    if parameters_file is None:
+        return
+
+    try:
+        os.remove(parameters_file.path)
+    except FileNotFoundError:
+        pass
+
+
+def _kill_process_group(process: subprocess.Popen) -> None:
+    """Kill the process along with any children it started"""
     try:
-        container.remove()
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        # The process exited in the meantime
+        pass
+
+
+def _remove_container(container: Container, timings: TaskTimings) -> None:
+    try:
+        with timed("remove", timings):
+            container.remove(force=True)
     except DockerException:
         # Failing cleanup shouldn't fail the whole task, log a message
-        logger.info(f"Unable to remove container for task {task['id']}")
+        logger.info(f"Unable to remove container {container.short_id}")
+
+
+def execute_task(task: dict) -> dict:
+    """Run the function described by a TASK_PACKAGE message in its package container,
+    or a local process for packages trusted to run outside of one
+
+    Args:
+        task: The TASK_PACKAGE message body
+
+    The container is killed if the task runs past its timeout or is canceled, and
+    the result then carries a termination of TIMEOUT or CANCELED.
+
+    Returns:
+        The task result, see create_result
+
+    Raises:
+        Exception: The container could not be run or its output could not be read
+    """
+    task_id = task.get("id")
+    package = task.get("package")
+    function = task.get("function")
+    parameters = json.dumps(task["function_parameters"])
+    variables = task.get("variables")
+    run_kwargs = _get_run_kwargs(task)
+    parameters_file = None
+
+    if len(parameters) > config.PARAMETERS_FILE_THRESHOLD:
+        parameters_file = ParametersFile(
+            f"functionary-parameters-{task_id}.json", parameters.encode()
+        )
+        run_command = [
+            "--function",
+            function,
+            "--parameters-file",
+            parameters_file.path,
+        ]
+    else:
+        run_command = ["--function", function, "--parameters", parameters]
+
+    timings = TaskTimings()
+    usage = ResourceUsage()
+    observe_queued(task, timings)
+    logger.info(
+        "Task %s running (function: %s, package %s)", task_id, function, package
+    )
+    docker_client = get_docker_client()
+    start = perf_counter()
+
+    try:
+        get_image_cache().ensure(docker_client, package)
+    except DockerException as exc:
+        raise Exception(f"Unable to pull image {package}. Encountered error: {exc}")
+
+    # Pulls are observed in the metrics by the image cache, only the wait for one
+    # counts here
+    timings.add("pull", perf_counter() - start)
+
+    with (
+        busy_slot(),
+        get_control().track(task_id, get_timeout(task)) as running_task,
+        stream_output(task_id) as on_output,
+        OutputCapture(on_output=on_output) as capture,
+    ):
+        if running_task.reason is not None:
+            logger.info("Task %s canceled before it started", task_id)
+
+            return _create_result(
+                task, STOPPED_EXIT_STATUS, capture, running_task, timings, usage
+            )
+
+        exit_status = None
+
+        if is_local(package):
+            exit_status = _run_in_local_process(
+                docker_client,
+                package,
+                run_command,
+                variables,
+                capture,
+                running_task,
+                timings,
+                parameters_file,
+            )
+        elif (pool := get_pool()) is not None:
+            exit_status = _exec_in_warm_container(
+                pool,
+                docker_client,
+                package,
+                run_command,
+                variables,
+                run_kwargs,
+                capture,
+                running_task,
+                timings,
+                usage,
+                parameters_file,
+            )
+
+        if exit_status is None:
+            exit_status = _run_in_new_container(
+                docker_client,
+                package,
+                run_command,
+                variables,
+                run_kwargs,
+                capture,
+                running_task,
+                timings,
+                usage,
+                parameters_file,
+            )
+
+        if running_task.reason is not None:
+            logger.info("Task %s stopped: %s", task_id, running_task.reason)
+        else:
+            logger.info("Task %s succeeded", task_id)
+
+        return _create_result(task, exit_status, capture, running_task, timings, usage)
+
+
+def _create_result(
+    task: dict,
+    exit_status: int,
+    capture: OutputCapture,
+    running_task: RunningTask,
+    timings: TaskTimings,
+    usage: ResourceUsage,
+) -> dict:
+    """Creates the task result, uploading large output when the task allows it
+
+    Output that is uploaded is replaced in the result by a "<field>_ref" with the
+    storage key, size and checksum. If an upload fails, the output is sent in the
+    result as usual. A task that was stopped has its reason as the "termination".
+    The time spent in each phase is sent as the "timings", and the resources the
+    container used as the "usage" if it was sampled.
+    """
+    with timed("collect", timings):
+        output, result_data, references = _collect_output(task, capture)
+
+    result = create_result(task, exit_status, output, result_data, timings.as_dict())
+
+    for field, reference in references.items():
+        del result[field]
+        result[f"{field}_ref"] = reference
+
+    if running_task.reason is not None:
+        result["termination"] = running_task.reason
+
+    if usage.samples:
+        result["usage"] = usage.as_dict()
+
+    return result
 
-    return create_result(task, exit_status, output, result)
 
+def _collect_output(task: dict, capture: OutputCapture) -> tuple[bytes, bytes, dict]:
+    """Reads the output and result, uploading those large enough to storage
 
-@app.task(
-    default_retry_delay=30,
-    retry_kwargs={
-        "max_retries": 3,
-    },
-    autoretry_for=(Exception,),
-)
-def publish_result(result):
+    Returns:
+        The output and result, which are empty if uploaded, and the references to
+        those that were uploaded
+    """
+    upload_urls = task.get("upload_urls") or {}
+    outputs = {
+        "output": (capture.output_file, capture.output_size()),
+        "result": (capture.result_file, capture.result_size()),
+    }
+    references = {}
+
+    for field, (file, size) in outputs.items():
+        if (upload := upload_urls.get(field)) is None:
+            continue
+
+        if size <= config.RESULT_UPLOAD_THRESHOLD:
+            continue
+
+        try:
+            references[field] = {
+                "key": upload["key"],
+                **upload_output(upload["url"], file, size),
+            }
+        except Exception as exc:
+            logger.warning(
+                "Unable to upload %s for task %s, sending it in the result: %s",
+                field,
+                task["id"],
+                exc,
+            )
+
+    return (
+        b"" if "output" in references else capture.output(),
+        b"" if "result" in references else capture.result(),
+        references,
+    )
+
+
+@app.task(base=ResultPublishingTask)
+def run_task(*, task):
+    publish_result(execute_task(task))
+
+
+def send_result(result: dict) -> None:
+    """Send a task result to the control plane
+
+    Args:
+        result: The task result, see create_result
+
+    Raises:
+        pika.exceptions.UnroutableError: if unable to publish the message
+    """
     # TODO: The routing key should come from the configuration information received
     #       during runner registration.
-    send_message("tasking.results", "TASK_RESULT", result)
+    with timed("publish"):
+        send_message("tasking.results", "TASK_RESULT", result)
+
     logger.info("Task %s result published", result["task_id"])
+
+
+def send_results(results: list[dict]) -> None:
+    """Send task results to the control plane
+
+    A lone result is sent as a TASK_RESULT. Anything more is sent as TASK_RESULT_BATCH
+    messages of up to RESULT_BATCH_MAX_SIZE results each, which the broker confirms
+    together.
+
+    Args:
+        results: The task results, see create_result
+
+    Raises:
+        pika.exceptions.UnroutableError: if unable to publish the messages
+    """
+    if len(results) == 1:
+        send_result(results[0])
+        return
+
+    size = config.RESULT_BATCH_MAX_SIZE
+    batches = [
+        {"results": results[start:][:size]} for start in range(0, len(results), size)
+    ]
+
+    with timed("publish"):
+        send_messages("tasking.results", "TASK_RESULT_BATCH", batches)
+
+    logger.info(
+        "Results for %d tasks published in %d messages", len(results), len(batches)
+    )
+
+
+def publish_result(result: dict) -> None:
+    """Spool the result, then send it to the control plane
+
+    A result that can't be sent is left in the spool for the listener to send once
+    it can, see spool. If it can't be spooled either, it is lost.
+    """
+    spool = get_spool()
+
+    try:
+        result_id = spool.add(result)
+    except Exception as exc:
+        logger.error("Unable to spool result for task %s: %s", result["task_id"], exc)
+        result_id = None
+
+    try:
+        send_result(result)
+    except Exception as exc:
+        logger.warning(
+            "Unable to publish result for task %s, it will be retried: %s",
+            result["task_id"],
+            exc,
+        )
+        return
+
+    if result_id is not None:
+        spool.remove([result_id])
+
+
+def report_completions(completions: Queue) -> None:
+    """Report the id of every finished run_task to the given queue.
+
+    The consuming listener holds off on acking a TASK_PACKAGE message until the task
+    it describes has finished, and the listener remembers finished tasks for
+    deduplication whatever its mode. This must be called before the celery worker is
+    started so that the pool processes inherit the queue.
+
+    Args:
+        completions: Queue that finished task ids should be put on
+    """
+    global _completions
+    _completions = completions
+
+
+@task_postrun.connect
+def _report_completion(sender=None, **kwargs):
+    """Puts the id of a finished run_task on the completions queue, if configured"""
+    if _completions is None or sender.name != run_task.name:
+        return
+
+    if (task := kwargs["kwargs"].get("task")) is not None:
+        _completions.put(task["id"])
+
+
+@worker_process_shutdown.connect
+def _mark_metrics_dead(pid=None, **kwargs):
+    """Drops the live metrics of a celery pool process as it exits"""
+    mark_process_dead(pid)
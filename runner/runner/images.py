@@ -0,0 +1,312 @@
+"""Package image cache
+
+Image pulls run on their own bounded thread pool, so a burst of PULL_IMAGE messages
+can't occupy the slots that tasks run in, and concurrent requests for the same image
+share a single pull. Each of the runner's processes has its own cache, so a pull also
+holds a lock file in IMAGE_PULL_LOCK_DIR. A process that finds the image locked waits
+for the pull to finish rather than pulling it again.
+
+Every build of a package gets a new tag, so when IMAGE_CACHE_DISK_BUDGET is set the
+listener periodically removes the least recently used package images until the
+space used by images is back under the budget. The space used is checked, and
+reported in the metrics, even without a budget. Images used by a container, or
+used by a task within the last IMAGE_CACHE_PROTECT_SECONDS, are never removed.
+Only images from the package registry are considered.
+
+Hits, misses and evictions are counted in the metrics, which combine the counts of
+every process.
+"""
+import fcntl
+import hashlib
+import logging
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+from time import perf_counter, time
+from typing import Iterator
+
+import docker
+from docker.errors import DockerException, ImageNotFound
+
+from . import config
+from .client import get_docker_client, pull
+from .metrics import (
+    IMAGE_CACHE_BYTES,
+    IMAGE_CACHE_EVICTED_BYTES,
+    IMAGE_CACHE_EVICTIONS,
+    IMAGE_CACHE_HITS,
+    IMAGE_CACHE_MISSES,
+    timed,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ImageCache:
+    """Pulls package images and evicts them when over the disk budget
+
+    Attributes:
+        pull_pool: The thread pool that pulls run on
+        disk_budget: Bytes that images may use before eviction starts, 0 for no limit
+        protect_seconds: Seconds after an image is used during which it won't be
+            evicted
+        lock_dir: Directory of the locks shared with other processes while pulling,
+            None to only share pulls within this process
+    """
+
+    def __init__(
+        self,
+        pull_concurrency: int,
+        disk_budget: int,
+        protect_seconds: float,
+        lock_dir: str | None = None,
+    ):
+        self.pull_pool = ThreadPoolExecutor(
+            max_workers=pull_concurrency, thread_name_prefix="image-pull"
+        )
+        self.disk_budget = disk_budget
+        self.protect_seconds = protect_seconds
+        self.lock_dir = lock_dir
+
+        self._lock = Lock()
+        self._pulls: dict[str, Future] = {}
+        self._last_used: dict[str, float] = {}
+        self._stopped = Event()
+        self._evictor: Thread | None = None
+
+    def pull(self, image: str) -> Future:
+        """Pull the image on the pull pool
+
+        Returns:
+            A Future for the pull, shared with any other caller pulling the same
+            image at the same time.
+        """
+        with self._lock:
+            if (future := self._pulls.get(image)) is not None:
+                return future
+
+            future = self.pull_pool.submit(self._pull, image)
+            self._pulls[image] = future
+
+        future.add_done_callback(lambda _: self._pull_done(image))
+
+        return future
+
+    def prefetch(self, image: str) -> None:
+        """Pull the image in the background, as requested by a PULL_IMAGE message"""
+        self.pull(image).add_done_callback(
+            lambda future: _log_pull_failure(image, future)
+        )
+
+    def ensure(self, client: docker.DockerClient, image: str) -> None:
+        """Make sure the image is present before a task uses it, pulling if needed
+
+        Raises:
+            DockerException: The image could not be pulled
+        """
+        self.touch(image)
+
+        if _is_present(client, image):
+            IMAGE_CACHE_HITS.inc()
+        else:
+            IMAGE_CACHE_MISSES.inc()
+            self.pull(image).result()
+
+    def touch(self, image: str) -> None:
+        """Record that a task is about to use the image"""
+        with self._lock:
+            self._last_used[image] = time()
+
+    def start_evicting(self, interval: float) -> None:
+        """Check the disk budget every interval seconds in a background thread"""
+        if self._evictor is not None:
+            return
+
+        self._evictor = Thread(
+            target=self._evict_periodically,
+            args=(interval,),
+            name="image-evictor",
+            daemon=True,
+        )
+        self._evictor.start()
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        self.pull_pool.shutdown(wait=False)
+
+    def evict(self, client: docker.DockerClient) -> None:
+        """Remove least recently used package images until under the disk budget"""
+        usage = client.df()
+        used = usage.get("LayersSize") or 0
+        IMAGE_CACHE_BYTES.set(used)
+
+        if self.disk_budget <= 0 or used <= self.disk_budget:
+            return
+
+        in_use = {container["ImageID"] for container in client.api.containers(all=True)}
+        protected_since = time() - self.protect_seconds
+        evictions = 0
+
+        for image, last_used in self._candidates(usage["Images"]):
+            if used <= self.disk_budget:
+                break
+
+            if image["Id"] in in_use or last_used >= protected_since:
+                continue
+
+            if not self._remove(client, image):
+                continue
+
+            freed = image["Size"] - max(image.get("SharedSize", 0), 0)
+            used -= freed
+            evictions += 1
+            IMAGE_CACHE_EVICTIONS.inc()
+            IMAGE_CACHE_EVICTED_BYTES.inc(freed)
+
+        IMAGE_CACHE_BYTES.set(used)
+
+        logger.info(
+            "Image cache at %d bytes of %d (%d evicted)",
+            used,
+            self.disk_budget,
+            evictions,
+        )
+
+    def _pull(self, image: str) -> None:
+        start = perf_counter()
+        client = get_docker_client()
+
+        with timed("pull"), self._pull_lock(image) as waited:
+            # Another process pulled the image while this one waited for it
+            if waited and _is_present(client, image):
+                logger.debug("Image %s was pulled by another process", image)
+                return
+
+            pull(client, image)
+
+        logger.debug("Pulled %s in %.1fs", image, perf_counter() - start)
+
+    @contextmanager
+    def _pull_lock(self, image: str) -> Iterator[bool]:
+        """Hold the lock on pulling the image shared with the runner's other processes
+
+        Yields:
+            Whether another process held the lock, so that this one had to wait
+        """
+        if self.lock_dir is None:
+            yield False
+            return
+
+        os.makedirs(self.lock_dir, exist_ok=True)
+        name = hashlib.sha256(image.encode()).hexdigest()
+
+        with open(os.path.join(self.lock_dir, f"{name}.lock"), "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                waited = False
+            except BlockingIOError:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                waited = True
+
+            try:
+                yield waited
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _pull_done(self, image: str) -> None:
+        with self._lock:
+            self._pulls.pop(image, None)
+
+    def _candidates(self, images: list[dict]) -> list[tuple[dict, float]]:
+        """Package images with when they were last used, least recent first"""
+        prefix = _registry_prefix()
+        candidates = []
+
+        with self._lock:
+            for image in images:
+                tags = [
+                    tag for tag in image.get("RepoTags") or [] if tag.startswith(prefix)
+                ]
+
+                if not tags:
+                    continue
+
+                # Images not used since the runner started fall back to when they
+                # were created
+                last_used = max(
+                    (self._last_used.get(tag, 0) for tag in tags),
+                    default=0,
+                ) or image.get("Created", 0)
+                candidates.append((image, last_used))
+
+        return sorted(candidates, key=lambda candidate: candidate[1])
+
+    def _remove(self, client: docker.DockerClient, image: dict) -> bool:
+        try:
+            for tag in image["RepoTags"]:
+                client.images.remove(tag)
+        except DockerException as exc:
+            logger.info("Unable to evict image %s: %s", image["Id"], exc)
+            return False
+
+        with self._lock:
+            for tag in image["RepoTags"]:
+                self._last_used.pop(tag, None)
+
+        logger.debug("Evicted image %s", ", ".join(image["RepoTags"]))
+
+        return True
+
+    def _evict_periodically(self, interval: float) -> None:
+        while not self._stopped.wait(interval):
+            try:
+                self.evict(get_docker_client())
+            except Exception as exc:
+                logger.warning("Image cache eviction failed: %s", exc)
+
+
+def _is_present(client: docker.DockerClient, image: str) -> bool:
+    try:
+        client.images.get(image)
+    except ImageNotFound:
+        return False
+
+    return True
+
+
+def _log_pull_failure(image: str, future: Future) -> None:
+    if (exc := future.exception()) is not None:
+        logger.warning("Unable to pull docker image for %s: %s", image, exc)
+
+
+def _registry_prefix() -> str:
+    """Returns the prefix of the package image names"""
+    registry = os.getenv("REGISTRY_HOST", "")
+
+    if port := os.getenv("REGISTRY_PORT"):
+        registry += f":{port}"
+
+    return f"{registry}/"
+
+
+# Cache for this process along with the pid it was created in, see get_image_cache
+_cache: tuple[int, ImageCache] | None = None
+
+
+def get_image_cache() -> ImageCache:
+    """Returns the ImageCache for the current process"""
+    global _cache
+
+    if _cache is None or _cache[0] != os.getpid():
+        _cache = (
+            os.getpid(),
+            ImageCache(
+                config.IMAGE_PULL_CONCURRENCY,
+                config.IMAGE_CACHE_DISK_BUDGET,
+                config.IMAGE_CACHE_PROTECT_SECONDS,
+                config.IMAGE_PULL_LOCK_DIR,
+            ),
+        )
+
+    return _cache[1]
@@ -1,41 +1,269 @@
 from json import loads
 from logging import getLogger
 from logging.config import dictConfig
+from multiprocessing.queues import Queue
+from queue import Empty
 from time import sleep
+from typing import Callable
 
-from celery import chain
 from celery.app.control import Inspect
+from pika.adapters.blocking_connection import BlockingConnection
 from pika.channel import Channel
+from pika.exchange_type import ExchangeType
 from pika.spec import Basic, BasicProperties
 
+from . import config
 from .celery import WORKER_CONCURRENCY, WORKER_NAME, app
-from .handlers import publish_result, pull_image, run_task
+from .control import get_control
+from .dedup import get_history
+from .executor import NativeExecutor
+from .handlers import run_task, send_results
+from .images import get_image_cache
 from .logging_configs import LISTENER_LOGGING
 from .messaging import build_connection
+from .spool import ResultDrainer, get_spool
 
 logger = getLogger(__name__)
 dictConfig(LISTENER_LOGGING)
 
+TASK_QUEUE = "public"
+# Fanout exchange for messages every runner should receive, such as CANCEL_TASK
+BROADCAST_EXCHANGE = "runners.broadcast"
 WAIT_FOR_AVAILABLE_WORKER_DELAY = 2
+WAIT_FOR_COMPLETION_DELAY = 0.05
 WAIT_FOR_MESSAGE_DELAY = 0.5
 
 
-def start_listening():
-    logger.info("Starting listener")
+def start_listening(completions: Queue | None = None):
+    """Start receiving messages from the task queue
+
+    Args:
+        completions: Queue the celery worker reports finished task ids on. Required
+            when running in "consume" mode with the celery executor. In "poll" mode
+            it lets finished tasks be remembered for deduplication, see dedup.
+    """
+    logger.info(
+        "Starting listener (mode: %s, executor: %s)",
+        config.LISTENER_MODE,
+        config.EXECUTOR,
+    )
     connection = build_connection()
     channel = connection.channel()
+    broadcast_queue = _declare_broadcast_queue(channel)
+    get_image_cache().start_evicting(config.IMAGE_CACHE_EVICT_INTERVAL)
+    ResultDrainer(
+        get_spool(),
+        send_results,
+        config.RESULT_SPOOL_DRAIN_INTERVAL,
+        config.RESULT_SPOOL_DRAIN_SIZE,
+    ).start()
+
+    if config.EXECUTOR == "native":
+        executor = NativeExecutor(config.SCHEDULER_MAX_TASKS)
+        _consume(
+            connection,
+            channel,
+            broadcast_queue,
+            executor.completions,
+            executor.dispatch,
+            config.SCHEDULER_MAX_TASKS,
+        )
+    elif config.LISTENER_MODE == "consume":
+        _consume(connection, channel, broadcast_queue, completions)
+    else:
+        _poll(connection, channel, broadcast_queue, _get_inspect(), completions)
 
-    inspect = _get_inspect()
+
+def _declare_broadcast_queue(channel: Channel) -> str:
+    """Declare a queue for this runner that receives the broadcast messages
+
+    Returns:
+        The name of the queue, which is deleted when the listener disconnects
+    """
+    channel.exchange_declare(
+        BROADCAST_EXCHANGE,
+        exchange_type=ExchangeType.fanout,
+        durable=True,
+        auto_delete=False,
+    )
+    queue = channel.queue_declare("", exclusive=True).method.queue
+    channel.queue_bind(queue, BROADCAST_EXCHANGE)
+
+    return queue
+
+
+def _poll(
+    connection: BlockingConnection,
+    channel: Channel,
+    broadcast_queue: str,
+    inspect: Inspect,
+    completions: Queue | None = None,
+):
+    """Fetch messages one at a time, waiting for an available worker between each
+
+    Broadcast messages are pushed, and handled while waiting. The messages are acked
+    as they are dispatched, but the tasks the worker reports on completions are still
+    recorded as finished, so that they are remembered for a window after finishing.
+    """
+    channel.basic_consume(broadcast_queue, _handle_delivery)
 
     while True:
-        method, properties, body = channel.basic_get("public")
+        _complete_tasks(completions)
+        method, properties, body = channel.basic_get(TASK_QUEUE)
 
         if method is None:
-            sleep(WAIT_FOR_MESSAGE_DELAY)
+            connection.process_data_events(time_limit=WAIT_FOR_MESSAGE_DELAY)
             continue
 
         _handle_delivery(channel, method, properties, body)
-        _wait_for_available_worker(inspect)
+        _wait_for_available_worker(connection, inspect)
+
+
+def _consume(
+    connection: BlockingConnection,
+    channel: Channel,
+    broadcast_queue: str,
+    completions: Queue,
+    dispatch: Callable[[str, dict], None] | None = None,
+    prefetch_count: int | None = None,
+):
+    """Consume messages, letting the channel prefetch limit the tasks in flight
+
+    The prefetch defaults to the celery worker concurrency. The native executor holds
+    tasks that are waiting for resources, so it is given room for more.
+    """
+    channel.basic_qos(prefetch_count=prefetch_count or _get_worker_concurrency())
+
+    consumer = TaskConsumer(channel, completions, dispatch)
+    channel.basic_consume(TASK_QUEUE, consumer.on_message)
+    channel.basic_consume(broadcast_queue, consumer.on_message)
+
+    while True:
+        connection.process_data_events(time_limit=WAIT_FOR_COMPLETION_DELAY)
+        consumer.ack_completed()
+
+
+class TaskConsumer:
+    """Pushed message handler that acks TASK_PACKAGE messages on task completion
+
+    Rather than asking the celery workers whether they have capacity before fetching
+    each message, the channel prefetch is limited to the worker concurrency and a
+    TASK_PACKAGE message stays unacked until the executor reports that its task has
+    finished. That way the broker stops delivering once every worker is busy.
+
+    Attributes:
+        channel: The channel messages are being consumed on
+        completions: Queue of task ids that the executor has finished
+        dispatch: Callable that hands the work off to the executor. Defaults to
+            dispatching to the celery workers.
+        in_flight: Mapping of task id to the delivery tags awaiting completion
+    """
+
+    def __init__(
+        self,
+        channel: Channel,
+        completions: Queue,
+        dispatch: Callable[[str, dict], None] | None = None,
+    ):
+        self.channel = channel
+        self.completions = completions
+        self.dispatch = dispatch or _dispatch
+        self.in_flight: dict[str, list[int]] = {}
+
+    def on_message(
+        self,
+        channel: Channel,
+        method: Basic.Deliver,
+        properties: BasicProperties,
+        body: bytes,
+    ):
+        """Called when RabbitMQ delivers a message"""
+        try:
+            msg_type, msg_body = _parse_message(properties, body)
+
+            if _is_canceled(msg_type, msg_body) or _is_duplicate(msg_type, msg_body):
+                channel.basic_ack(method.delivery_tag)
+                return
+
+            self.dispatch(msg_type, msg_body)
+        except Exception as exc:
+            # An unacked message would hold a prefetch slot forever, so drop it
+            logger.error("Error handling received message: %s", exc)
+            channel.basic_nack(method.delivery_tag, requeue=False)
+            return
+
+        if msg_type == "TASK_PACKAGE":
+            self.in_flight.setdefault(msg_body["id"], []).append(method.delivery_tag)
+        else:
+            channel.basic_ack(method.delivery_tag)
+
+    def ack_completed(self):
+        """Ack the messages of every task the executor has reported as finished"""
+        while True:
+            try:
+                task_id = self.completions.get_nowait()
+            except Empty:
+                return
+
+            get_history().complete(task_id)
+
+            if not (delivery_tags := self.in_flight.get(task_id)):
+                logger.debug("Completed task %s was not in flight", task_id)
+                continue
+
+            self.channel.basic_ack(delivery_tags.pop(0))
+
+            if not delivery_tags:
+                del self.in_flight[task_id]
+
+
+def _complete_tasks(completions: Queue | None) -> None:
+    """Record every task the executor has reported as finished in the history"""
+    if completions is None:
+        return
+
+    while True:
+        try:
+            get_history().complete(completions.get_nowait())
+        except Empty:
+            return
+
+
+def _parse_message(properties: BasicProperties, body: bytes) -> tuple[str, dict]:
+    """Returns the message type and decoded body of a received message"""
+    msg_type = properties.headers.get("x-msg-type", "__NONE__")
+    msg_body = loads(body.decode())
+
+    return msg_type, msg_body
+
+
+def _is_canceled(msg_type: str, msg_body: dict) -> bool:
+    """Whether the message is a TASK_PACKAGE for a task canceled before it arrived"""
+    if msg_type != "TASK_PACKAGE" or not get_control().is_canceled(msg_body["id"]):
+        return False
+
+    logger.info("Task %s was canceled, it will not be run", msg_body["id"])
+
+    return True
+
+
+def _is_duplicate(msg_type: str, msg_body: dict) -> bool:
+    """Whether the message is a TASK_PACKAGE for a task that was already received"""
+    return msg_type == "TASK_PACKAGE" and not get_history().receive(msg_body["id"])
+
+
+def _dispatch(msg_type: str, msg_body: dict):
+    """Hand the work described by a message off to the celery workers"""
+    match msg_type:
+        case "PULL_IMAGE":
+            get_image_cache().prefetch(msg_body["image_name"])
+        case "CANCEL_TASK":
+            get_control().cancel(msg_body["task_id"])
+        case "TASK_PACKAGE":
+            get_image_cache().touch(msg_body["package"])
+            run_task.delay(task=msg_body)
+        case _:
+            logger.error("Unrecognized message type: %s", msg_type)
 
 
 def _handle_delivery(
@@ -45,19 +273,10 @@ def _handle_delivery(
 
     # TODO: Implement handling of specific exceptions
     try:
-        msg_type = properties.headers.get("x-msg-type", "__NONE__")
-        msg_body = loads(body.decode())
-
-        match msg_type:
-            case "PULL_IMAGE":
-                pull_image.delay(package=msg_body)
-            case "TASK_PACKAGE":
-                run_task_s = run_task.s(task=msg_body)
-                publish_result_s = publish_result.s()
+        msg_type, msg_body = _parse_message(properties, body)
 
-                chain(run_task_s, publish_result_s).delay()
-            case _:
-                logger.error("Unrecognized message type: %s", msg_type)
+        if not (_is_canceled(msg_type, msg_body) or _is_duplicate(msg_type, msg_body)):
+            _dispatch(msg_type, msg_body)
 
         channel.basic_ack(method.delivery_tag)
     except Exception as exc:
@@ -100,11 +319,13 @@ def _has_available_worker(inspect: Inspect) -> bool:
     return True if len(worker_tasks) < worker_concurrency else False
 
 
-def _wait_for_available_worker(inspect: Inspect) -> None:
+def _wait_for_available_worker(
+    connection: BlockingConnection, inspect: Inspect
+) -> None:
     """Wait for an available worker process before consuming another message"""
     while not _has_available_worker(inspect):
         logger.info(
             "No available worker processes. "
             f"Checking again in {WAIT_FOR_AVAILABLE_WORKER_DELAY} seconds."
         )
-        sleep(WAIT_FOR_AVAILABLE_WORKER_DELAY)
+        connection.process_data_events(time_limit=WAIT_FOR_AVAILABLE_WORKER_DELAY)
@@ -0,0 +1,264 @@
+"""Local processes for trusted packages
+
+Creating, starting and removing a container costs far more than a short function.
+The packages matching LOCAL_PACKAGES are trusted to run without docker's isolation,
+with their harness run as a subprocess of the runner. The parameters, output
+separator and result are the same as in a container.
+
+Each package image is prepared once, into a directory under LOCAL_PACKAGE_DIR named
+for the image id, so a new push of the package is prepared again. The image's
+working directory, which holds the harness and the package's functions, is copied
+out of the image. A python package gets a virtualenv with its requirements.txt
+installed, and a javascript package has npm install run unless node_modules came
+with it. The harness is run by the runner's own python or node, not the image's.
+
+Local processes aren't limited in CPU or memory and their usage isn't sampled.
+Timeouts and cancellation apply as usual.
+"""
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import venv
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from threading import Lock
+
+import docker
+from docker.models.images import Image
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# Interpreters the harness may be run with, by the entrypoint of the package image
+PYTHON_ENTRYPOINTS = ("python", "python3")
+NODE_ENTRYPOINTS = ("node",)
+
+# Variables of the runner's environment that local processes inherit. Anything else,
+# such as the runner's credentials, is withheld from the function.
+INHERITED_VARIABLES = (
+    "HOME",
+    "LANG",
+    "LC_ALL",
+    "NODE_EXTRA_CA_CERTS",
+    "PATH",
+    "REQUESTS_CA_BUNDLE",
+    "SSL_CERT_DIR",
+    "SSL_CERT_FILE",
+    "TMPDIR",
+    "TZ",
+)
+
+
+@dataclass
+class LocalPackage:
+    """A package prepared to run in a local process
+
+    Attributes:
+        path: The directory holding the harness, which it is run from
+        command: Runs the harness, the function arguments follow it
+        environment: Variables the harness runs with, before those of the task
+    """
+
+    path: str
+    command: list[str]
+    environment: dict[str, str]
+
+
+def is_local(package: str) -> bool:
+    """Whether the package should be run in a local process"""
+    return any(fnmatchcase(package, pattern) for pattern in config.LOCAL_PACKAGES)
+
+
+class LocalPackages:
+    """The packages prepared to run in local processes
+
+    Attributes:
+        root: The directory packages are prepared in
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+        self._lock = Lock()
+        self._image_locks: dict[str, Lock] = {}
+
+        os.makedirs(root, exist_ok=True)
+
+    def get(self, client: docker.DockerClient, package: str) -> LocalPackage:
+        """Returns the package, preparing it first if this image hasn't been
+
+        Raises:
+            DockerException: The package could not be read from its image
+            OSError: The package could not be prepared
+            subprocess.CalledProcessError: Installing the package's dependencies
+                failed
+            ValueError: The image's entrypoint isn't a supported harness
+        """
+        image = client.images.get(package)
+        entrypoint = image.attrs["Config"].get("Entrypoint") or []
+        interpreter = _interpreter(entrypoint)
+        path = os.path.join(self.root, image.id.split(":")[-1])
+
+        with self._lock:
+            image_lock = self._image_locks.setdefault(image.id, Lock())
+
+        with image_lock:
+            if not os.path.isdir(path):
+                self._prepare(client, image, interpreter, path)
+
+        app = os.path.join(path, "app")
+        environment = _inherited_environment()
+
+        if interpreter in PYTHON_ENTRYPOINTS:
+            bin_dir = os.path.join(path, "venv", "bin")
+            environment["PATH"] = os.pathsep.join(
+                filter(None, [bin_dir, environment.get("PATH")])
+            )
+            environment["PYTHONUNBUFFERED"] = "1"
+            command = [os.path.join(bin_dir, "python")]
+        else:
+            command = [shutil.which("node") or "node"]
+
+        return LocalPackage(app, command + entrypoint[1:], environment)
+
+    def _prepare(
+        self, client: docker.DockerClient, image: Image, interpreter: str, path: str
+    ) -> None:
+        """Prepare the package in a staging directory, then move it into place
+
+        Other runner processes share the directory, so whichever finishes preparing
+        the package first wins.
+        """
+        logger.info("Preparing %s to run in local processes", image.tags or image.id)
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=self.root)
+
+        try:
+            app = os.path.join(staging, "app")
+            _copy_working_dir(client, image, app)
+
+            if interpreter in PYTHON_ENTRYPOINTS:
+                _create_virtualenv(os.path.join(staging, "venv"), app)
+            else:
+                _install_node_modules(app)
+
+            try:
+                os.rename(staging, path)
+            except OSError:
+                if not os.path.isdir(path):
+                    raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+
+def _interpreter(entrypoint: list[str]) -> str:
+    """Returns the interpreter that runs the harness of the entrypoint"""
+    interpreter = os.path.basename(entrypoint[0]) if entrypoint else ""
+
+    if len(entrypoint) < 2 or not (
+        interpreter in PYTHON_ENTRYPOINTS or interpreter in NODE_ENTRYPOINTS
+    ):
+        raise ValueError(f"Unsupported entrypoint for a local package: {entrypoint}")
+
+    return interpreter
+
+
+def _copy_working_dir(client: docker.DockerClient, image: Image, dest: str) -> None:
+    """Copy the working directory of the image to dest"""
+    working_dir = image.attrs["Config"].get("WorkingDir") or "/"
+    container = client.containers.create(image.id)
+
+    extract_dir = tempfile.mkdtemp(dir=os.path.dirname(dest))
+
+    with tempfile.TemporaryFile() as archive:
+        try:
+            stream, _ = container.get_archive(working_dir)
+
+            for chunk in stream:
+                archive.write(chunk)
+        finally:
+            container.remove(force=True)
+
+        archive.seek(0)
+
+        with tarfile.open(fileobj=archive) as tar:
+            tar.extractall(extract_dir, filter="data")
+
+    # The archive holds the directory itself, named for its last component
+    (name,) = os.listdir(extract_dir)
+    os.rename(os.path.join(extract_dir, name), dest)
+    os.rmdir(extract_dir)
+
+
+def _create_virtualenv(path: str, app: str) -> None:
+    """Create a virtualenv with the package's requirements installed"""
+    requirements = os.path.join(app, "requirements.txt")
+    has_requirements = False
+
+    if os.path.isfile(requirements):
+        with open(requirements) as file:
+            has_requirements = any(re.match(r"\s*[^#\s]", line) for line in file)
+
+    # Creating the virtualenv is much quicker without pip, when it isn't needed
+    venv.create(path, symlinks=True, with_pip=has_requirements)
+
+    if has_requirements:
+        _run(
+            [
+                os.path.join(path, "bin", "python"),
+                "-m",
+                "pip",
+                "install",
+                "--no-cache-dir",
+                "-r",
+                requirements,
+            ],
+            app,
+        )
+
+
+def _install_node_modules(app: str) -> None:
+    """Install the package's dependencies, unless the image came with them"""
+    if os.path.isdir(os.path.join(app, "node_modules")):
+        return
+
+    if os.path.isfile(os.path.join(app, "package.json")):
+        _run(["npm", "install", "--omit=dev"], app)
+
+
+def _run(command: list[str], cwd: str) -> None:
+    try:
+        subprocess.run(
+            command, cwd=cwd, check=True, stdin=subprocess.DEVNULL, capture_output=True
+        )
+    except subprocess.CalledProcessError as exc:
+        logger.error("%s failed: %s", command[0], exc.stderr.decode(errors="replace"))
+        raise
+
+
+def _inherited_environment() -> dict[str, str]:
+    environment = {
+        name: os.environ[name] for name in INHERITED_VARIABLES if name in os.environ
+    }
+    environment.setdefault("PATH", os.defpath)
+
+    return environment
+
+
+# Packages for this process along with the pid it was created in, see
+# get_local_packages
+_local_packages: tuple[int, LocalPackages] | None = None
+
+
+def get_local_packages() -> LocalPackages:
+    """Returns the LocalPackages for the current process"""
+    global _local_packages
+
+    if _local_packages is None or _local_packages[0] != os.getpid():
+        _local_packages = (os.getpid(), LocalPackages(config.LOCAL_PACKAGE_DIR))
+
+    return _local_packages[1]
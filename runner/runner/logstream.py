@@ -0,0 +1,171 @@
+"""Live streaming of task log output
+
+While a task runs, the log output it has produced since the last send is published
+as a TASK_LOG_CHUNK message so it can be followed before the TASK_RESULT arrives.
+A single thread per process sends the chunks for every running task once each
+LOG_STREAM_INTERVAL, so the message rate is bounded at one per task per interval no
+matter how much output there is. At most LOG_STREAM_MAX_BYTES are held for each
+task between sends, older output is dropped and counted as skipped once that is
+exceeded. The TASK_RESULT always carries the complete log.
+"""
+import codecs
+import logging
+import os
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+from typing import Callable, Iterator
+
+from . import config
+from .messaging import send_message
+
+logger = logging.getLogger(__name__)
+
+
+class LogStream:
+    """The log output of a single task that has not been sent yet
+
+    Attributes:
+        task_id: The id of the task the output belongs to
+        max_bytes: The most output held between sends
+    """
+
+    def __init__(self, task_id: str, max_bytes: int):
+        self.task_id = task_id
+        self.max_bytes = max_bytes
+
+        self._lock = Lock()
+        self._pending = bytearray()
+        self._skipped = 0
+        self._sequence = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def write(self, data: bytes) -> None:
+        """Add output to be sent with the next chunk"""
+        with self._lock:
+            self._pending += data
+
+            if (excess := len(self._pending) - self.max_bytes) > 0:
+                del self._pending[:excess]
+                self._skipped += excess
+
+    def take(self) -> dict | None:
+        """Returns the TASK_LOG_CHUNK message body for the pending output, if any.
+        The chunks are numbered in order by their "sequence", since they can be
+        recorded out of order."""
+        with self._lock:
+            if not self._pending:
+                return None
+
+            output = self._decoder.decode(bytes(self._pending))
+            skipped = self._skipped
+            self._pending.clear()
+            self._skipped = 0
+
+            if not output and not skipped:
+                # Only part of a multibyte character has arrived so far
+                return None
+
+            sequence = self._sequence
+            self._sequence += 1
+
+        return {
+            "task_id": self.task_id,
+            "sequence": sequence,
+            "output": output,
+            "skipped": skipped,
+        }
+
+
+class LogStreamer:
+    """Periodically publishes the pending output of every registered LogStream
+
+    Attributes:
+        interval: Seconds between chunks for a task
+        max_bytes: The most output held for each task between chunks
+    """
+
+    def __init__(self, interval: float, max_bytes: int):
+        self.interval = interval
+        self.max_bytes = max_bytes
+
+        self._lock = Lock()
+        self._streams: dict[str, LogStream] = {}
+        self._stopped = Event()
+        self._sender = Thread(target=self._run, name="log-streamer", daemon=True)
+        self._sender.start()
+
+    @contextmanager
+    def stream(self, task_id: str) -> Iterator[Callable[[bytes], None]]:
+        """Stream a task's output for the duration of the context
+
+        Yields:
+            A callable that the task's log output should be passed to as it arrives
+        """
+        log_stream = LogStream(task_id, self.max_bytes)
+
+        with self._lock:
+            self._streams[task_id] = log_stream
+
+        try:
+            yield log_stream.write
+        finally:
+            with self._lock:
+                self._streams.pop(task_id, None)
+
+    def flush(self) -> None:
+        """Send a chunk for each task that has produced output since the last one"""
+        with self._lock:
+            streams = list(self._streams.values())
+
+        for log_stream in streams:
+            if (chunk := log_stream.take()) is None:
+                continue
+
+            try:
+                send_message("tasking.results", "TASK_LOG_CHUNK", chunk)
+            except Exception as exc:
+                logger.warning(
+                    "Unable to send log chunk for task %s: %s", log_stream.task_id, exc
+                )
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.flush()
+
+
+# Streamer for this process along with the pid it was created in, see get_streamer
+_streamer: tuple[int, LogStreamer] | None = None
+
+
+def get_streamer() -> LogStreamer | None:
+    """Returns the LogStreamer for the current process, or None if it is disabled"""
+    global _streamer
+
+    if config.LOG_STREAM_INTERVAL <= 0:
+        return None
+
+    if _streamer is None or _streamer[0] != os.getpid():
+        _streamer = (
+            os.getpid(),
+            LogStreamer(config.LOG_STREAM_INTERVAL, config.LOG_STREAM_MAX_BYTES),
+        )
+
+    return _streamer[1]
+
+
+@contextmanager
+def stream_output(task_id: str) -> Iterator[Callable[[bytes], None] | None]:
+    """Stream a task's log output if streaming is enabled
+
+    Yields:
+        The callable to pass log output to, or None if streaming is disabled
+    """
+    if (streamer := get_streamer()) is None:
+        yield None
+        return
+
+    with streamer.stream(task_id) as on_output:
+        yield on_output
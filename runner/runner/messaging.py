@@ -1,10 +1,18 @@
 import json
 import logging
+import os
 import ssl
+from threading import Lock
 from time import sleep
 
 import pika
-from pika.exceptions import AMQPConnectionError, UnroutableError
+from pika.adapters.blocking_connection import ReturnedMessage
+from pika.exceptions import (
+    AMQPConnectionError,
+    ChannelClosed,
+    ChannelWrongStateError,
+    UnroutableError,
+)
 
 from . import config
 
@@ -70,11 +78,193 @@ def build_connection(
         return pika.BlockingConnection(parameters)
 
 
+class Publisher:
+    """Publishes JSON messages over a long lived connection
+
+    The connection and its confirm mode channel are opened on first use and reused
+    for every message after that. If the connection or channel turn out to have been
+    closed, for example by a broker restart or missed heartbeats, they are reopened
+    and the publish is attempted once more.
+
+    Batches of messages are published on a second, transactional, channel so that
+    the broker confirms the whole batch at once rather than one message at a time.
+
+    A Publisher may be shared between threads, publishing is serialized with a lock.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._connection: pika.BlockingConnection | None = None
+        self._channel = None
+        self._batch_channel = None
+        self._returned: list[ReturnedMessage] = []
+
+    def _get_connection(self) -> pika.BlockingConnection:
+        """Returns the open connection, opening it if necessary"""
+        if self._connection is None or not self._connection.is_open:
+            self._connection = build_connection()
+
+        return self._connection
+
+    def _get_channel(self):
+        """Returns the open publishing channel, opening it if necessary"""
+        if self._channel is None or not self._channel.is_open:
+            self._channel = self._get_connection().channel()
+            self._channel.confirm_delivery()
+
+        return self._channel
+
+    def _get_batch_channel(self):
+        """Returns the open transactional channel, opening it if necessary"""
+        if self._batch_channel is None or not self._batch_channel.is_open:
+            self._batch_channel = self._get_connection().channel()
+            self._batch_channel.tx_select()
+            self._batch_channel.add_on_return_callback(self._on_return)
+
+        return self._batch_channel
+
+    def _on_return(self, channel, method, properties, body) -> None:
+        """Collects the messages returned as unroutable on the batch channel"""
+        self._returned.append(ReturnedMessage(method, properties, body))
+
+    def _reset(self):
+        """Discard the current connection so that the next publish reconnects"""
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except Exception as exc:
+            logger.debug("Error closing publisher connection: %s", exc)
+
+        self._connection = None
+        self._channel = None
+        self._batch_channel = None
+        self._returned = []
+
+    @staticmethod
+    def _properties(msg_type: str | None) -> pika.BasicProperties:
+        headers = {"x-msg-type": msg_type} if msg_type else {}
+
+        return pika.BasicProperties(
+            content_type="application/json",
+            content_encoding="utf-8",
+            headers=headers,
+            delivery_mode=1,
+        )
+
+    def publish(self, routing_key: str, msg_type: str | None, message) -> None:
+        """Publish a message to the default exchange with the given routing key
+
+        The message is confirmed by the broker before this returns.
+
+        Args:
+            routing_key: The routing key (queue name) to publish to
+            msg_type: The value of x-msg-type to set in the header, or None
+            message: The message to send, must be JSON serializable.
+
+        Raises:
+            pika.exceptions.UnroutableError: if unable to publish the message
+            pika.exceptions.AMQPConnectionError: if unable to reconnect
+        """
+        publish_props = self._properties(msg_type)
+        body = json.dumps(message)
+
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    self._get_channel().basic_publish(
+                        exchange="",
+                        routing_key=routing_key,
+                        body=body,
+                        properties=publish_props,
+                        mandatory=True,
+                    )
+                    return
+                except UnroutableError as ue:
+                    # TODO revisit this and handle exceptions better. Currently used
+                    #      for retry logic
+                    logger.error("Failed to send message")
+                    raise ue
+                except (AMQPConnectionError, ChannelClosed, ChannelWrongStateError):
+                    self._reset()
+
+                    if attempt:
+                        raise
+
+                    logger.info("Publisher connection lost, reconnecting")
+
+    def publish_batch(self, routing_key: str, msg_type: str | None, messages) -> None:
+        """Publish messages to the default exchange with the given routing key
+
+        The messages are published in a single transaction, so the broker confirms
+        them all with one round trip. If the transaction is not committed none of the
+        messages are delivered, but an unroutable message doesn't stop the others.
+
+        Args:
+            routing_key: The routing key (queue name) to publish to
+            msg_type: The value of x-msg-type to set in the header, or None
+            messages: The messages to send, each must be JSON serializable.
+
+        Raises:
+            pika.exceptions.UnroutableError: if unable to publish any of the messages
+            pika.exceptions.AMQPConnectionError: if unable to reconnect
+        """
+        publish_props = self._properties(msg_type)
+        bodies = [json.dumps(message) for message in messages]
+
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    channel = self._get_batch_channel()
+
+                    for body in bodies:
+                        channel.basic_publish(
+                            exchange="",
+                            routing_key=routing_key,
+                            body=body,
+                            properties=publish_props,
+                            mandatory=True,
+                        )
+
+                    channel.tx_commit()
+                    # Returns arrive ahead of the commit, dispatch them to _on_return
+                    self._connection.process_data_events(time_limit=0)
+                    break
+                except (AMQPConnectionError, ChannelClosed, ChannelWrongStateError):
+                    self._reset()
+
+                    if attempt:
+                        raise
+
+                    logger.info("Publisher connection lost, reconnecting")
+
+            returned, self._returned = self._returned, []
+
+        if returned:
+            logger.error("Failed to send %d of %d messages", len(returned), len(bodies))
+            raise UnroutableError(returned)
+
+
+# Publisher for this process along with the pid it was created in. Connections can't
+# be shared across a fork, so celery pool processes each get their own.
+_publisher: tuple[int, Publisher] | None = None
+
+
+def get_publisher() -> Publisher:
+    """Returns the Publisher for the current process"""
+    global _publisher
+
+    if _publisher is None or _publisher[0] != os.getpid():
+        _publisher = (os.getpid(), Publisher())
+
+    return _publisher[1]
+
+
 def send_message(routing_key, msg_type, message):
     """Sends a JSON message to the specified queue.
 
     Sends the given message to the queue. If msg_type is populated, it
-    sets the x-msg-type header to that value.
+    sets the x-msg-type header to that value. The message is published using
+    the persistent connection of this process' Publisher.
 
     Args:
       queue: The name of the queue to send to
@@ -84,34 +274,24 @@ def send_message(routing_key, msg_type, message):
     Raises:
       pika.exceptions.UnroutableError: if unable to publish the message
     """
+    get_publisher().publish(routing_key, msg_type, message)
 
-    headers = {"x-msg-type": msg_type} if msg_type else {}
-    # TODO Update this to use a persistent connection to the queue
-    publish_props = pika.BasicProperties(
-        content_type="application/json",
-        content_encoding="utf-8",
-        headers=headers,
-        delivery_mode=1,
-    )
 
-    connection = build_connection()
-    channel = connection.channel()
-    channel.confirm_delivery()
+def send_messages(routing_key, msg_type, messages):
+    """Sends several JSON messages to the specified queue at once.
 
-    try:
-        channel.basic_publish(
-            exchange="",
-            routing_key=routing_key,
-            body=json.dumps(message),
-            properties=publish_props,
-            mandatory=True,
-        )
-    except UnroutableError as ue:
-        # TODO revisit this and handle exceptions better. Currently used for retry logic
-        logger.error("Failed to send message")
-        raise ue
-    finally:
-        connection.close()
+    Like send_message, but the broker confirms all of the messages together, see
+    Publisher.publish_batch.
+
+    Args:
+      queue: The name of the queue to send to
+      msg_type: The value of x-msg-type to set in the header, or None
+      messages: The messages to send, each must be valid JSON.
+
+    Raises:
+      pika.exceptions.UnroutableError: if unable to publish the messages
+    """
+    get_publisher().publish_batch(routing_key, msg_type, messages)
 
 
 def connection_ready() -> bool:
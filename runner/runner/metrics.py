@@ -0,0 +1,214 @@
+"""Prometheus metrics for the runner
+
+When METRICS_PORT is set, runner.py serves the metrics over HTTP from a thread in
+the main process. Tasks are executed by the listener or the celery worker processes,
+so the metrics are kept in prometheus_client's multiprocess mode: each process writes
+its values to files in PROMETHEUS_MULTIPROC_DIR and the server combines them when
+scraped. The directory has to be known before prometheus_client is imported, so a
+temporary one is created here unless it has been configured.
+
+Each phase of executing a task is timed in PHASE_SECONDS and counted in FAILURES
+when it raises. The time a task spent in each phase is also recorded in its
+TaskTimings, which is sent with its result. The phases are:
+
+- queue: from the control plane publishing the task until it started executing
+- pull: pulling the package image
+- create: creating the container, or acquiring a warm one
+- start: copying parameters into the container and starting it
+- run: the function running, with its output followed
+- remove: removing the container
+- collect: reading and uploading the captured output and result
+- publish: sending results to the control plane, which a task's own result can't
+  include
+
+The setup a process shares between its tasks is timed in PHASE_SECONDS too, but not
+recorded in any task's TaskTimings:
+
+- client: creating the process' docker client
+- login: logging the docker client in to the registry
+"""
+import atexit
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from time import perf_counter, time
+from typing import Iterator
+
+from . import config
+
+_MULTIPROC_DIR_VARIABLE = "PROMETHEUS_MULTIPROC_DIR"
+
+# The directory created for the metrics, if it wasn't configured
+_created_dir: str | None = None
+
+if config.METRICS_PORT and _MULTIPROC_DIR_VARIABLE not in os.environ:
+    _created_dir = tempfile.mkdtemp(prefix="functionary-metrics-")
+    os.environ[_MULTIPROC_DIR_VARIABLE] = _created_dir
+
+from prometheus_client import (  # noqa: E402
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+    start_http_server,
+)
+
+# Most phases take well under a second, but pulls and runs can take minutes
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+
+PHASE_SECONDS = Histogram(
+    "functionary_runner_phase_seconds",
+    "Time spent in each phase of executing a task",
+    ["phase"],
+    buckets=_BUCKETS,
+)
+FAILURES = Counter(
+    "functionary_runner_failures",
+    "Task phases that failed",
+    ["phase"],
+)
+DUPLICATE_TASKS = Counter(
+    "functionary_runner_duplicate_tasks",
+    "Redelivered tasks that were dropped instead of being run again",
+)
+BUSY_SLOTS = Gauge(
+    "functionary_runner_busy_slots",
+    "Tasks currently executing",
+    multiprocess_mode="livesum",
+)
+FREE_SLOTS = Gauge(
+    "functionary_runner_free_slots",
+    "Tasks that could start executing now",
+    multiprocess_mode="livesum",
+)
+SPOOLED_RESULTS = Gauge(
+    "functionary_runner_spooled_results",
+    "Results waiting in the spool to be published",
+    multiprocess_mode="livemax",
+)
+IMAGE_CACHE_HITS = Counter(
+    "functionary_runner_image_cache_hits",
+    "Tasks whose image was already present",
+)
+IMAGE_CACHE_MISSES = Counter(
+    "functionary_runner_image_cache_misses",
+    "Tasks whose image had to be pulled",
+)
+IMAGE_CACHE_EVICTIONS = Counter(
+    "functionary_runner_image_cache_evictions",
+    "Images removed to stay under the disk budget",
+)
+IMAGE_CACHE_EVICTED_BYTES = Counter(
+    "functionary_runner_image_cache_evicted_bytes",
+    "Disk space freed by removing images",
+)
+IMAGE_CACHE_BYTES = Gauge(
+    "functionary_runner_image_cache_bytes",
+    "Disk space used by images",
+    multiprocess_mode="livemax",
+)
+
+
+class TaskTimings:
+    """The time one task spent in each phase
+
+    Attributes:
+        started_at: When the task started executing, in seconds since the epoch
+        phases: Seconds spent in each phase. A phase entered more than once, such as
+            creating a container after no warm one was available, is summed.
+    """
+
+    def __init__(self):
+        self.started_at = time()
+        self.phases: dict[str, float] = {}
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def as_dict(self) -> dict:
+        """Returns the timings for the result message, completed as of now"""
+        return {
+            "started_at": self.started_at,
+            "completed_at": time(),
+            "phases": {
+                phase: round(seconds, 6) for phase, seconds in self.phases.items()
+            },
+        }
+
+
+@contextmanager
+def timed(phase: str, timings: TaskTimings | None = None) -> Iterator[None]:
+    """Observe the time spent in the block for the phase, counting it failed if the
+    block raises
+
+    Args:
+        phase: The phase the block performs
+        timings: The timings of the task the block is for, if any
+    """
+    start = perf_counter()
+
+    try:
+        yield
+    except Exception:
+        FAILURES.labels(phase).inc()
+        raise
+    finally:
+        elapsed = perf_counter() - start
+        PHASE_SECONDS.labels(phase).observe(elapsed)
+
+        if timings is not None:
+            timings.add(phase, elapsed)
+
+
+def observe_queued(task: dict, timings: TaskTimings) -> None:
+    """Observe how long the task waited between being published and starting
+
+    Tasks from a control plane that doesn't send "published_at" are ignored. The
+    clocks of the control plane and runner may differ slightly, so the time is never
+    less than 0.
+    """
+    if (published_at := task.get("published_at")) is None:
+        return
+
+    queued = max(timings.started_at - published_at, 0.0)
+    PHASE_SECONDS.labels("queue").observe(queued)
+    timings.add("queue", queued)
+
+
+@contextmanager
+def busy_slot() -> Iterator[None]:
+    """Count a slot as busy while the block executes a task"""
+    BUSY_SLOTS.inc()
+    FREE_SLOTS.dec()
+
+    try:
+        yield
+    finally:
+        BUSY_SLOTS.dec()
+        FREE_SLOTS.inc()
+
+
+def start_metrics_server(port: int, slots: int) -> None:
+    """Serve the metrics of every runner process on the port from a daemon thread
+
+    Args:
+        port: The port to listen on
+        slots: The number of tasks the runner executes at once
+    """
+    if _created_dir is not None:
+        atexit.register(shutil.rmtree, _created_dir, ignore_errors=True)
+
+    # Each task in progress takes a slot back off of these from its own process
+    FREE_SLOTS.set(slots)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    start_http_server(port, registry=registry)
+
+
+def mark_process_dead(pid: int) -> None:
+    """Drop the live gauges of a process that has exited"""
+    if _MULTIPROC_DIR_VARIABLE in os.environ:
+        multiprocess.mark_process_dead(pid)
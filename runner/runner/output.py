@@ -0,0 +1,156 @@
+"""Incremental capture of package container output
+
+The package harness prints the function's log output, then OUTPUT_SEPARATOR on a
+line of its own, then the JSON encoded result. OutputCapture splits that stream as
+it arrives, so output can be read while the container is still running, and keeps
+each part in a temporary file that only moves to disk once it grows past the spool
+threshold.
+"""
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Callable, Iterator
+
+from . import config
+
+OUTPUT_SEPARATOR = b"==== Output From Command ====\n"
+
+# The separator only counts when it starts a line
+_NEEDLE = b"\n" + OUTPUT_SEPARATOR
+
+
+class OutputCapture:
+    """Splits a container's output stream into the log output and the result
+
+    Attributes:
+        output_file: The log output written before the separator
+        result_file: The result written after the separator
+        separator_found: Whether the separator has been seen yet
+        on_output: Called with each piece of log output as it is written
+    """
+
+    def __init__(
+        self,
+        spool_threshold: int | None = None,
+        on_output: Callable[[bytes], None] | None = None,
+    ):
+        threshold = spool_threshold or config.OUTPUT_SPOOL_THRESHOLD
+
+        self.output_file: BinaryIO = SpooledTemporaryFile(max_size=threshold)
+        self.result_file: BinaryIO = SpooledTemporaryFile(max_size=threshold)
+        self.separator_found = False
+        self.on_output = on_output
+
+        # Bytes that might be the start of a separator split across chunks. The
+        # stream starts with an implied newline so a separator on the first line is
+        # recognized, it is dropped before anything is written.
+        self._pending = b"\n"
+        self._at_start = True
+
+    def __enter__(self) -> "OutputCapture":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def feed(self, chunk: bytes) -> None:
+        """Process the next chunk of the container's output stream"""
+        if self.separator_found:
+            self.result_file.write(chunk)
+            return
+
+        buffer = self._pending + chunk
+
+        if (index := buffer.find(_NEEDLE)) >= 0:
+            self._write_output(buffer[: index + 1])
+            self.separator_found = True
+            self._pending = b""
+            result_start = index + len(_NEEDLE)
+            self.result_file.write(buffer[result_start:])
+        else:
+            keep = len(_NEEDLE) - 1
+            self._write_output(buffer[:-keep])
+            self._pending = buffer[-keep:]
+
+    def finish(self) -> None:
+        """Flush anything held back while looking for the separator"""
+        if not self.separator_found:
+            self._write_output(self._pending)
+
+        self._pending = b""
+
+    def output(self) -> bytes:
+        """Returns the complete log output, with trailing whitespace removed"""
+        return self._read(self.output_file).rstrip()
+
+    def result(self) -> bytes:
+        """Returns the complete result, with trailing whitespace removed"""
+        return self._read(self.result_file).rstrip()
+
+    def output_size(self) -> int:
+        """Returns the size of the log output, with trailing whitespace removed"""
+        return self._stripped_size(self.output_file)
+
+    def result_size(self) -> int:
+        """Returns the size of the result, with trailing whitespace removed"""
+        return self._stripped_size(self.result_file)
+
+    def iter_output(
+        self, chunk_size: int = config.OUTPUT_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        """Yields the log output in chunks of at most chunk_size bytes"""
+        return self._iter(self.output_file, chunk_size)
+
+    def iter_result(
+        self, chunk_size: int = config.OUTPUT_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        """Yields the result in chunks of at most chunk_size bytes"""
+        return self._iter(self.result_file, chunk_size)
+
+    def close(self) -> None:
+        self.output_file.close()
+        self.result_file.close()
+
+    def _write_output(self, data: bytes) -> None:
+        if self._at_start and data:
+            data = data[1:]
+            self._at_start = False
+
+        self.output_file.write(data)
+
+        if self.on_output is not None and data:
+            self.on_output(data)
+
+    @staticmethod
+    def _read(file: BinaryIO) -> bytes:
+        file.seek(0)
+        data = file.read()
+        file.seek(0, 2)
+
+        return data
+
+    @staticmethod
+    def _stripped_size(file: BinaryIO) -> int:
+        """Finds the end of the file's content by reading backwards from the end"""
+        position = file.seek(0, 2)
+        size = 0
+
+        while position > 0 and not size:
+            start = max(0, position - config.OUTPUT_CHUNK_SIZE)
+            file.seek(start)
+
+            if stripped := file.read(position - start).rstrip():
+                size = start + len(stripped)
+
+            position = start
+
+        file.seek(0, 2)
+
+        return size
+
+    @staticmethod
+    def _iter(file: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+        file.seek(0)
+
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+        file.seek(0, 2)
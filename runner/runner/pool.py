@@ -0,0 +1,248 @@
+"""Warm container pool
+
+Creating, starting and removing a container can take longer than the functions it
+runs. When enabled via WARM_POOL_SIZE, the runner keeps up to that many started,
+idle containers for each recently used image and runs invocations in them with
+docker exec, using the image's own entrypoint. Containers are recycled once they
+have served WARM_POOL_MAX_USES invocations or sat idle for WARM_POOL_IDLE_TIMEOUT
+seconds.
+
+Each invocation is its own process with its own environment, but filesystem
+changes made by one invocation are visible to later ones in the same container.
+"""
+import atexit
+import logging
+import os
+from dataclasses import dataclass, field
+from threading import Event, Lock, Thread
+from time import monotonic
+
+import docker
+from docker.errors import DockerException
+from docker.models.containers import Container
+
+from . import config
+from .client import get_docker_client
+
+logger = logging.getLogger(__name__)
+
+POOL_LABEL = "functionary.pool"
+
+# Keeps the container running without doing anything. Invocations are run with exec.
+IDLE_ENTRYPOINT = ["sleep", "infinity"]
+
+
+@dataclass
+class WarmContainer:
+    """A started container that can run invocations for its image
+
+    Attributes:
+        container: The docker container
+        image: The image the container was started from
+        entrypoint: The image's entrypoint, which invocations are run with
+        uses: The number of invocations run in the container
+        last_used: monotonic timestamp of when the container was last released
+    """
+
+    container: Container
+    image: str
+    entrypoint: list[str]
+    uses: int = 0
+    last_used: float = field(default_factory=monotonic)
+
+
+class WarmPool:
+    """Per-image pools of warm containers
+
+    Attributes:
+        size: The number of containers to keep for each hot image
+        max_uses: The number of invocations after which a container is recycled
+        idle_timeout: Seconds after which idle containers, and images that are no
+            longer being used, are removed from the pool
+    """
+
+    def __init__(self, size: int, max_uses: int, idle_timeout: float):
+        self.size = size
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+
+        self._lock = Lock()
+        self._idle: dict[str, list[WarmContainer]] = {}
+        self._counts: dict[str, int] = {}
+        self._run_kwargs: dict[str, dict] = {}
+        self._last_used: dict[str, float] = {}
+        self._stopped = Event()
+        self._maintainer = Thread(target=self._maintain, name="warm-pool", daemon=True)
+        self._maintainer.start()
+
+    def acquire(
+        self, client: docker.DockerClient, image: str, run_kwargs: dict
+    ) -> WarmContainer | None:
+        """Take an idle container for the image, starting one if there is room
+
+        Args:
+            client: DockerClient to start containers with
+            image: The image the invocation needs
+            run_kwargs: Extra keyword arguments for containers.run, such as network
+
+        Returns:
+            A WarmContainer reserved for the caller, or None if the pool for the
+            image is at capacity and the invocation should run in a cold container.
+        """
+        with self._lock:
+            self._run_kwargs[image] = run_kwargs
+            self._last_used[image] = monotonic()
+
+            if idle := self._idle.get(image):
+                return idle.pop()
+
+            if self._counts.get(image, 0) >= self.size:
+                return None
+
+            self._counts[image] = self._counts.get(image, 0) + 1
+
+        try:
+            return self._start(client, image, run_kwargs)
+        except Exception:
+            with self._lock:
+                self._counts[image] -= 1
+
+            raise
+
+    def release(self, warm: WarmContainer, healthy: bool = True) -> None:
+        """Return a container to the pool once an invocation has finished
+
+        Args:
+            warm: The container returned by acquire
+            healthy: False if the invocation failed in a way that may have left the
+                container unusable, in which case it is removed.
+        """
+        warm.uses += 1
+        warm.last_used = monotonic()
+
+        if healthy and warm.uses < self.max_uses and not self._stopped.is_set():
+            with self._lock:
+                self._idle.setdefault(warm.image, []).append(warm)
+
+            return
+
+        self._remove(warm)
+
+    def shutdown(self) -> None:
+        """Stop maintaining the pool and remove all idle containers"""
+        self._stopped.set()
+
+        with self._lock:
+            idle = [warm for containers in self._idle.values() for warm in containers]
+            self._idle.clear()
+
+        for warm in idle:
+            self._remove(warm)
+
+    def _start(
+        self, client: docker.DockerClient, image: str, run_kwargs: dict
+    ) -> WarmContainer:
+        """Start a new idle container for the image"""
+        entrypoint = client.images.get(image).attrs["Config"]["Entrypoint"] or []
+        container = client.containers.run(
+            image,
+            entrypoint=IDLE_ENTRYPOINT,
+            detach=True,
+            labels={POOL_LABEL: "warm"},
+            **run_kwargs,
+        )
+        logger.debug("Started warm container %s for %s", container.short_id, image)
+
+        return WarmContainer(container=container, image=image, entrypoint=entrypoint)
+
+    def _remove(self, warm: WarmContainer) -> None:
+        """Remove a container from the pool and from docker"""
+        with self._lock:
+            self._counts[warm.image] -= 1
+
+        try:
+            warm.container.remove(force=True)
+        except DockerException as exc:
+            logger.info("Unable to remove warm container for %s: %s", warm.image, exc)
+
+    def _maintain(self) -> None:
+        """Periodically recycle idle containers and top up pools of hot images"""
+        interval = max(1.0, self.idle_timeout / 4)
+
+        while not self._stopped.wait(interval):
+            try:
+                self._recycle_idle()
+                self._replenish()
+            except Exception as exc:
+                logger.warning("Warm pool maintenance failed: %s", exc)
+
+    def _recycle_idle(self) -> None:
+        cutoff = monotonic() - self.idle_timeout
+        expired = []
+
+        with self._lock:
+            for image, idle in self._idle.items():
+                expired.extend(warm for warm in idle if warm.last_used < cutoff)
+                idle[:] = [warm for warm in idle if warm.last_used >= cutoff]
+
+            for image in [i for i, used in self._last_used.items() if used < cutoff]:
+                del self._last_used[image]
+                del self._run_kwargs[image]
+
+        for warm in expired:
+            self._remove(warm)
+
+    def _replenish(self) -> None:
+        with self._lock:
+            wanted = {
+                image: self.size - self._counts.get(image, 0)
+                for image in self._last_used
+                if self._counts.get(image, 0) < self.size
+            }
+            for image, count in wanted.items():
+                self._counts[image] = self._counts.get(image, 0) + count
+
+        if not wanted:
+            return
+
+        client = get_docker_client()
+
+        for image, count in wanted.items():
+            for _ in range(count):
+                try:
+                    warm = self._start(client, image, self._run_kwargs.get(image, {}))
+                except Exception as exc:
+                    logger.warning(
+                        "Unable to start warm container for %s: %s", image, exc
+                    )
+
+                    with self._lock:
+                        self._counts[image] -= 1
+
+                    continue
+
+                with self._lock:
+                    self._idle.setdefault(image, []).append(warm)
+
+
+# Pool for this process along with the pid it was created in, see get_pool
+_pool: tuple[int, WarmPool] | None = None
+
+
+def get_pool() -> WarmPool | None:
+    """Returns the WarmPool for the current process, or None if it is disabled"""
+    global _pool
+
+    if config.WARM_POOL_SIZE <= 0:
+        return None
+
+    if _pool is None or _pool[0] != os.getpid():
+        pool = WarmPool(
+            config.WARM_POOL_SIZE,
+            config.WARM_POOL_MAX_USES,
+            config.WARM_POOL_IDLE_TIMEOUT,
+        )
+        atexit.register(pool.shutdown)
+        _pool = (os.getpid(), pool)
+
+    return _pool[1]
@@ -0,0 +1,131 @@
+"""Coalescing of task results into batches
+
+When many tasks finish at once, sending each result as its own message costs a
+publish and a broker confirm per task. The ResultAggregator collects results as they
+finish and sends them together in a single TASK_RESULT_BATCH message once
+RESULT_BATCH_MAX_SIZE results are waiting or the oldest has waited
+RESULT_BATCH_MAX_DELAY seconds, whichever comes first. Batches are also closed
+once their output and results reach RESULT_BATCH_MAX_BYTES, so a few large results
+don't make an oversized message.
+"""
+import logging
+from concurrent.futures import Future
+from threading import Condition, Thread
+from time import monotonic
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class ResultAggregator:
+    """Collects task results and sends them in batches
+
+    Attributes:
+        send_batch: Called with each batch of results to send
+        max_size: The most results sent in one batch
+        max_delay: Seconds a result may wait for others to join its batch
+        max_bytes: The output and result size at which a batch is sent. A single
+            result larger than this is sent in a batch of its own.
+    """
+
+    def __init__(
+        self,
+        send_batch: Callable[[list[dict]], None],
+        max_size: int,
+        max_delay: float,
+        max_bytes: int,
+    ):
+        self.send_batch = send_batch
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.max_bytes = max_bytes
+
+        self._condition = Condition()
+        # Each waiting result, with its Future and when it was added
+        self._pending: list[tuple[dict, Future, float]] = []
+        self._pending_bytes = 0
+        self._stopped = False
+        self._sender = Thread(target=self._run, name="result-sender", daemon=True)
+        self._sender.start()
+
+    def add(self, result: dict) -> Future:
+        """Queue a result to be sent with the next batch
+
+        Returns:
+            A Future that completes once the batch containing the result has been
+            sent, or fails with the error that prevented it from being sent.
+        """
+        future = Future()
+
+        with self._condition:
+            self._pending.append((result, future, monotonic()))
+            self._pending_bytes += _size(result)
+            self._condition.notify()
+
+        return future
+
+    def shutdown(self) -> None:
+        """Send any waiting results and stop the sender"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+        self._sender.join()
+
+    def _next_batch(self) -> list[tuple[dict, Future, float]]:
+        """Wait until a batch is due, then take it"""
+        with self._condition:
+            while not self._stopped:
+                if (
+                    len(self._pending) >= self.max_size
+                    or self._pending_bytes >= self.max_bytes
+                ):
+                    break
+
+                if self._pending:
+                    oldest = self._pending[0][2]
+                    remaining = oldest + self.max_delay - monotonic()
+
+                    if remaining <= 0:
+                        break
+
+                    self._condition.wait(remaining)
+                else:
+                    self._condition.wait()
+
+            count = batch_bytes = 0
+            limit = self.max_size
+
+            for result, _, _ in self._pending[:limit]:
+                if count and batch_bytes + _size(result) > self.max_bytes:
+                    break
+
+                count += 1
+                batch_bytes += _size(result)
+
+            batch = self._pending[:count]
+            del self._pending[:count]
+            self._pending_bytes -= batch_bytes
+
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            if not (batch := self._next_batch()):
+                return
+
+            try:
+                self.send_batch([result for result, _, _ in batch])
+            except Exception as exc:
+                logger.warning("Failed to send a batch of %d results", len(batch))
+
+                for _, future, _ in batch:
+                    future.set_exception(exc)
+            else:
+                for _, future, _ in batch:
+                    future.set_result(None)
+
+
+def _size(result: dict) -> int:
+    """The size of a result's output and result data"""
+    return len(result.get("output") or "") + len(result.get("result") or "")
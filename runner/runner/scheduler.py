@@ -0,0 +1,200 @@
+"""Resource aware admission of tasks
+
+Packages may declare the CPU and memory their functions need, which arrive with each
+TASK_PACKAGE message. Their containers are limited to those amounts, and rather than
+running a fixed number of tasks at once the native executor only starts a task once
+its requirements fit in what is left of the host's capacity. Tasks of packages that
+don't declare resources are allotted TASK_DEFAULT_CPU and TASK_DEFAULT_MEMORY.
+
+Waiting tasks are started in the order they arrived, but a smaller task may start
+ahead of one that doesn't fit yet. So that a large task can't be passed over
+forever, that stops once the oldest waiting task has waited SCHEDULER_BACKFILL_WINDOW
+seconds, until it has started.
+"""
+import logging
+import os
+from collections import deque
+from dataclasses import dataclass
+from threading import Lock
+from time import monotonic
+from typing import Callable
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Resources:
+    """An amount of CPU and memory
+
+    Attributes:
+        cpu: The number of CPUs, which may be fractional
+        memory: Memory in bytes
+    """
+
+    cpu: float = 0.0
+    memory: int = 0
+
+    def __add__(self, other: "Resources") -> "Resources":
+        return Resources(self.cpu + other.cpu, self.memory + other.memory)
+
+    def __sub__(self, other: "Resources") -> "Resources":
+        return Resources(self.cpu - other.cpu, self.memory - other.memory)
+
+    def fits_in(self, other: "Resources") -> bool:
+        return self.cpu <= other.cpu and self.memory <= other.memory
+
+
+def get_requirements(task: dict) -> Resources:
+    """Returns the resources the task declared, or the defaults for those it didn't
+
+    Args:
+        task: The TASK_PACKAGE message body
+    """
+    resources = task.get("resources") or {}
+
+    return Resources(
+        cpu=resources.get("cpu") or config.TASK_DEFAULT_CPU,
+        memory=resources.get("memory") or config.TASK_DEFAULT_MEMORY,
+    )
+
+
+def get_container_limits(task: dict) -> dict:
+    """Returns the containers.run arguments that limit a task to its resources
+
+    Only resources the task declared are limited.
+    """
+    resources = task.get("resources") or {}
+    limits = {}
+
+    if cpu := resources.get("cpu"):
+        limits["nano_cpus"] = int(cpu * 1e9)
+
+    if memory := resources.get("memory"):
+        limits["mem_limit"] = memory
+
+    return limits
+
+
+class ResourceScheduler:
+    """Starts tasks once the resources they need are available
+
+    Attributes:
+        capacity: The resources shared by all running tasks
+        max_tasks: The most tasks run at once, regardless of their resources
+        backfill_window: Seconds the oldest waiting task may be passed over by
+            smaller tasks
+        in_use: The resources held by running tasks
+    """
+
+    def __init__(self, capacity: Resources, max_tasks: int, backfill_window: float):
+        self.capacity = capacity
+        self.max_tasks = max_tasks
+        self.backfill_window = backfill_window
+        self.in_use = Resources()
+
+        self._lock = Lock()
+        # Each waiting task's id, requirements, start callable and when it arrived
+        self._waiting: deque[tuple[str, Resources, Callable[[], None], float]] = deque()
+        # Requirements of each running task, a list in case a task is redelivered
+        self._running: dict[str, list[Resources]] = {}
+
+    def submit(
+        self, task_id: str, requirements: Resources, start: Callable[[], None]
+    ) -> None:
+        """Start the task now if it fits, otherwise once enough resources are released
+
+        A task needing more than the whole capacity is run on its own.
+
+        Args:
+            task_id: The id of the task
+            requirements: The resources the task needs
+            start: Called, without any locks held, to start the task
+        """
+        if not requirements.fits_in(self.capacity):
+            logger.warning(
+                "Task %s needs more than the runner's capacity, it will run alone",
+                task_id,
+            )
+            requirements = Resources(
+                min(requirements.cpu, self.capacity.cpu),
+                min(requirements.memory, self.capacity.memory),
+            )
+
+        with self._lock:
+            self._waiting.append((task_id, requirements, start, monotonic()))
+            admitted = self._admit()
+
+        for start_task in admitted:
+            start_task()
+
+    def release(self, task_id: str) -> None:
+        """Return a finished task's resources and start any waiting tasks that fit"""
+        with self._lock:
+            if running := self._running.get(task_id):
+                self.in_use -= running.pop()
+
+                if not running:
+                    del self._running[task_id]
+
+            admitted = self._admit()
+
+        for start_task in admitted:
+            start_task()
+
+    @property
+    def running(self) -> int:
+        """The number of tasks holding resources"""
+        return sum(len(running) for running in self._running.values())
+
+    @property
+    def waiting(self) -> int:
+        """The number of tasks waiting for resources"""
+        return len(self._waiting)
+
+    def _admit(self) -> list[Callable[[], None]]:
+        """Take the waiting tasks that can start now. Must be called with the lock."""
+        admitted = []
+        available = self.capacity - self.in_use
+        # Once the oldest task has waited long enough, nothing may pass it
+        backfill = (
+            bool(self._waiting)
+            and monotonic() - self._waiting[0][3] < self.backfill_window
+        )
+
+        for entry in list(self._waiting):
+            if self.running >= self.max_tasks:
+                break
+
+            task_id, requirements, start, _ = entry
+
+            if not requirements.fits_in(available):
+                if not backfill:
+                    break
+
+                continue
+
+            self._waiting.remove(entry)
+            self._running.setdefault(task_id, []).append(requirements)
+            self.in_use += requirements
+            available -= requirements
+            admitted.append(start)
+
+        return admitted
+
+
+def get_host_capacity() -> Resources:
+    """Returns the capacity configured for tasks, defaulting to the host's"""
+    return Resources(
+        cpu=config.TASK_CPU_CAPACITY or float(os.cpu_count() or 1),
+        memory=config.TASK_MEMORY_CAPACITY or _physical_memory(),
+    )
+
+
+def _physical_memory() -> int:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        logger.warning("Unable to determine host memory, memory will not be limited")
+        return 2**63
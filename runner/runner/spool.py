@@ -0,0 +1,203 @@
+"""Durable spool of task results
+
+A finished task's result is written to a SQLite database before its TASK_PACKAGE
+message is acked, then published as usual and removed once the broker has confirmed
+it. A result that can't be published stays in the spool, where the listener's
+ResultDrainer publishes it with exponential backoff. Results therefore survive broker
+outages as well as the runner restarting, and the task doesn't need to be run again.
+
+Results are only picked up by the drainer RESULT_SPOOL_RETRY_DELAY seconds after
+being spooled, so that it doesn't race the first attempt to publish them. Every
+runner process shares the one database, each through its own connections.
+"""
+import json
+import logging
+import os
+import sqlite3
+from threading import Event, Thread, local
+from time import time
+from typing import Callable
+
+from . import config
+from .metrics import SPOOLED_RESULTS
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL,
+    result TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL
+)
+"""
+
+
+class ResultSpool:
+    """Results waiting to be published
+
+    Attributes:
+        path: The SQLite database the results are kept in
+        retry_delay: Seconds before a spooled result is first retried, doubling with
+            each failed attempt
+        max_retry_delay: The most seconds between attempts
+    """
+
+    def __init__(self, path: str, retry_delay: float, max_retry_delay: float):
+        self.path = path
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        # SQLite connections can't be shared between threads
+        self._local = local()
+
+        if directory := os.path.dirname(path):
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connection() as connection:
+            connection.execute(_SCHEMA)
+
+    def add(self, result: dict) -> int:
+        """Spool a result, returning its id in the spool"""
+        with self._connection() as connection:
+            cursor = connection.execute(
+                "INSERT INTO results (task_id, result, next_attempt) VALUES (?, ?, ?)",
+                (result["task_id"], json.dumps(result), time() + self.retry_delay),
+            )
+
+        return cursor.lastrowid
+
+    def remove(self, result_ids: list[int]) -> None:
+        """Remove results that have been published"""
+        with self._connection() as connection:
+            connection.executemany(
+                "DELETE FROM results WHERE id = ?", [(id_,) for id_ in result_ids]
+            )
+
+    def due(self, limit: int) -> list[tuple[int, dict]]:
+        """Returns the oldest results due to be retried, along with their ids"""
+        rows = (
+            self._connection()
+            .execute(
+                "SELECT id, result FROM results WHERE next_attempt <= ? "
+                "ORDER BY id LIMIT ?",
+                (time(), limit),
+            )
+            .fetchall()
+        )
+
+        return [(result_id, json.loads(result)) for result_id, result in rows]
+
+    def defer(self, result_ids: list[int]) -> None:
+        """Put off retrying results that failed to publish again"""
+        with self._connection() as connection:
+            connection.executemany(
+                "UPDATE results SET attempts = attempts + 1, "
+                "next_attempt = ? + MIN(? * (1 << MIN(attempts, 16)), ?) WHERE id = ?",
+                [
+                    (time(), self.retry_delay, self.max_retry_delay, result_id)
+                    for result_id in result_ids
+                ],
+            )
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def _connection(self) -> sqlite3.Connection:
+        """Returns the connection for the current thread of this process"""
+        if getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            # Lets the runner processes read while another writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+
+        return self._local.connection
+
+
+class ResultDrainer:
+    """Publishes the results left in the spool from a background thread
+
+    Attributes:
+        spool: The spool to drain
+        send_results: Called with each batch of results to publish
+        interval: Seconds between checks for results that are due
+        batch_size: The most results published at once
+    """
+
+    def __init__(
+        self,
+        spool: ResultSpool,
+        send_results: Callable[[list[dict]], None],
+        interval: float,
+        batch_size: int,
+    ):
+        self.spool = spool
+        self.send_results = send_results
+        self.interval = interval
+        self.batch_size = batch_size
+
+        self._stopped = Event()
+        self._thread = Thread(target=self._run, name="result-drainer", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def drain(self) -> int:
+        """Publish the results that are due, returning how many were published"""
+        published = 0
+
+        while due := self.spool.due(self.batch_size):
+            result_ids = [result_id for result_id, _ in due]
+
+            try:
+                self.send_results([result for _, result in due])
+            except Exception as exc:
+                logger.warning(
+                    "Unable to publish %d spooled results: %s", len(due), exc
+                )
+                self.spool.defer(result_ids)
+                break
+
+            self.spool.remove(result_ids)
+            published += len(due)
+
+        SPOOLED_RESULTS.set(len(self.spool))
+
+        if published:
+            logger.info("Published %d spooled results", published)
+
+        return published
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.drain()
+            except Exception as exc:
+                logger.warning("Draining the result spool failed: %s", exc)
+
+
+# Spool for this process along with the pid it was created in, see get_spool
+_spool: tuple[int, ResultSpool] | None = None
+
+
+def get_spool() -> ResultSpool:
+    """Returns the ResultSpool for the current process"""
+    global _spool
+
+    if _spool is None or _spool[0] != os.getpid():
+        _spool = (
+            os.getpid(),
+            ResultSpool(
+                config.RESULT_SPOOL_PATH,
+                config.RESULT_SPOOL_RETRY_DELAY,
+                config.RESULT_SPOOL_MAX_RETRY_DELAY,
+            ),
+        )
+
+    return _spool[1]
@@ -0,0 +1,66 @@
+"""Direct upload of task output to object storage
+
+When the control plane includes presigned upload URLs in a TASK_PACKAGE message,
+output and results larger than RESULT_UPLOAD_THRESHOLD are streamed from the
+OutputCapture straight to storage. The TASK_RESULT then carries a reference to the
+upload, with its size and checksum, in place of the content.
+"""
+import hashlib
+from typing import BinaryIO
+
+import requests
+
+from . import config
+
+
+class _UploadBody:
+    """Reads the first size bytes of a file, hashing them along the way
+
+    Having a length lets requests send a Content-Length, which presigned PUTs
+    require, rather than a chunked body.
+    """
+
+    def __init__(self, file: BinaryIO, size: int):
+        self.file = file
+        self.remaining = size
+        self.size = size
+        self.sha256 = hashlib.sha256()
+        self.file.seek(0)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        self.sha256.update(data)
+
+        return data
+
+
+def upload_output(url: str, file: BinaryIO, size: int) -> dict:
+    """Upload the first size bytes of the file to a presigned URL
+
+    Args:
+        url: The presigned PUT URL
+        file: The file to upload from
+        size: The number of bytes to upload
+
+    Returns:
+        The size and sha256 checksum of the uploaded content
+
+    Raises:
+        requests.RequestException: The upload failed
+    """
+    body = _UploadBody(file, size)
+
+    try:
+        response = requests.put(url, data=body, timeout=config.RESULT_UPLOAD_TIMEOUT)
+        response.raise_for_status()
+    finally:
+        file.seek(0, 2)
+
+    return {"size": size, "sha256": body.sha256.hexdigest()}
@@ -0,0 +1,169 @@
+"""Resource usage of task containers
+
+While a task runs, its container's stats are sampled every USAGE_SAMPLE_INTERVAL
+seconds from a background thread, and a summary of the peak memory, CPU time, and
+block and network IO is sent with the task's result. Each sample is a single call to
+the docker stats endpoint, so the overhead is one request per interval per running
+task. Tasks that finish before the first interval are sampled once, as they start.
+
+Docker's counters cover the whole life of the container. A warm container runs many
+tasks, so its counters are taken relative to a baseline sampled before the task.
+"""
+import logging
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from threading import Event, Thread
+from typing import Iterator
+
+from docker.errors import DockerException, InvalidVersion
+from docker.models.containers import Container
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ResourceUsage:
+    """The resources a task's container used
+
+    Attributes:
+        samples: The number of stats samples taken
+        peak_memory: The most memory in use at once, in bytes
+        cpu_seconds: CPU time used
+        block_read: Bytes read from block devices
+        block_write: Bytes written to block devices
+        network_rx: Bytes received over the network
+        network_tx: Bytes sent over the network
+    """
+
+    samples: int = 0
+    peak_memory: int = 0
+    cpu_seconds: float = 0.0
+    block_read: int = 0
+    block_write: int = 0
+    network_rx: int = 0
+    network_tx: int = 0
+
+    def add(self, stats: dict, baseline: dict | None = None) -> None:
+        """Include a sample from the docker stats endpoint
+
+        Args:
+            stats: The sample
+            baseline: A sample taken before the task started, which the counters
+                are taken relative to
+        """
+        counters = _counters(stats)
+
+        if baseline is not None:
+            start = _counters(baseline)
+            counters = {name: counters[name] - start[name] for name in counters}
+
+        self.samples += 1
+        self.peak_memory = max(self.peak_memory, _memory(stats))
+
+        # The counters only grow, so the latest sample has the totals
+        self.cpu_seconds = max(self.cpu_seconds, counters["cpu"] / 1e9)
+        self.block_read = max(self.block_read, counters["block_read"])
+        self.block_write = max(self.block_write, counters["block_write"])
+        self.network_rx = max(self.network_rx, counters["network_rx"])
+        self.network_tx = max(self.network_tx, counters["network_tx"])
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@contextmanager
+def sample_usage(
+    container: Container, usage: ResourceUsage, interval: float, warm: bool = False
+) -> Iterator[None]:
+    """Sample the container's stats into usage while the block runs
+
+    Args:
+        container: The container the task runs in
+        usage: Where the samples are summarized
+        interval: Seconds between samples, 0 disables sampling
+        warm: Whether the container has run other tasks, in which case a baseline
+            is sampled before the block runs
+    """
+    if interval <= 0:
+        yield
+        return
+
+    baseline = _get_stats(container) if warm else None
+    stopped = Event()
+    sampler = Thread(
+        target=_sample,
+        args=(container, usage, interval, baseline, stopped),
+        name="usage-sampler",
+        daemon=True,
+    )
+    sampler.start()
+
+    try:
+        yield
+    finally:
+        stopped.set()
+        sampler.join()
+
+
+def _sample(
+    container: Container,
+    usage: ResourceUsage,
+    interval: float,
+    baseline: dict | None,
+    stopped: Event,
+) -> None:
+    while not stopped.is_set():
+        if (stats := _get_stats(container)) is None:
+            return
+
+        # A container that has exited reports no memory or CPU
+        if stats.get("memory_stats"):
+            try:
+                usage.add(stats, baseline)
+            except (KeyError, TypeError, ValueError) as exc:
+                logger.debug("Ignoring stats of %s: %s", container.short_id, exc)
+                return
+
+        stopped.wait(interval)
+
+
+def _get_stats(container: Container) -> dict | None:
+    """Returns a single stats sample for the container, or None if it is gone"""
+    try:
+        try:
+            return container.stats(stream=False, one_shot=True)
+        except InvalidVersion:
+            # Older docker engines take two samples a second apart for each call
+            return container.stats(stream=False)
+    except DockerException as exc:
+        logger.debug("Unable to sample stats of %s: %s", container.short_id, exc)
+        return None
+
+
+def _memory(stats: dict) -> int:
+    """Memory in use, without the page cache, as docker stats shows it"""
+    memory = stats.get("memory_stats") or {}
+    detail = memory.get("stats") or {}
+    # cgroup v1 reports total_inactive_file, v2 reports inactive_file
+    cache = detail.get("total_inactive_file", detail.get("inactive_file", 0))
+
+    return max(memory.get("usage", 0) - cache, 0)
+
+
+def _counters(stats: dict) -> dict[str, int]:
+    """The cumulative counters of a stats sample"""
+    cpu = (stats.get("cpu_stats") or {}).get("cpu_usage") or {}
+    blkio = (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []
+    networks = (stats.get("networks") or {}).values()
+
+    return {
+        "cpu": cpu.get("total_usage", 0),
+        "block_read": sum(
+            entry["value"] for entry in blkio if entry["op"].lower() == "read"
+        ),
+        "block_write": sum(
+            entry["value"] for entry in blkio if entry["op"].lower() == "write"
+        ),
+        "network_rx": sum(network.get("rx_bytes", 0) for network in networks),
+        "network_tx": sum(network.get("tx_bytes", 0) for network in networks),
+    }
@@ -1,5 +1,9 @@
 def create_result(
-    task: dict, status: int, output: str | bytes, result: str | bytes
+    task: dict,
+    status: int,
+    output: str | bytes,
+    result: str | bytes,
+    timings: dict | None = None,
 ) -> dict:
     """Creates a task result.
 
@@ -8,17 +12,23 @@ def create_result(
         status: integer status code for the result
         output: task output log
         result: task result
+        timings: time spent in each phase of executing the task, see TaskTimings
 
     Returns:
         Task result as a dict in the correct format for the result message
     """
-    return {
+    task_result = {
         "task_id": task["id"],
         "status": status,
         "output": output.decode() if isinstance(output, bytes) else output,
         "result": result.decode() if isinstance(result, bytes) else result,
     }
 
+    if timings is not None:
+        task_result["timings"] = timings
+
+    return task_result
+
 
 def create_failed_result(task: dict, log: str):
     """Helper method to create a failed task result indicated by a status of 1.
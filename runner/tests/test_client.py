@@ -0,0 +1,83 @@
+import pytest
+from docker.errors import APIError
+from prometheus_client import REGISTRY
+
+from runner import client as client_module
+from runner.client import get_docker_client, login_docker_client, pull
+
+
+@pytest.fixture(autouse=True)
+def registry_env(monkeypatch):
+    monkeypatch.setenv("REGISTRY_USER", "user")
+    monkeypatch.setenv("REGISTRY_PASSWORD", "password")
+    monkeypatch.setenv("REGISTRY_HOST", "registry")
+    monkeypatch.delenv("REGISTRY_PORT", raising=False)
+    monkeypatch.setattr(client_module, "_client", None)
+    monkeypatch.setattr(client_module, "_logins", set())
+
+
+@pytest.fixture
+def from_env(mocker):
+    return mocker.patch("runner.client.docker.from_env")
+
+
+def test_client_reused_within_process(from_env):
+    assert get_docker_client() is get_docker_client()
+    from_env.assert_called_once()
+
+
+def test_client_recreated_after_fork(mocker, from_env):
+    get_docker_client()
+    mocker.patch("runner.client.os.getpid", return_value=-1)
+    get_docker_client()
+
+    assert from_env.call_count == 2
+
+
+def test_login_only_sent_once(from_env):
+    client = get_docker_client(login=True)
+    get_docker_client(login=True)
+    login_docker_client(client)
+
+    client.login.assert_called_once()
+
+
+def test_setup_and_login_timed(from_env):
+    def count(phase: str) -> float:
+        return (
+            REGISTRY.get_sample_value(
+                "functionary_runner_phase_seconds_count", {"phase": phase}
+            )
+            or 0
+        )
+
+    clients, logins = count("client"), count("login")
+
+    get_docker_client(login=True)
+    get_docker_client(login=True)
+
+    assert count("client") == clients + 1
+    assert count("login") == logins + 1
+
+
+def test_pull_logs_in_again_when_unauthorized(from_env):
+    client = get_docker_client(login=True)
+    client.images.pull.side_effect = [
+        APIError("pull failed", explanation="unauthorized: authentication required"),
+        None,
+    ]
+
+    pull(client, "image")
+
+    assert client.login.call_count == 2
+    assert client.images.pull.call_count == 2
+
+
+def test_pull_does_not_log_in_again_for_other_errors(from_env):
+    client = get_docker_client(login=True)
+    client.images.pull.side_effect = APIError("pull failed", explanation="no space")
+
+    with pytest.raises(APIError):
+        pull(client, "image")
+
+    client.login.assert_called_once()
@@ -0,0 +1,111 @@
+import signal
+import subprocess
+import time
+
+import pytest
+from docker.errors import APIError
+
+from runner.control import CANCELED, TIMEOUT, RunningTask, TaskControl, TaskRegistry
+
+
+@pytest.fixture
+def control() -> TaskControl:
+    return TaskControl()
+
+
+@pytest.fixture
+def registry(tmp_path) -> TaskRegistry:
+    return TaskRegistry(str(tmp_path / "tasks"))
+
+
+def test_timeout_kills_container(mocker, control):
+    kill = mocker.MagicMock()
+
+    with control.track("task1", 0.01) as running_task:
+        running_task.attach(kill)
+        time.sleep(0.1)
+
+    kill.assert_called_once_with()
+    assert running_task.reason == TIMEOUT
+
+
+def test_no_timeout_when_finished_in_time(mocker, control):
+    kill = mocker.MagicMock()
+
+    with control.track("task1", 10) as running_task:
+        running_task.attach(kill)
+
+    kill.assert_not_called()
+    assert running_task.reason is None
+
+
+def test_cancel_kills_running_task(mocker, control):
+    kill = mocker.MagicMock()
+    cancel_registered = mocker.patch("runner.control._cancel_registered")
+
+    with control.track("task1", None) as running_task:
+        running_task.attach(kill)
+        control.cancel("task1")
+
+    kill.assert_called_once_with()
+    cancel_registered.assert_not_called()
+    assert running_task.reason == CANCELED
+
+
+def test_cancel_before_start_kills_on_attach(mocker, control):
+    kill = mocker.MagicMock(side_effect=APIError("container not running"))
+
+    with control.track("task1", None) as running_task:
+        control.cancel("task1")
+        running_task.attach(kill)
+
+    kill.assert_called_once_with()
+    assert running_task.reason == CANCELED
+
+
+def test_cancel_before_arrival(mocker, control):
+    control.cancel("task1")
+
+    assert control.is_canceled("task1")
+
+    with control.track("task1", None) as running_task:
+        assert running_task.reason == CANCELED
+
+
+def test_cancel_kills_container_in_other_process(mocker, registry):
+    docker_client = mocker.patch("runner.control.get_docker_client").return_value
+    kill = mocker.MagicMock()
+    worker = TaskControl(registry)
+    listener = TaskControl(registry)
+
+    with worker.track("task1", None) as running_task:
+        running_task.attach(kill, {"container": "abc123"})
+        listener.cancel("task1")
+
+        assert running_task.reason == CANCELED
+
+    docker_client.api.kill.assert_called_once_with("abc123")
+    kill.assert_not_called()
+    assert registry.get("task1") is None
+    assert not registry.is_canceled("task1")
+
+
+def test_cancel_kills_process_group_in_other_process(registry):
+    process = subprocess.Popen(["sleep", "10"], start_new_session=True)
+    registry.register("task1", {"process_group": process.pid})
+
+    TaskControl(registry).cancel("task1")
+
+    assert process.wait(timeout=5) == -signal.SIGKILL
+
+
+def test_cancel_in_other_process_before_start(mocker, registry):
+    """A task canceled by another process before it started is killed on attach"""
+    kill = mocker.MagicMock()
+    TaskControl(registry).cancel("task1")
+
+    running_task = RunningTask("task1", registry)
+    running_task.attach(kill, {"container": "abc123"})
+
+    kill.assert_called_once_with()
+    assert running_task.reason == CANCELED
@@ -0,0 +1,54 @@
+import pytest
+
+from runner.dedup import TaskHistory
+
+
+@pytest.fixture
+def history() -> TaskHistory:
+    return TaskHistory(60, 2)
+
+
+def test_duplicate_task_is_dropped(history):
+    assert history.receive("task1")
+    assert not history.receive("task1")
+    assert history.receive("task2")
+
+
+def test_oldest_task_forgotten_when_full(history):
+    history.receive("task1")
+    history.receive("task2")
+    history.receive("task3")
+
+    assert len(history) == 2
+    assert history.receive("task1")
+
+
+def test_task_forgotten_after_window(mocker, history):
+    monotonic = mocker.patch("runner.dedup.monotonic", return_value=100)
+    history.receive("task1")
+
+    monotonic.return_value = 161
+
+    assert history.receive("task1")
+
+
+def test_completion_restarts_window(mocker, history):
+    monotonic = mocker.patch("runner.dedup.monotonic", return_value=100)
+    history.receive("task1")
+    history.receive("task2")
+
+    monotonic.return_value = 150
+    history.complete("task1")
+    monotonic.return_value = 170
+
+    assert not history.receive("task1")
+    assert history.receive("task2")
+
+
+def test_duplicates_counted(mocker, history):
+    duplicates = mocker.patch("runner.dedup.DUPLICATE_TASKS")
+
+    history.receive("task1")
+    history.receive("task1")
+
+    duplicates.inc.assert_called_once_with()
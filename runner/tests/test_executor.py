@@ -0,0 +1,55 @@
+import pytest
+
+from runner.executor import NativeExecutor
+from runner.spool import ResultSpool
+
+
+@pytest.fixture
+def spool(mocker, tmp_path) -> ResultSpool:
+    spool = ResultSpool(str(tmp_path / "results.sqlite3"), 30, 600)
+    mocker.patch("runner.executor.get_spool", return_value=spool)
+
+    return spool
+
+
+@pytest.fixture
+def executor(spool) -> NativeExecutor:
+    return NativeExecutor(max_workers=2)
+
+
+def test_dispatch_publishes_result_and_reports_completion(mocker, executor):
+    result = {"task_id": "task1", "status": 0, "output": "", "result": "1"}
+    mocker.patch("runner.executor.execute_task", return_value=result)
+    send_batch = mocker.patch.object(executor.results, "send_batch")
+
+    executor.dispatch("TASK_PACKAGE", {"id": "task1", "package": "image"})
+    executor.shutdown()
+
+    send_batch.assert_called_once_with([result])
+    assert executor.completions.get_nowait() == "task1"
+    assert len(executor.spool) == 0
+
+
+def test_dispatch_publishes_failed_result(mocker, executor):
+    mocker.patch("runner.executor.execute_task", side_effect=Exception("boom"))
+    send_batch = mocker.patch.object(executor.results, "send_batch")
+
+    executor.dispatch("TASK_PACKAGE", {"id": "task1", "package": "image"})
+    executor.shutdown()
+
+    [result] = send_batch.call_args.args[0]
+    assert result["task_id"] == "task1"
+    assert result["status"] == 1
+    assert "boom" in result["output"]
+    assert executor.completions.get_nowait() == "task1"
+
+
+def test_publish_failure_leaves_result_spooled(mocker, executor, spool):
+    mocker.patch("runner.executor.execute_task", return_value={"task_id": "task1"})
+    mocker.patch.object(executor.results, "send_batch", side_effect=Exception("down"))
+
+    executor.dispatch("TASK_PACKAGE", {"id": "task1", "package": "image"})
+    executor.shutdown()
+
+    assert executor.completions.get_nowait() == "task1"
+    assert len(spool) == 1
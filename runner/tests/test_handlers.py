@@ -0,0 +1,245 @@
+import io
+import json
+import tarfile
+import time
+
+import pytest
+
+from runner import config
+from runner.control import TaskControl, TaskRegistry
+from runner.handlers import ParametersFile, execute_task, send_results
+from runner.output import OUTPUT_SEPARATOR
+
+STATS = {
+    "memory_stats": {"usage": 300, "stats": {"inactive_file": 100}},
+    "cpu_stats": {"cpu_usage": {"total_usage": 2_000_000_000}},
+    "blkio_stats": {"io_service_bytes_recursive": [{"op": "read", "value": 10}]},
+    "networks": {"eth0": {"rx_bytes": 5, "tx_bytes": 7}},
+}
+
+
+@pytest.fixture
+def docker_client(mocker, tmp_path):
+    client = mocker.MagicMock()
+    container = client.containers.create.return_value
+    container.id = "container1"
+    container.logs.return_value = [b"log\n", OUTPUT_SEPARATOR, b'"done"']
+    container.wait.return_value = {"StatusCode": 0}
+    container.stats.return_value = STATS
+
+    mocker.patch("runner.handlers.get_docker_client", return_value=client)
+    mocker.patch("runner.handlers.get_image_cache")
+    mocker.patch("runner.handlers.get_pool", return_value=None)
+    mocker.patch(
+        "runner.handlers.get_control",
+        return_value=TaskControl(TaskRegistry(str(tmp_path / "tasks"))),
+    )
+    mocker.patch(
+        "runner.handlers.stream_output"
+    ).return_value.__enter__.return_value = None
+
+    return client
+
+
+def _task(parameters: dict) -> dict:
+    return {
+        "id": "task1",
+        "package": "image",
+        "function": "echo",
+        "function_parameters": parameters,
+        "variables": {},
+    }
+
+
+def test_small_parameters_passed_on_command_line(docker_client):
+    result = execute_task(_task({"message": "hi"}))
+
+    command = docker_client.containers.create.call_args.kwargs["command"]
+    assert command == ["--function", "echo", "--parameters", '{"message": "hi"}']
+    docker_client.containers.create.return_value.put_archive.assert_not_called()
+    assert result["result"] == '"done"'
+
+
+def test_result_includes_phase_timings(docker_client):
+    task = _task({}) | {"published_at": time.time()}
+
+    result = execute_task(task)
+
+    timings = result["timings"]
+    assert set(timings["phases"]) == {
+        "queue",
+        "pull",
+        "create",
+        "start",
+        "run",
+        "remove",
+        "collect",
+    }
+    assert timings["started_at"] <= timings["completed_at"]
+
+
+def test_result_includes_resource_usage(docker_client):
+    result = execute_task(_task({}))
+
+    assert result["usage"] == {
+        "samples": 1,
+        "peak_memory": 200,
+        "cpu_seconds": 2.0,
+        "block_read": 10,
+        "block_write": 0,
+        "network_rx": 5,
+        "network_tx": 7,
+    }
+
+
+def test_usage_not_sampled_when_disabled(mocker, docker_client):
+    mocker.patch.object(config, "USAGE_SAMPLE_INTERVAL", 0)
+
+    result = execute_task(_task({}))
+
+    docker_client.containers.create.return_value.stats.assert_not_called()
+    assert "usage" not in result
+
+
+def test_large_parameters_copied_into_container(mocker, docker_client):
+    mocker.patch.object(config, "PARAMETERS_FILE_THRESHOLD", 16)
+    parameters = {"message": "x" * 32}
+
+    execute_task(_task(parameters))
+
+    container = docker_client.containers.create.return_value
+    command = docker_client.containers.create.call_args.kwargs["command"]
+    path = "/tmp/functionary-parameters-task1.json"
+    assert command == ["--function", "echo", "--parameters-file", path]
+
+    directory, archive = container.put_archive.call_args.args
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        content = tar.extractfile("functionary-parameters-task1.json").read()
+
+    assert directory == "/tmp"
+    assert json.loads(content) == parameters
+    container.start.assert_called_once()
+
+
+def test_parameters_file_path():
+    assert ParametersFile("name.json", b"{}").path == "/tmp/name.json"
+
+
+def test_large_result_uploaded(mocker, docker_client):
+    mocker.patch.object(config, "RESULT_UPLOAD_THRESHOLD", 4)
+    upload_output = mocker.patch(
+        "runner.handlers.upload_output", return_value={"size": 6, "sha256": "abc"}
+    )
+    task = _task({}) | {"upload_urls": {"result": {"url": "url", "key": "key"}}}
+
+    result = execute_task(task)
+
+    upload_output.assert_called_once()
+    assert "result" not in result
+    assert result["result_ref"] == {"key": "key", "size": 6, "sha256": "abc"}
+    assert result["output"] == "log"
+
+
+def test_failed_upload_sends_result_inline(mocker, docker_client):
+    mocker.patch.object(config, "RESULT_UPLOAD_THRESHOLD", 4)
+    mocker.patch("runner.handlers.upload_output", side_effect=Exception("denied"))
+    task = _task({}) | {"upload_urls": {"result": {"url": "url", "key": "key"}}}
+
+    result = execute_task(task)
+
+    assert "result_ref" not in result
+    assert result["result"] == '"done"'
+
+
+def test_declared_resources_limit_the_container(docker_client):
+    task = _task({})
+    task["resources"] = {"cpu": 0.5, "memory": 256 * 1024**2}
+
+    execute_task(task)
+
+    kwargs = docker_client.containers.create.call_args.kwargs
+    assert kwargs["nano_cpus"] == 500_000_000
+    assert kwargs["mem_limit"] == 256 * 1024**2
+
+
+def test_undeclared_resources_are_not_limited(docker_client):
+    execute_task(_task({}))
+
+    kwargs = docker_client.containers.create.call_args.kwargs
+    assert "nano_cpus" not in kwargs
+    assert "mem_limit" not in kwargs
+
+
+def test_timed_out_task_reports_termination(mocker, docker_client):
+    container = docker_client.containers.create.return_value
+
+    def logs(**kwargs):
+        yield b"started\n"
+        time.sleep(0.2)
+
+    container.logs.side_effect = logs
+    container.wait.return_value = {"StatusCode": 137}
+    task = _task({})
+    task["timeout"] = 0.01
+
+    result = execute_task(task)
+
+    container.kill.assert_called_once_with()
+    assert result["termination"] == "TIMEOUT"
+    assert result["status"] == 137
+    assert docker_client.containers.create.call_args.kwargs["labels"] == {
+        "functionary.task": "task1"
+    }
+
+
+def test_canceled_task_is_not_run(mocker, docker_client):
+    control = mocker.patch("runner.handlers.get_control").return_value
+    control.track.return_value.__enter__.return_value.reason = "CANCELED"
+
+    result = execute_task(_task({}))
+
+    docker_client.containers.create.assert_not_called()
+    assert result["termination"] == "CANCELED"
+
+
+def test_warm_task_canceled_by_listener(mocker, tmp_path, docker_client):
+    """A task run in a warm container by a celery worker is killed by the listener"""
+    registry = TaskRegistry(str(tmp_path / "tasks"))
+    mocker.patch("runner.handlers.get_control", return_value=TaskControl(registry))
+    mocker.patch("runner.control.get_docker_client", return_value=docker_client)
+    pool = mocker.patch("runner.handlers.get_pool").return_value
+    warm = pool.acquire.return_value
+    warm.container.id = "warm1"
+    warm.entrypoint = ["python", "main.py"]
+
+    def exec_start(exec_id, stream):
+        yield b"started\n"
+        TaskControl(registry).cancel("task1")
+
+    docker_client.api.exec_start.side_effect = exec_start
+
+    result = execute_task(_task({}))
+
+    docker_client.api.kill.assert_called_once_with("warm1")
+    pool.release.assert_called_once_with(warm, False)
+    assert result["termination"] == "CANCELED"
+    assert result["status"] == 137
+    assert not list((tmp_path / "tasks").iterdir())
+
+
+def test_send_results_splits_batches(mocker):
+    mocker.patch.object(config, "RESULT_BATCH_MAX_SIZE", 2)
+    send_messages = mocker.patch("runner.handlers.send_messages")
+    results = [{"task_id": f"task{index}"} for index in range(5)]
+
+    send_results(results)
+
+    send_messages.assert_called_once_with(
+        "tasking.results",
+        "TASK_RESULT_BATCH",
+        [
+            {"results": results[0:2]},
+            {"results": results[2:4]},
+            {"results": results[4:5]},
+        ],
+    )
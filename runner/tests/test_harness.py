@@ -0,0 +1,43 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+TEMPLATE = Path(__file__).parents[2] / "package_templates" / "python"
+
+
+def _serve(*requests: str) -> list[dict]:
+    """Returns the responses of the python template's harness in server mode"""
+    process = subprocess.run(
+        [sys.executable, "main.py", "--serve"],
+        cwd=TEMPLATE,
+        input="".join(f"{request}\n" for request in requests),
+        capture_output=True,
+        text=True,
+        timeout=30,
+    )
+
+    assert process.returncode == 0, process.stderr
+
+    return [json.loads(line) for line in process.stdout.splitlines()]
+
+
+def test_serve_answers_each_request():
+    request = {"id": 1, "function": "echo", "parameters": {"message": "hi"}}
+
+    (response,) = _serve(json.dumps(request))
+
+    assert response["id"] == 1
+    assert response["status"] == 0
+    assert json.loads(response["result"]) == "hi"
+
+
+def test_serve_survives_bad_requests():
+    request = {"id": 2, "function": "echo", "parameters": {"message": "still up"}}
+
+    responses = _serve("[1]", '"x"', "null", "{", json.dumps(request))
+
+    assert [response["status"] for response in responses] == [1, 1, 1, 1, 0]
+    assert all(response["id"] is None for response in responses[:4])
+    assert "Bad request" in responses[0]["output"]
+    assert json.loads(responses[4]["result"]) == "still up"
@@ -0,0 +1,174 @@
+import fcntl
+from threading import Event
+from time import time
+
+import pytest
+from docker.errors import ImageNotFound
+from prometheus_client import REGISTRY
+
+from runner.images import ImageCache
+
+GIB = 1024**3
+
+
+@pytest.fixture(autouse=True)
+def registry_env(monkeypatch):
+    monkeypatch.setenv("REGISTRY_HOST", "registry")
+    monkeypatch.setenv("REGISTRY_PORT", "5000")
+
+
+@pytest.fixture
+def cache():
+    cache = ImageCache(pull_concurrency=2, disk_budget=2 * GIB, protect_seconds=60)
+    yield cache
+    cache.shutdown()
+
+
+@pytest.fixture
+def client(mocker):
+    return mocker.MagicMock()
+
+
+def _sample(name: str) -> float:
+    return REGISTRY.get_sample_value(name) or 0
+
+
+def _image(image_id: str, tag: str, created: float, size: int = GIB) -> dict:
+    return {
+        "Id": image_id,
+        "RepoTags": [tag],
+        "Created": created,
+        "Size": size,
+        "SharedSize": 0,
+    }
+
+
+def test_concurrent_pulls_of_an_image_are_shared(mocker, cache):
+    release = Event()
+    pull = mocker.patch("runner.images.pull", side_effect=lambda *_: release.wait())
+    mocker.patch("runner.images.get_docker_client")
+
+    first = cache.pull("registry:5000/image:1")
+    second = cache.pull("registry:5000/image:1")
+    release.set()
+    first.result()
+
+    assert first is second
+    pull.assert_called_once()
+
+
+def test_pulls_shared_with_other_processes(mocker, tmp_path):
+    """A pull waiting on another process' lock for the image doesn't pull it again"""
+    pulling = Event()
+    release = Event()
+    pull = mocker.patch(
+        "runner.images.pull",
+        side_effect=lambda *_: pulling.set() or release.wait(),
+    )
+    blocked = Event()
+    flock = fcntl.flock
+
+    def _flock(file, operation):
+        try:
+            flock(file, operation)
+        except BlockingIOError:
+            blocked.set()
+            raise
+
+    mocker.patch("runner.images.fcntl.flock", side_effect=_flock)
+    client = mocker.patch("runner.images.get_docker_client").return_value
+    caches = [
+        ImageCache(1, 0, 60, lock_dir=str(tmp_path)),
+        ImageCache(1, 0, 60, lock_dir=str(tmp_path)),
+    ]
+
+    first = caches[0].pull("registry:5000/image:1")
+    pulling.wait(5)
+    second = caches[1].pull("registry:5000/image:1")
+    blocked.wait(5)
+    release.set()
+    first.result(5)
+    second.result(5)
+
+    for cache in caches:
+        cache.shutdown()
+
+    pull.assert_called_once()
+    client.images.get.assert_called_once_with("registry:5000/image:1")
+
+
+def test_ensure_counts_hits_and_misses(mocker, cache, client):
+    mocker.patch("runner.images.pull")
+    mocker.patch("runner.images.get_docker_client")
+    client.images.get.side_effect = [None, ImageNotFound("missing")]
+    hits = _sample("functionary_runner_image_cache_hits_total")
+    misses = _sample("functionary_runner_image_cache_misses_total")
+
+    cache.ensure(client, "registry:5000/image:1")
+    cache.ensure(client, "registry:5000/image:2")
+
+    assert _sample("functionary_runner_image_cache_hits_total") == hits + 1
+    assert _sample("functionary_runner_image_cache_misses_total") == misses + 1
+
+
+def test_evict_removes_least_recently_used(cache, client):
+    old = time() - 3600
+    client.df.return_value = {
+        "LayersSize": 4 * GIB,
+        "Images": [
+            _image("newest", "registry:5000/image:3", old + 20),
+            _image("oldest", "registry:5000/image:1", old),
+            _image("older", "registry:5000/image:2", old + 10),
+            _image("other", "docker.io/other:latest", old - 10),
+        ],
+    }
+    client.api.containers.return_value = []
+    evictions = _sample("functionary_runner_image_cache_evictions_total")
+    evicted = _sample("functionary_runner_image_cache_evicted_bytes_total")
+
+    cache.evict(client)
+
+    removed = [call.args[0] for call in client.images.remove.call_args_list]
+    assert removed == ["registry:5000/image:1", "registry:5000/image:2"]
+    assert _sample("functionary_runner_image_cache_evictions_total") == evictions + 2
+    assert (
+        _sample("functionary_runner_image_cache_evicted_bytes_total")
+        == evicted + 2 * GIB
+    )
+
+
+def test_evict_protects_in_use_and_recent_images(cache, client):
+    old = time() - 3600
+    client.df.return_value = {
+        "LayersSize": 4 * GIB,
+        "Images": [
+            _image("running", "registry:5000/image:1", old),
+            _image("recent", "registry:5000/image:2", old),
+            _image("unused", "registry:5000/image:3", old),
+        ],
+    }
+    client.api.containers.return_value = [{"ImageID": "running"}]
+    cache.touch("registry:5000/image:2")
+
+    cache.evict(client)
+
+    client.images.remove.assert_called_once_with("registry:5000/image:3")
+
+
+def test_evict_does_nothing_under_budget(cache, client):
+    client.df.return_value = {"LayersSize": GIB, "Images": []}
+
+    cache.evict(client)
+
+    client.images.remove.assert_not_called()
+
+
+def test_evict_records_size_without_budget(client):
+    cache = ImageCache(pull_concurrency=1, disk_budget=0, protect_seconds=60)
+    client.df.return_value = {"LayersSize": 3 * GIB, "Images": []}
+
+    cache.evict(client)
+    cache.shutdown()
+
+    client.images.remove.assert_not_called()
+    assert REGISTRY.get_sample_value("functionary_runner_image_cache_bytes") == 3 * GIB
@@ -1,7 +1,18 @@
+import json
+from queue import Queue
+
 import pytest
 from celery.app.control import Inspect
+from pika.spec import Basic, BasicProperties
 
-from runner.listener import _has_available_worker
+from runner.dedup import TaskHistory
+from runner.listener import (
+    TaskConsumer,
+    _complete_tasks,
+    _dispatch,
+    _handle_delivery,
+    _has_available_worker,
+)
 
 
 @pytest.fixture
@@ -57,3 +68,107 @@ def test_has_no_available_workers(mocker, get_inspect):
     worker_tasks = mock_worker_tasks()
     worker_concurrency = mock_worker_concurrency()
     assert len(worker_tasks) == worker_concurrency
+
+
+@pytest.fixture
+def consumer(mocker) -> TaskConsumer:
+    """TaskConsumer with a mock channel that dispatches nothing"""
+    mocker.patch("runner.listener._dispatch")
+    mocker.patch("runner.listener.get_history", return_value=TaskHistory(60, 100))
+
+    return TaskConsumer(mocker.MagicMock(), Queue())
+
+
+def _deliver(consumer: TaskConsumer, delivery_tag: int, msg_type: str, body: dict):
+    method = Basic.Deliver(delivery_tag=delivery_tag)
+    properties = BasicProperties(headers={"x-msg-type": msg_type})
+
+    consumer.on_message(consumer.channel, method, properties, json.dumps(body).encode())
+
+
+def test_consumer_acks_task_package_on_completion(consumer):
+    _deliver(consumer, 1, "TASK_PACKAGE", {"id": "task1"})
+    _deliver(consumer, 2, "TASK_PACKAGE", {"id": "task2"})
+
+    consumer.ack_completed()
+    consumer.channel.basic_ack.assert_not_called()
+
+    consumer.completions.put("task2")
+    consumer.ack_completed()
+
+    consumer.channel.basic_ack.assert_called_once_with(2)
+    assert list(consumer.in_flight) == ["task1"]
+
+
+def test_consumer_acks_other_messages_immediately(consumer):
+    _deliver(consumer, 1, "PULL_IMAGE", {"image_name": "image"})
+
+    consumer.channel.basic_ack.assert_called_once_with(1)
+    assert consumer.in_flight == {}
+
+
+def test_consumer_nacks_undecodable_messages(consumer):
+    method = Basic.Deliver(delivery_tag=1)
+    properties = BasicProperties(headers={"x-msg-type": "TASK_PACKAGE"})
+
+    consumer.on_message(consumer.channel, method, properties, b"not json")
+
+    consumer.channel.basic_nack.assert_called_once_with(1, requeue=False)
+    consumer.channel.basic_ack.assert_not_called()
+
+
+def test_consumer_drops_canceled_tasks(mocker, consumer):
+    control = mocker.patch("runner.listener.get_control").return_value
+    control.is_canceled.return_value = True
+
+    _deliver(consumer, 1, "TASK_PACKAGE", {"id": "task1"})
+
+    consumer.channel.basic_ack.assert_called_once_with(1)
+    assert consumer.in_flight == {}
+
+
+def test_consumer_drops_redelivered_tasks(consumer):
+    _deliver(consumer, 1, "TASK_PACKAGE", {"id": "task1"})
+    _deliver(consumer, 2, "TASK_PACKAGE", {"id": "task1"})
+
+    consumer.channel.basic_ack.assert_called_once_with(2)
+    assert consumer.in_flight == {"task1": [1]}
+
+    consumer.completions.put("task1")
+    consumer.ack_completed()
+    _deliver(consumer, 3, "TASK_PACKAGE", {"id": "task1"})
+
+    consumer.channel.basic_ack.assert_called_with(3)
+    assert consumer.in_flight == {}
+
+
+def test_poll_drops_redelivered_finished_tasks(mocker):
+    """Tasks fetched by polling are remembered for a window after they finish"""
+    dispatch = mocker.patch("runner.listener._dispatch")
+    history = TaskHistory(60, 100)
+    mocker.patch("runner.listener.get_history", return_value=history)
+    monotonic = mocker.patch("runner.dedup.monotonic", return_value=0)
+    completions = Queue()
+    method = Basic.GetOk(delivery_tag=1)
+    properties = BasicProperties(headers={"x-msg-type": "TASK_PACKAGE"})
+    body = json.dumps({"id": "task1"}).encode()
+
+    _handle_delivery(mocker.MagicMock(), method, properties, body)
+
+    # The task finishes long after it was received
+    monotonic.return_value = 100
+    completions.put("task1")
+    _complete_tasks(completions)
+
+    monotonic.return_value = 130
+    _handle_delivery(mocker.MagicMock(), method, properties, body)
+
+    dispatch.assert_called_once()
+
+
+def test_cancel_task_dispatched_to_control(mocker):
+    control = mocker.patch("runner.listener.get_control").return_value
+
+    _dispatch("CANCEL_TASK", {"task_id": "task1"})
+
+    control.cancel.assert_called_once_with("task1")
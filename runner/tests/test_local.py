@@ -0,0 +1,204 @@
+import io
+import json
+import os
+import tarfile
+import time
+from threading import Timer
+
+import pytest
+
+from runner import config
+from runner.control import TaskControl, TaskRegistry
+from runner.handlers import execute_task
+from runner.local import LocalPackages, is_local
+
+HARNESS = b"""\
+import argparse
+import json
+import os
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--function")
+parser.add_argument("--parameters")
+parser.add_argument("--parameters-file")
+args = parser.parse_args()
+
+if args.parameters_file:
+    with open(args.parameters_file) as parameters_file:
+        parameters = json.load(parameters_file)
+else:
+    parameters = json.loads(args.parameters)
+
+if args.function == "sleep":
+    time.sleep(parameters["seconds"])
+
+print(f"greeting {os.environ.get('GREETING')}")
+print(f"==== Output From Command ====\\n{json.dumps(parameters)}")
+"""
+
+# The harness of packages built before --parameters-file was supported
+OLD_HARNESS = b"""\
+import argparse
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--function")
+parser.add_argument("--parameters")
+args = parser.parse_args()
+
+print(f"==== Output From Command ====\\n{args.parameters}")
+"""
+
+
+def _archive(files: dict[str, bytes]) -> list[bytes]:
+    """Returns a get_archive stream of an "app" directory holding the files"""
+    buffer = io.BytesIO()
+
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        directory = tarfile.TarInfo("app")
+        directory.type = tarfile.DIRTYPE
+        directory.mode = 0o755
+        tar.addfile(directory)
+
+        for name, content in files.items():
+            info = tarfile.TarInfo(f"app/{name}")
+            info.size = len(content)
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(content))
+
+    return [buffer.getvalue()]
+
+
+@pytest.fixture
+def docker_client(mocker):
+    client = mocker.MagicMock()
+    image = client.images.get.return_value
+    image.id = "sha256:abc123"
+    image.attrs = {
+        "Config": {"Entrypoint": ["python", "main.py"], "WorkingDir": "/usr/src/app"}
+    }
+    container = client.containers.create.return_value
+    container.get_archive.side_effect = lambda path: (
+        _archive({"main.py": HARNESS, "requirements.txt": b"# none\n"}),
+        {},
+    )
+
+    return client
+
+
+@pytest.fixture
+def local_packages(mocker, tmp_path, docker_client) -> LocalPackages:
+    packages = LocalPackages(str(tmp_path / "packages"))
+
+    mocker.patch.object(config, "LOCAL_PACKAGES", ["trusted/*"])
+    mocker.patch("runner.handlers.get_local_packages", return_value=packages)
+    mocker.patch("runner.handlers.get_docker_client", return_value=docker_client)
+    mocker.patch("runner.handlers.get_image_cache")
+    mocker.patch(
+        "runner.handlers.get_control",
+        return_value=TaskControl(TaskRegistry(str(tmp_path / "tasks"))),
+    )
+    mocker.patch(
+        "runner.handlers.stream_output"
+    ).return_value.__enter__.return_value = None
+
+    return packages
+
+
+def _task(parameters: dict) -> dict:
+    return {
+        "id": "task1",
+        "package": "trusted/package:latest",
+        "function": "echo",
+        "function_parameters": parameters,
+        "variables": {"GREETING": "hello"},
+    }
+
+
+def test_is_local(mocker):
+    mocker.patch.object(config, "LOCAL_PACKAGES", ["registry/trusted/*"])
+
+    assert is_local("registry/trusted/package:1.0")
+    assert not is_local("registry/other/package:1.0")
+
+
+def test_package_prepared_once(docker_client, local_packages):
+    package = local_packages.get(docker_client, "trusted/package")
+    local_packages.get(docker_client, "trusted/package")
+
+    assert package.path == os.path.join(local_packages.root, "abc123", "app")
+    assert os.path.isfile(os.path.join(package.path, "main.py"))
+    assert package.command[1:] == ["main.py"]
+    assert os.path.exists(package.command[0])
+    docker_client.containers.create.assert_called_once_with("sha256:abc123")
+    docker_client.containers.create.return_value.remove.assert_called_once()
+
+
+def test_unsupported_entrypoint(docker_client, local_packages):
+    docker_client.images.get.return_value.attrs["Config"]["Entrypoint"] = ["/app"]
+
+    with pytest.raises(ValueError):
+        local_packages.get(docker_client, "trusted/package")
+
+    assert os.listdir(local_packages.root) == []
+
+
+def test_task_runs_in_local_process(local_packages):
+    result = execute_task(_task({"message": "hi"}))
+
+    assert result["status"] == 0
+    assert result["output"] == "greeting hello"
+    assert json.loads(result["result"]) == {"message": "hi"}
+    assert "remove" not in result["timings"]["phases"]
+
+
+def test_large_parameters_written_to_file(mocker, local_packages):
+    mocker.patch.object(config, "PARAMETERS_FILE_THRESHOLD", 16)
+    parameters = {"message": "x" * 32}
+
+    result = execute_task(_task(parameters))
+
+    assert json.loads(result["result"]) == parameters
+    assert not os.path.exists("/tmp/functionary-parameters-task1.json")
+
+
+def test_parameters_under_argument_limit_work_with_old_harness(
+    docker_client, local_packages
+):
+    """Parameters that fit in a single argument are passed on the command line, so
+    packages whose harness doesn't support --parameters-file still run"""
+    docker_client.containers.create.return_value.get_archive.side_effect = (
+        lambda path: (_archive({"main.py": OLD_HARNESS}), {})
+    )
+    parameters = {"message": "x" * 100 * 1024}
+
+    result = execute_task(_task(parameters))
+
+    assert result["status"] == 0
+    assert json.loads(result["result"]) == parameters
+
+
+def test_timed_out_local_process_is_killed(local_packages):
+    task = _task({"seconds": 10}) | {"function": "sleep", "timeout": 0.5}
+    start = time.perf_counter()
+
+    result = execute_task(task)
+
+    assert time.perf_counter() - start < 5
+    assert result["termination"] == "TIMEOUT"
+    assert result["status"] == 137
+
+
+def test_local_process_canceled_by_listener(mocker, tmp_path, local_packages):
+    """A local process run by a celery worker is killed by the listener"""
+    registry = TaskRegistry(str(tmp_path / "tasks"))
+    task = _task({"seconds": 10}) | {"function": "sleep"}
+    cancel = Timer(0.5, TaskControl(registry).cancel, ("task1",))
+    cancel.start()
+    start = time.perf_counter()
+
+    result = execute_task(task)
+
+    assert time.perf_counter() - start < 5
+    assert result["termination"] == "CANCELED"
+    assert result["status"] == 137
@@ -0,0 +1,80 @@
+import pytest
+
+from runner.logstream import LogStream, LogStreamer
+
+
+@pytest.fixture
+def send_message(mocker):
+    return mocker.patch("runner.logstream.send_message")
+
+
+@pytest.fixture
+def streamer():
+    # Long interval so that only explicit flushes send chunks
+    streamer = LogStreamer(interval=3600, max_bytes=16)
+    yield streamer
+    streamer.shutdown()
+
+
+def test_one_chunk_per_flush(send_message, streamer):
+    with streamer.stream("task") as on_output:
+        on_output(b"line 1\n")
+        on_output(b"line 2\n")
+        streamer.flush()
+        streamer.flush()
+
+    send_message.assert_called_once_with(
+        "tasking.results",
+        "TASK_LOG_CHUNK",
+        {"task_id": "task", "sequence": 0, "output": "line 1\nline 2\n", "skipped": 0},
+    )
+
+
+def test_stream_unregistered_after_context(send_message, streamer):
+    with streamer.stream("task") as on_output:
+        pass
+
+    on_output(b"late output")
+    streamer.flush()
+
+    send_message.assert_not_called()
+
+
+def test_oldest_output_dropped_past_max_bytes():
+    log_stream = LogStream("task", max_bytes=8)
+    log_stream.write(b"0123456789")
+    log_stream.write(b"ab")
+
+    assert log_stream.take() == {
+        "task_id": "task",
+        "sequence": 0,
+        "output": "456789ab",
+        "skipped": 4,
+    }
+    assert log_stream.take() is None
+
+
+def test_multibyte_character_split_across_chunks():
+    log_stream = LogStream("task", max_bytes=16)
+    encoded = "é".encode()
+
+    log_stream.write(b"a" + encoded[:1])
+    assert log_stream.take()["output"] == "a"
+
+    log_stream.write(encoded[1:])
+    assert log_stream.take()["output"] == "é"
+
+
+def test_chunks_numbered_in_order():
+    log_stream = LogStream("task", max_bytes=16)
+    encoded = "é".encode()
+
+    log_stream.write(b"a")
+    assert log_stream.take()["sequence"] == 0
+
+    # Nothing is sent for part of a character, so no number is used
+    log_stream.write(encoded[:1])
+    assert log_stream.take() is None
+
+    log_stream.write(encoded[1:])
+    assert log_stream.take()["sequence"] == 1
@@ -0,0 +1,93 @@
+import pytest
+from pika.exceptions import StreamLostError, UnroutableError
+
+from runner.messaging import Publisher
+
+
+@pytest.fixture
+def build_connection(mocker):
+    return mocker.patch("runner.messaging.build_connection")
+
+
+def test_publisher_reuses_connection(build_connection):
+    publisher = Publisher()
+
+    publisher.publish("queue", "TYPE", {"a": 1})
+    publisher.publish("queue", "TYPE", {"a": 2})
+    publisher.publish("queue", "TYPE", {"a": 3})
+
+    build_connection.assert_called_once()
+    channel = build_connection.return_value.channel.return_value
+    channel.confirm_delivery.assert_called_once()
+    assert channel.basic_publish.call_count == 3
+
+
+def test_publisher_reconnects_when_connection_lost(build_connection):
+    publisher = Publisher()
+    channel = build_connection.return_value.channel.return_value
+    channel.basic_publish.side_effect = [None, StreamLostError(), None]
+
+    publisher.publish("queue", "TYPE", {"a": 1})
+    publisher.publish("queue", "TYPE", {"a": 2})
+
+    assert build_connection.call_count == 2
+    assert channel.basic_publish.call_count == 3
+
+
+def test_publisher_gives_up_after_one_reconnect(build_connection):
+    publisher = Publisher()
+    channel = build_connection.return_value.channel.return_value
+    channel.basic_publish.side_effect = StreamLostError()
+
+    with pytest.raises(StreamLostError):
+        publisher.publish("queue", "TYPE", {"a": 1})
+
+    assert build_connection.call_count == 2
+
+
+def test_publisher_does_not_reconnect_on_unroutable(build_connection):
+    publisher = Publisher()
+    channel = build_connection.return_value.channel.return_value
+    channel.basic_publish.side_effect = UnroutableError([])
+
+    with pytest.raises(UnroutableError):
+        publisher.publish("queue", "TYPE", {"a": 1})
+
+    build_connection.assert_called_once()
+
+
+def test_publish_batch_commits_once(build_connection):
+    publisher = Publisher()
+
+    publisher.publish_batch("queue", "TYPE", [{"a": 1}, {"a": 2}, {"a": 3}])
+
+    channel = build_connection.return_value.channel.return_value
+    channel.tx_select.assert_called_once()
+    channel.confirm_delivery.assert_not_called()
+    assert channel.basic_publish.call_count == 3
+    channel.tx_commit.assert_called_once()
+
+
+def test_publish_batch_raises_for_returned_messages(build_connection):
+    publisher = Publisher()
+    channel = build_connection.return_value.channel.return_value
+    channel.tx_commit.side_effect = lambda: publisher._on_return(
+        channel, "method", "properties", b"{}"
+    )
+
+    with pytest.raises(UnroutableError):
+        publisher.publish_batch("queue", "TYPE", [{"a": 1}, {"a": 2}])
+
+    channel.tx_commit.side_effect = None
+    publisher.publish_batch("queue", "TYPE", [{"a": 3}])
+
+
+def test_publish_batch_resends_after_reconnecting(build_connection):
+    publisher = Publisher()
+    channel = build_connection.return_value.channel.return_value
+    channel.tx_commit.side_effect = [StreamLostError(), None]
+
+    publisher.publish_batch("queue", "TYPE", [{"a": 1}, {"a": 2}])
+
+    assert build_connection.call_count == 2
+    assert channel.basic_publish.call_count == 4
@@ -0,0 +1,79 @@
+from time import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+from runner.metrics import TaskTimings, busy_slot, observe_queued, timed
+
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_timed_observes_phase():
+    count = _sample("functionary_runner_phase_seconds_count", phase="pull")
+
+    with timed("pull"):
+        pass
+
+    assert _sample("functionary_runner_phase_seconds_count", phase="pull") == count + 1
+
+
+def test_timed_sums_phase_into_timings():
+    timings = TaskTimings()
+
+    with timed("create", timings):
+        pass
+
+    with timed("create", timings):
+        pass
+
+    assert list(timings.phases) == ["create"]
+    assert timings.as_dict()["completed_at"] >= timings.started_at
+
+
+def test_timed_counts_failures():
+    failures = _sample("functionary_runner_failures_total", phase="start")
+    count = _sample("functionary_runner_phase_seconds_count", phase="start")
+
+    with pytest.raises(ValueError):
+        with timed("start"):
+            raise ValueError("container failed to start")
+
+    assert _sample("functionary_runner_failures_total", phase="start") == failures + 1
+    assert _sample("functionary_runner_phase_seconds_count", phase="start") == count + 1
+
+
+def test_observe_queued_uses_published_at():
+    total = _sample("functionary_runner_phase_seconds_sum", phase="queue")
+
+    published_at = time() - 5
+    timings = TaskTimings()
+
+    observe_queued({"id": "task1", "published_at": published_at}, timings)
+
+    assert _sample("functionary_runner_phase_seconds_sum", phase="queue") >= total + 5
+    assert timings.phases["queue"] >= 5
+
+
+def test_observe_queued_ignores_missing_published_at():
+    count = _sample("functionary_runner_phase_seconds_count", phase="queue")
+
+    timings = TaskTimings()
+
+    observe_queued({"id": "task1"}, timings)
+
+    assert _sample("functionary_runner_phase_seconds_count", phase="queue") == count
+    assert "queue" not in timings.phases
+
+
+def test_busy_slot_moves_slot_from_free_to_busy():
+    busy = _sample("functionary_runner_busy_slots")
+    free = _sample("functionary_runner_free_slots")
+
+    with busy_slot():
+        assert _sample("functionary_runner_busy_slots") == busy + 1
+        assert _sample("functionary_runner_free_slots") == free - 1
+
+    assert _sample("functionary_runner_busy_slots") == busy
+    assert _sample("functionary_runner_free_slots") == free
@@ -0,0 +1,75 @@
+import pytest
+
+from runner.output import OUTPUT_SEPARATOR, OutputCapture
+
+STREAM = b"log line 1\nlog line 2\n" + OUTPUT_SEPARATOR + b'{"answer": 42}\n'
+
+
+def _capture(chunks: list[bytes], **kwargs) -> OutputCapture:
+    capture = OutputCapture(**kwargs)
+
+    for chunk in chunks:
+        capture.feed(chunk)
+
+    capture.finish()
+
+    return capture
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 16, 64, len(STREAM)])
+def test_separator_found_across_chunk_boundaries(chunk_size):
+    chunks = [STREAM[i:][:chunk_size] for i in range(0, len(STREAM), chunk_size)]
+
+    with _capture(chunks) as capture:
+        assert capture.separator_found
+        assert capture.output() == b"log line 1\nlog line 2"
+        assert capture.result() == b'{"answer": 42}'
+
+
+def test_separator_on_first_line():
+    with _capture([OUTPUT_SEPARATOR + b'"result"']) as capture:
+        assert capture.output() == b""
+        assert capture.result() == b'"result"'
+
+
+def test_separator_must_start_a_line():
+    stream = b"not a " + OUTPUT_SEPARATOR + b"more output"
+
+    with _capture([stream]) as capture:
+        assert not capture.separator_found
+        assert capture.output() == stream
+        assert capture.result() == b""
+
+
+def test_missing_separator_keeps_everything_as_output():
+    with _capture([b"partial ", b"output ====\n"]) as capture:
+        assert capture.output() == b"partial output ===="
+        assert capture.result() == b""
+
+
+def test_large_output_spills_to_disk_and_iterates_in_chunks():
+    output = b"x" * 1000
+
+    with _capture([output, b"\n", OUTPUT_SEPARATOR], spool_threshold=100) as capture:
+        assert capture.output_file._rolled
+        assert list(capture.iter_output(chunk_size=400)) == [
+            output[:400],
+            output[400:800],
+            output[800:] + b"\n",
+        ]
+
+
+def test_on_output_receives_log_output_only():
+    received = []
+
+    with _capture([STREAM], on_output=received.append) as capture:
+        assert b"".join(received) == capture.output() + b"\n"
+
+
+@pytest.mark.parametrize("trailing", [b"", b"\n", b" \n\n" * 100])
+def test_sizes_exclude_trailing_whitespace(mocker, trailing):
+    mocker.patch("runner.output.config.OUTPUT_CHUNK_SIZE", 4)
+
+    with _capture([STREAM + trailing]) as capture:
+        assert capture.output_size() == len(capture.output())
+        assert capture.result_size() == len(capture.result())
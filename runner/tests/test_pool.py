@@ -0,0 +1,61 @@
+import pytest
+
+from runner.pool import WarmPool
+
+
+@pytest.fixture
+def client(mocker):
+    client = mocker.MagicMock()
+    client.images.get.return_value.attrs = {"Config": {"Entrypoint": ["python"]}}
+    client.containers.run.side_effect = lambda *args, **kwargs: mocker.MagicMock()
+
+    return client
+
+
+@pytest.fixture
+def pool():
+    pool = WarmPool(size=2, max_uses=2, idle_timeout=3600)
+    yield pool
+    pool.shutdown()
+
+
+def test_acquire_reuses_released_container(client, pool):
+    warm = pool.acquire(client, "image", {})
+    pool.release(warm)
+
+    assert pool.acquire(client, "image", {}) is warm
+    assert warm.entrypoint == ["python"]
+    client.containers.run.assert_called_once()
+
+
+def test_acquire_returns_none_at_capacity(client, pool):
+    assert pool.acquire(client, "image", {}) is not None
+    assert pool.acquire(client, "image", {}) is not None
+    assert pool.acquire(client, "image", {}) is None
+    assert pool.acquire(client, "other_image", {}) is not None
+
+
+def test_container_recycled_after_max_uses(client, pool):
+    warm = pool.acquire(client, "image", {})
+    pool.release(warm)
+    pool.release(pool.acquire(client, "image", {}))
+
+    warm.container.remove.assert_called_once_with(force=True)
+    assert pool.acquire(client, "image", {}) is not warm
+
+
+def test_unhealthy_container_is_removed(client, pool):
+    warm = pool.acquire(client, "image", {})
+    pool.release(warm, healthy=False)
+
+    warm.container.remove.assert_called_once_with(force=True)
+
+
+def test_idle_containers_recycled(client, pool):
+    warm = pool.acquire(client, "image", {})
+    pool.release(warm)
+    warm.last_used -= 7200
+
+    pool._recycle_idle()
+
+    warm.container.remove.assert_called_once_with(force=True)
@@ -0,0 +1,66 @@
+import pytest
+
+from runner.results import ResultAggregator
+
+
+def _result(task_id: str, output: str = "") -> dict:
+    return {"task_id": task_id, "status": 0, "output": output, "result": ""}
+
+
+@pytest.fixture
+def sent():
+    return []
+
+
+def _aggregator(sent, **kwargs) -> ResultAggregator:
+    options = {"max_size": 3, "max_delay": 3600, "max_bytes": 1024} | kwargs
+
+    return ResultAggregator(sent.append, **options)
+
+
+def test_batch_sent_when_full(sent):
+    aggregator = _aggregator(sent)
+    futures = [aggregator.add(_result(str(n))) for n in range(4)]
+
+    futures[2].result(timeout=5)
+    assert [len(batch) for batch in sent] == [3]
+    assert not futures[3].done()
+
+    aggregator.shutdown()
+    assert [len(batch) for batch in sent] == [3, 1]
+
+
+def test_batch_sent_after_delay(sent):
+    aggregator = _aggregator(sent, max_delay=0.01)
+
+    aggregator.add(_result("1")).result(timeout=5)
+    aggregator.shutdown()
+
+    assert sent == [[_result("1")]]
+
+
+def test_batch_closed_at_max_bytes(sent):
+    aggregator = _aggregator(sent, max_bytes=10)
+    first = aggregator.add(_result("1", "x" * 6))
+    aggregator.add(_result("2", "x" * 6))
+
+    first.result(timeout=5)
+    aggregator.shutdown()
+
+    assert [[result["task_id"] for result in batch] for batch in sent] == [
+        ["1"],
+        ["2"],
+    ]
+
+
+def test_send_failure_fails_futures():
+    def send_batch(results):
+        raise RuntimeError("no broker")
+
+    aggregator = ResultAggregator(send_batch, max_size=1, max_delay=1, max_bytes=1)
+    future = aggregator.add(_result("1"))
+
+    with pytest.raises(RuntimeError):
+        future.result(timeout=5)
+
+    aggregator.shutdown()
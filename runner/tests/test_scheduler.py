@@ -0,0 +1,96 @@
+import pytest
+
+from runner import config
+from runner.scheduler import Resources, ResourceScheduler, get_requirements
+
+GB = 1024**3
+
+
+@pytest.fixture
+def scheduler() -> ResourceScheduler:
+    return ResourceScheduler(Resources(cpu=4, memory=8 * GB), 10, 30)
+
+
+def _submit(scheduler, started, task_id, cpu, memory=0):
+    scheduler.submit(task_id, Resources(cpu, memory), lambda: started.append(task_id))
+
+
+def test_tasks_packed_against_capacity(scheduler):
+    started = []
+
+    for task_id in ["a", "b", "c", "d", "e"]:
+        _submit(scheduler, started, task_id, 0.5, GB)
+
+    _submit(scheduler, started, "f", 1, 4 * GB)
+
+    assert started == ["a", "b", "c", "d", "e"]
+    assert scheduler.waiting == 1
+
+    scheduler.release("a")
+
+    assert started[-1] == "f"
+    assert scheduler.in_use == Resources(3, 8 * GB)
+
+
+def test_smaller_tasks_backfill_within_window(scheduler):
+    started = []
+    _submit(scheduler, started, "a", 3)
+    _submit(scheduler, started, "big", 2)
+    _submit(scheduler, started, "small", 1)
+
+    assert started == ["a", "small"]
+
+    scheduler.release("a")
+
+    assert started == ["a", "small", "big"]
+
+
+def test_backfill_stops_once_oldest_has_waited(mocker, scheduler):
+    started = []
+    _submit(scheduler, started, "a", 3)
+    _submit(scheduler, started, "big", 2)
+
+    mocker.patch("runner.scheduler.monotonic", return_value=10**9)
+    _submit(scheduler, started, "small", 1)
+
+    assert started == ["a"]
+    assert scheduler.waiting == 2
+
+
+def test_max_tasks_limits_running_tasks():
+    scheduler = ResourceScheduler(Resources(cpu=4, memory=GB), 2, 30)
+    started = []
+
+    for task_id in ["a", "b", "c"]:
+        _submit(scheduler, started, task_id, 0.1)
+
+    assert started == ["a", "b"]
+
+    scheduler.release("b")
+
+    assert started == ["a", "b", "c"]
+
+
+def test_oversized_task_runs_alone(scheduler):
+    started = []
+    _submit(scheduler, started, "a", 1)
+    _submit(scheduler, started, "huge", 16, 32 * GB)
+
+    assert started == ["a"]
+
+    scheduler.release("a")
+
+    assert started == ["a", "huge"]
+    assert scheduler.in_use == Resources(4, 8 * GB)
+
+
+def test_undeclared_resources_use_defaults(mocker):
+    mocker.patch.object(config, "TASK_DEFAULT_CPU", 1.0)
+    mocker.patch.object(config, "TASK_DEFAULT_MEMORY", 0)
+
+    assert get_requirements({"resources": {"cpu": None, "memory": None}}) == (
+        Resources(1.0, 0)
+    )
+    assert get_requirements({"resources": {"cpu": 2.0, "memory": GB}}) == (
+        Resources(2.0, GB)
+    )
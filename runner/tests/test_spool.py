@@ -0,0 +1,73 @@
+import pytest
+
+from runner.spool import ResultDrainer, ResultSpool
+
+
+@pytest.fixture
+def spool(tmp_path) -> ResultSpool:
+    return ResultSpool(str(tmp_path / "spool" / "results.sqlite3"), 0, 600)
+
+
+def _result(task_id: str) -> dict:
+    return {"task_id": task_id, "status": 0, "output": "", "result": "1"}
+
+
+def test_spooled_results_survive_reopening(tmp_path, spool):
+    spool.add(_result("task1"))
+
+    reopened = ResultSpool(spool.path, 0, 600)
+
+    assert [result for _, result in reopened.due(10)] == [_result("task1")]
+
+
+def test_results_not_due_until_retry_delay(tmp_path):
+    spool = ResultSpool(str(tmp_path / "results.sqlite3"), 30, 600)
+    spool.add(_result("task1"))
+
+    assert spool.due(10) == []
+    assert len(spool) == 1
+
+
+def test_drain_publishes_and_removes(mocker, spool):
+    spool.add(_result("task1"))
+    spool.add(_result("task2"))
+    send_results = mocker.MagicMock()
+
+    published = ResultDrainer(spool, send_results, 1, batch_size=10).drain()
+
+    assert published == 2
+    send_results.assert_called_once_with([_result("task1"), _result("task2")])
+    assert len(spool) == 0
+
+
+def test_drain_publishes_in_batches(mocker, spool):
+    for index in range(5):
+        spool.add(_result(f"task{index}"))
+
+    send_results = mocker.MagicMock()
+
+    ResultDrainer(spool, send_results, 1, batch_size=2).drain()
+
+    assert [len(call.args[0]) for call in send_results.call_args_list] == [2, 2, 1]
+
+
+def test_failed_drain_defers_results(mocker, tmp_path):
+    spool = ResultSpool(str(tmp_path / "results.sqlite3"), 30, 600)
+    spool.add(_result("task1"))
+    now = mocker.patch("runner.spool.time", return_value=10**10)
+    send_results = mocker.MagicMock(side_effect=Exception("broker down"))
+    drainer = ResultDrainer(spool, send_results, 1, batch_size=10)
+
+    assert drainer.drain() == 0
+    assert spool.due(10) == []
+
+    # The delay doubles with each failed attempt
+    now.return_value += 30
+    drainer.drain()
+    now.return_value += 30
+
+    assert spool.due(10) == []
+
+    now.return_value += 30
+
+    assert len(spool.due(10)) == 1
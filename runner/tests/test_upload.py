@@ -0,0 +1,21 @@
+import hashlib
+import io
+
+from runner.upload import upload_output
+
+
+def test_upload_sends_only_size_bytes(mocker):
+    sent = []
+
+    def put(url, data, timeout):
+        sent.append((len(data), data.read()))
+        return mocker.MagicMock()
+
+    mocker.patch("runner.upload.requests.put", side_effect=put)
+    file = io.BytesIO(b"content\n\n")
+
+    reference = upload_output("https://s3/key", file, 7)
+
+    assert sent == [(7, b"content")]
+    assert reference == {"size": 7, "sha256": hashlib.sha256(b"content").hexdigest()}
+    assert file.tell() == 9
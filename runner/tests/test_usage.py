@@ -0,0 +1,50 @@
+from runner.usage import ResourceUsage
+
+
+def _stats(memory: int, cpu: int, read: int = 0, rx: int = 0) -> dict:
+    return {
+        "memory_stats": {"usage": memory, "stats": {"total_inactive_file": 0}},
+        "cpu_stats": {"cpu_usage": {"total_usage": cpu}},
+        "blkio_stats": {
+            "io_service_bytes_recursive": [
+                {"major": 8, "minor": 0, "op": "Read", "value": read},
+                {"major": 8, "minor": 0, "op": "Write", "value": 0},
+            ]
+        },
+        "networks": {"eth0": {"rx_bytes": rx, "tx_bytes": 0}},
+    }
+
+
+def test_usage_keeps_peak_memory_and_latest_counters():
+    usage = ResourceUsage()
+
+    usage.add(_stats(memory=500, cpu=1_000_000_000, read=10, rx=1))
+    usage.add(_stats(memory=200, cpu=3_000_000_000, read=30, rx=4))
+
+    assert usage.samples == 2
+    assert usage.peak_memory == 500
+    assert usage.cpu_seconds == 3.0
+    assert usage.block_read == 30
+    assert usage.network_rx == 4
+
+
+def test_usage_relative_to_baseline():
+    usage = ResourceUsage()
+    baseline = _stats(memory=100, cpu=5_000_000_000, read=100, rx=50)
+
+    usage.add(_stats(memory=150, cpu=7_000_000_000, read=110, rx=60), baseline)
+
+    assert usage.peak_memory == 150
+    assert usage.cpu_seconds == 2.0
+    assert usage.block_read == 10
+    assert usage.network_rx == 10
+
+
+def test_usage_without_io_stats():
+    usage = ResourceUsage()
+
+    usage.add({"memory_stats": {"usage": 64}, "blkio_stats": {}})
+
+    assert usage.peak_memory == 64
+    assert usage.block_write == 0
+    assert usage.network_tx == 0